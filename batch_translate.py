@@ -6,21 +6,46 @@ def batch_translate():
     INPUT_FOLDER = r"C:\novels\english"     # โฟลเดอร์ไฟล์ต้นฉบับ
     OUTPUT_FOLDER = r"C:\novels\thai"       # โฟลเดอร์ไฟล์แปลแล้ว
     FILE_EXTENSIONS = ['.txt', '.md']       # นามสกุลไฟล์ที่จะแปล
+    OLLAMA_URLS = ["http://localhost:11434"]  # เพิ่ม URL ของเครื่อง GPU อื่นเพื่อกระจายงาน
     CHUNK_SIZE = 2000                       # ขนาด chunk
+    CHUNK_TOKENS = None                     # ขนาด chunk เป็น token (เช่น 1500) แทน CHUNK_SIZE
     DELAY = 1.0                            # หน่วงเวลาระหว่าง chunks (วินาที)
+    MAX_WORKERS = 1                         # จำนวนคำขอที่แปลพร้อมกัน (รวม OLLAMA_NUM_PARALLEL ทุกเครื่อง)
+    ORDER = "largest"                       # ลำดับคิว: "largest" = ไฟล์ใหญ่ก่อน, "chapter" = ตามเลขบท
+    STREAM = False                          # เขียนผลลงไฟล์ทันทีที่ได้แต่ละบรรทัด (แปลทีละ chunk)
+    METRICS_FILE = "translation_metrics.jsonl"  # เวลา/จำนวน token ต่อคำขอ (None = ไม่บันทึก)
+    PROMETHEUS_FILE = None                  # ไฟล์ .prom สำหรับ node_exporter textfile collector
+    KEEP_ALIVE = "30m"                      # ให้ Ollama เก็บโมเดลไว้นานเท่านี้หลังคำขอล่าสุด
+    RELEASE_MODEL = True                    # ปล่อยโมเดลออกจากหน่วยความจำเมื่อแปลเสร็จ
+    PROMPT_TEMPLATE = "translate"           # "translate_detailed" = prompt ยาวพร้อมหลักการแปลและศัพท์เฉพาะ
+    PROMPT_LAYOUT = "inline"                # "system" = ส่งคำสั่งคงที่ใน system field ให้ Ollama ใช้ cache ของ prefix ซ้ำ
+    CONTEXT_TOKENS = 0                      # ส่งท้ายคำแปลของ chunk ก่อนหน้า (token) ไปเป็นบริบท, 0 = ปิด
+    DEDUPE_PARAGRAPHS = False               # แปลย่อหน้าที่ซ้ำหลายบท (recap, ประกาศ, โน้ตผู้แปล) ครั้งเดียว
+    GLOSSARY_FILE = None                    # ไฟล์ศัพท์เฉพาะ (None = ใช้ glossary.txt ในโฟลเดอร์ต้นฉบับ ถ้ามี)
+    CALIBRATION_FILE = "token_calibration.json"  # จำนวน token จริงของโมเดลที่เรียนรู้จากการแปล (None = ไม่ใช้)
     
     # สร้าง translator
-    translator = NovelTranslator()
+    translator = NovelTranslator(ollama_urls=OLLAMA_URLS, metrics_path=METRICS_FILE,
+                                 prometheus_path=PROMETHEUS_FILE, keep_alive=KEEP_ALIVE,
+                                 release_model=RELEASE_MODEL, prompt_template=PROMPT_TEMPLATE,
+                                 prompt_layout=PROMPT_LAYOUT, glossary_path=GLOSSARY_FILE,
+                                 context_tokens=CONTEXT_TOKENS, dedupe_paragraphs=DEDUPE_PARAGRAPHS,
+                                 calibration_path=CALIBRATION_FILE)
     
-    # เริ่มแปล
+    # เริ่มแปล (โหลดโมเดลไว้ก่อน และปล่อยโมเดลเมื่อจบ แม้จะถูกขัดจังหวะด้วย Ctrl-C)
     print("🚀 เริ่มแปลทั้งโฟลเดอร์...")
-    translator.translate_directory(
-        input_dir=INPUT_FOLDER,
-        output_dir=OUTPUT_FOLDER,
-        file_extensions=FILE_EXTENSIONS,
-        chunk_size=CHUNK_SIZE,
-        delay_between_chunks=DELAY
-    )
+    with translator.session:
+        translator.translate_directory(
+            input_dir=INPUT_FOLDER,
+            output_dir=OUTPUT_FOLDER,
+            file_extensions=FILE_EXTENSIONS,
+            chunk_size=CHUNK_SIZE,
+            chunk_tokens=CHUNK_TOKENS,
+            delay_between_chunks=DELAY,
+            max_workers=MAX_WORKERS,
+            stream=STREAM,
+            order=ORDER
+        )
     print("✅ แปลเสร็จสิ้น!")
 
 if __name__ == "__main__":
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for Novel Translator
+Sweeps chunk size, num_ctx, concurrency and sampling presets over real chapters and
+measures cold vs. warm latency, throughput (source chars/s, output tokens/s), latency
+percentiles and the estimated quality score. Results go to a JSON report that can be
+compared with an earlier run.
+
+    python3 benchmark.py --input english --chunk-sizes 1000,2000 --num-ctx 8192,16384 --concurrency 1,2
+    python3 benchmark.py --stub --output bench.json          # CI: against ollama_stub, no GPU
+    python3 benchmark.py --compare bench_old.json --output bench.json
+    python3 benchmark.py --template translate_detailed --layouts inline,system   # prefix caching
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import chunker
+from ollama_client import OllamaError
+from prompt_templates import DEFAULT_TEMPLATE, LAYOUTS
+from telemetry import MetricsRecorder, percentile, summarize
+
+# Sampling options swept by --presets; "translate" matches NovelTranslator.generation_options
+SAMPLING_PRESETS = {
+    "translate": {"temperature": 0.2, "top_p": 0.85, "top_k": 40, "repeat_penalty": 1.1},
+    "loose": {"temperature": 0.3, "top_p": 0.9},
+    "strict": {"temperature": 0.1, "top_p": 0.8},
+}
+
+# 2: prompt layout added to configurations
+REPORT_VERSION = 2
+
+
+def load_chapters(input_dir: str, extensions: Tuple[str, ...] = (".txt",),
+                  limit: Optional[int] = None) -> List[Tuple[str, str]]:
+    """Read benchmark inputs as (filename, text), sorted by name"""
+    names = sorted(name for name in os.listdir(input_dir) if name.lower().endswith(extensions))
+    chapters = []
+    for name in names[:limit]:
+        with open(os.path.join(input_dir, name), 'r', encoding='utf-8') as f:
+            chapters.append((name, f.read()))
+    return chapters
+
+
+def config_key(config: Dict) -> str:
+    """Stable name for a configuration, used to match results across reports"""
+    return (f"chunk={config['chunk_size']} num_ctx={config['num_ctx']} "
+            f"concurrency={config['concurrency']} sampling={config['sampling']} layout={config['layout']}")
+
+
+def summarize_phase(records: List[Dict], wall_time: float) -> Dict:
+    """Latency/throughput/quality summary for one phase (cold or warm) of a configuration"""
+    summary = summarize(records)
+    ok = [r for r in records if r.get("ok")]
+    latencies = [r["latency"] for r in ok]
+    source_chars = sum(r["input_chars"] for r in ok)
+    # Prefer Ollama's own eval_count; fall back to the local tokenizer estimate
+    output_tokens = sum(r.get("eval_count", r.get("output_tokens", 0)) for r in ok)
+    qualities = [r["quality"] for r in ok]
+    prompt_eval_ms = [r["prompt_eval_duration"] / 1e6 for r in ok if "prompt_eval_duration" in r]
+
+    summary.update({
+        "latency_p99": percentile(latencies, 99),
+        "latency_mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        # Drops when the fixed prompt prefix is reused from llama.cpp's KV cache
+        "prompt_eval_ms_mean": sum(prompt_eval_ms) / len(prompt_eval_ms) if prompt_eval_ms else 0.0,
+        "wall_time": wall_time,
+        "source_chars": source_chars,
+        "source_chars_per_second": source_chars / wall_time if wall_time else 0.0,
+        "output_tokens_per_second": output_tokens / wall_time if wall_time else 0.0,
+        "quality_mean": sum(qualities) / len(qualities) if qualities else 0.0,
+        "success_rate": len(ok) / len(records) if records else 0.0
+    })
+    return summary
+
+
+class BenchmarkRunner:
+    """Runs benchmark configurations through a TokenChecker's client, prompt and scoring"""
+
+    def __init__(self, checker, read_timeout: float = 300.0):
+        self.checker = checker
+        self.read_timeout = read_timeout
+
+    def run_request(self, recorder: MetricsRecorder, text: str, options: Dict, phase: str,
+                    layout: str) -> Dict:
+        payload = {
+            "model": self.checker.model_name,
+            "options": options
+        }
+        payload.update(self.checker.prompt.payload_fields(text, layout))
+        started = time.time()
+        try:
+            result = self.checker.client.generate(payload, read_timeout=self.read_timeout)
+        except OllamaError as e:
+            return recorder.record(started, time.time(), False, phase=phase, input_chars=len(text),
+                                   status_code=e.status_code, error=str(e))
+
+        response = result.get('response', '')
+        return recorder.record(started, time.time(), True, result, phase=phase, input_chars=len(text),
+                               output_tokens=self.checker.count_tokens(response),
+                               quality=self.checker.estimate_quality(response, text))
+
+    def unload(self) -> bool:
+        try:
+            self.checker.client.unload(self.checker.model_name)
+            return True
+        except OllamaError as e:
+            print(f"  Could not unload model, cold numbers may be warm: {e}")
+            return False
+
+    def run_config(self, texts: List[str], config: Dict, cold: bool = True) -> Dict:
+        """Benchmark one configuration
+
+        The first chunk is sent on its own, after unloading the model when cold=True, and
+        is reported as the cold phase. The remaining chunks run at the configured
+        concurrency and are reported as the warm phase.
+        """
+        chunks = [chunk for text in texts for chunk in chunker.chunk_text(text, config["chunk_size"])]
+        options = dict(SAMPLING_PRESETS[config["sampling"]], num_ctx=config["num_ctx"])
+        recorder = MetricsRecorder()
+
+        unloaded = self.unload() if cold else False
+        started = time.time()
+        layout = config["layout"]
+        first = self.run_request(recorder, chunks[0], options, "cold" if unloaded else "warmup", layout)
+        cold_wall = time.time() - started
+
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=config["concurrency"]) as executor:
+            list(executor.map(lambda chunk: self.run_request(recorder, chunk, options, "warm", layout),
+                              chunks[1:]))
+        warm_wall = time.time() - started
+
+        return {
+            "key": config_key(config),
+            "config": config,
+            "options": options,
+            "chunks": len(chunks),
+            "cold": summarize_phase([first], cold_wall) if unloaded else None,
+            "warm": summarize_phase(recorder.since(phase="warm"), warm_wall)
+        }
+
+    def run_sweep(self, texts: List[str], chunk_sizes: List[int], num_ctxs: List[int],
+                  concurrencies: List[int], presets: List[str], repeats: int = 1,
+                  cold: bool = True, layouts: List[str] = ["inline"]) -> List[Dict]:
+        results = []
+        grid = list(itertools.product(chunk_sizes, num_ctxs, concurrencies, presets, layouts))
+        for n, (chunk_size, num_ctx, concurrency, sampling, layout) in enumerate(grid, 1):
+            config = {"chunk_size": chunk_size, "num_ctx": num_ctx,
+                      "concurrency": concurrency, "sampling": sampling, "layout": layout}
+            for repeat in range(repeats):
+                print(f"[{n}/{len(grid)}] {config_key(config)} (run {repeat + 1}/{repeats})")
+                result = self.run_config(texts, config, cold)
+                result["repeat"] = repeat
+                print(f"  {format_result(result)}")
+                results.append(result)
+        return results
+
+
+def format_result(result: Dict) -> str:
+    warm = result["warm"]
+    line = (f"warm p50 {warm['latency_p50']:.2f}s p95 {warm['latency_p95']:.2f}s | "
+            f"{warm['source_chars_per_second']:.0f} chars/s | {warm['output_tokens_per_second']:.1f} tok/s | "
+            f"prompt eval {warm['prompt_eval_ms_mean']:.0f}ms | "
+            f"quality {warm['quality_mean']:.2f} | ok {warm['success_rate'] * 100:.0f}%")
+    if result["cold"]:
+        line += f" | cold {result['cold']['latency_mean']:.2f}s (load {result['cold']['load_seconds']:.2f}s)"
+    return line
+
+
+def build_report(checker, chapters: List[Tuple[str, str]], results: List[Dict]) -> Dict:
+    return {
+        "version": REPORT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "model": checker.model_name,
+        "ollama_url": checker.ollama_url,
+        "prompt_template": checker.prompt.name,
+        "prompt_fixed_chars": {layout: len(checker.prompt.signature(layout)) for layout in LAYOUTS},
+        "inputs": [{"name": name, "chars": len(text)} for name, text in chapters],
+        "results": results
+    }
+
+
+def compare_reports(old: Dict, new: Dict) -> List[str]:
+    """Per-configuration changes in warm throughput, p95 latency and quality between two reports"""
+    def by_key(report):
+        # With --repeats, the last run of each configuration is compared
+        return {result["key"]: result for result in report["results"]}
+
+    old_results = by_key(old)
+    lines = []
+    for key, result in by_key(new).items():
+        if key not in old_results:
+            lines.append(f"{key}: new configuration")
+            continue
+        before, after = old_results[key]["warm"], result["warm"]
+        changes = []
+        for field, label in (("output_tokens_per_second", "tok/s"), ("source_chars_per_second", "chars/s"),
+                             ("latency_p95", "p95"), ("prompt_eval_ms_mean", "prompt eval ms"),
+                             ("quality_mean", "quality")):
+            if field not in before:
+                continue
+            if before[field]:
+                change = (after[field] - before[field]) / before[field] * 100
+                changes.append(f"{label} {before[field]:.2f} -> {after[field]:.2f} ({change:+.1f}%)")
+        lines.append(f"{key}: " + ", ".join(changes))
+    return lines
+
+
+def parse_list(value: str, cast=int) -> List:
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+
+def main():
+    # Imported here so token_checker can import this module for its benchmark menu
+    from token_checker import TokenChecker
+
+    parser = argparse.ArgumentParser(description="Benchmark translation settings")
+    parser.add_argument("--input", default="english", help="folder of chapters to translate")
+    parser.add_argument("--limit", type=int, default=None, help="use only the first N chapters")
+    parser.add_argument("--chunk-sizes", default="2000", help="comma-separated chunk sizes in characters")
+    parser.add_argument("--num-ctx", default="16384", help="comma-separated num_ctx values")
+    parser.add_argument("--concurrency", default="1", help="comma-separated concurrency levels")
+    parser.add_argument("--presets", default="translate", help=f"sampling presets: {', '.join(SAMPLING_PRESETS)}")
+    parser.add_argument("--layouts", default="inline", help=f"prompt layouts: {', '.join(LAYOUTS)}")
+    parser.add_argument("--template", default=DEFAULT_TEMPLATE, help="prompt template name")
+    parser.add_argument("--repeats", type=int, default=1, help="runs per configuration")
+    parser.add_argument("--no-cold", action="store_true", help="do not unload the model before each configuration")
+    parser.add_argument("--model", default="scb10x/typhoon-translate-4b")
+    parser.add_argument("--url", default="http://localhost:11434")
+    parser.add_argument("--output", default="benchmark_report.json", help="JSON report path")
+    parser.add_argument("--compare", default=None, help="earlier report to compare against")
+    parser.add_argument("--stub", action="store_true", help="run against a local ollama_stub server")
+    parser.add_argument("--stub-delay", type=float, default=0.05, help="stub seconds per request")
+    args = parser.parse_args()
+
+    presets = parse_list(args.presets, str)
+    unknown = [name for name in presets if name not in SAMPLING_PRESETS]
+    if unknown:
+        parser.error(f"unknown presets: {', '.join(unknown)}")
+    layouts = parse_list(args.layouts, str)
+    unknown = [name for name in layouts if name not in LAYOUTS]
+    if unknown:
+        parser.error(f"unknown layouts: {', '.join(unknown)}")
+
+    url = args.url
+    if args.stub:
+        import ollama_stub
+        server = ollama_stub.start_in_background(delay=args.stub_delay, load_delay=args.stub_delay * 4)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        print(f"Using stub Ollama at {url}")
+
+    chapters = load_chapters(args.input, limit=args.limit)
+    if not chapters:
+        print(f"No chapters found in {args.input}")
+        return
+
+    checker = TokenChecker(args.model, url, prompt_template=args.template)
+    runner = BenchmarkRunner(checker)
+    results = runner.run_sweep([text for _, text in chapters], parse_list(args.chunk_sizes),
+                               parse_list(args.num_ctx), parse_list(args.concurrency), presets,
+                               repeats=args.repeats, cold=not args.no_cold, layouts=layouts)
+
+    report = build_report(checker, chapters, results)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nReport written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        print(f"\nCompared with {args.compare}:")
+        for line in compare_reports(previous, report):
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
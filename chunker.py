@@ -0,0 +1,144 @@
+"""
+Chunker
+Packs paragraphs into translation chunks against a size budget measured either
+in characters or in tokens. Paragraphs larger than the budget are split at
+sentence boundaries.
+"""
+
+import re
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+# จุดสิ้นสุดประโยค: . ! ? (รวมเครื่องหมายคำพูดปิดที่ตามมา) หรือ ellipsis ตามด้วยช่องว่าง
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])["\'”’)\]]*\s+')
+
+PARAGRAPH_SEPARATOR = "\n\n"
+
+
+def split_sentences(paragraph: str) -> List[str]:
+    """แยกย่อหน้าเป็นประโยค"""
+    return [s for s in SENTENCE_BOUNDARY.split(paragraph) if s.strip()]
+
+
+def iter_paragraphs(text: str) -> Iterator[str]:
+    """แยกข้อความตามย่อหน้า (บรรทัดว่าง) ข้ามย่อหน้าว่าง"""
+    for paragraph in text.split(PARAGRAPH_SEPARATOR):
+        paragraph = paragraph.strip()
+        if paragraph:
+            yield paragraph
+
+
+def _split_oversized(paragraph: str, limit: int, measure: Callable[[str], int]) -> Iterator[str]:
+    """แบ่งย่อหน้าที่ใหญ่เกิน limit ตามประโยค ถ้าประโยคเดียวยังเกินจะตัดตามคำ"""
+    pieces: List[str] = []
+    size = 0
+    space_cost = measure(" ")
+
+    def units() -> Iterator[tuple]:
+        for sentence in split_sentences(paragraph):
+            sentence_size = measure(sentence)
+            if sentence_size <= limit:
+                yield sentence, sentence_size
+                continue
+            for word in sentence.split():
+                yield word, measure(word)
+
+    for unit, unit_size in units():
+        if pieces and size + space_cost + unit_size > limit:
+            yield " ".join(pieces)
+            pieces, size = [], 0
+        size += unit_size + (space_cost if pieces else 0)
+        pieces.append(unit)
+
+    if pieces:
+        yield " ".join(pieces)
+
+
+def iter_chunks(paragraphs: Iterable[str], limit: int, measure: Callable[[str], int] = len) -> Iterator[str]:
+    """รวมย่อหน้าเป็น chunks ที่มีขนาดไม่เกิน limit ตามหน่วยของ measure
+
+    วัดขนาดแต่ละย่อหน้าครั้งเดียวและเก็บผลรวมสะสม จึงทำงานเป็นเวลาเชิงเส้น
+    รับ paragraphs เป็น iterator ได้ จึงใช้กับไฟล์ขนาดใหญ่ที่อ่านทีละส่วนได้
+    """
+    separator_cost = measure(PARAGRAPH_SEPARATOR)
+    parts: List[str] = []
+    size = 0
+
+    for paragraph in paragraphs:
+        paragraph_size = measure(paragraph)
+
+        if paragraph_size > limit:
+            # ย่อหน้าใหญ่เกิน: ปิด chunk ปัจจุบันแล้วแบ่งย่อหน้านี้ตามประโยค
+            if parts:
+                yield PARAGRAPH_SEPARATOR.join(parts)
+                parts, size = [], 0
+            pieces = list(_split_oversized(paragraph, limit, measure))
+            for piece in pieces[:-1]:
+                yield piece
+            # ชิ้นสุดท้ายยังรวมกับย่อหน้าถัดไปได้
+            paragraph = pieces[-1]
+            paragraph_size = measure(paragraph)
+
+        if parts and size + separator_cost + paragraph_size > limit:
+            yield PARAGRAPH_SEPARATOR.join(parts)
+            parts, size = [], 0
+
+        size += paragraph_size + (separator_cost if parts else 0)
+        parts.append(paragraph)
+
+    if parts:
+        yield PARAGRAPH_SEPARATOR.join(parts)
+
+
+def chunk_text(text: str, limit: int, measure: Callable[[str], int] = len) -> List[str]:
+    """แบ่งข้อความทั้งก้อนเป็น chunks"""
+    return list(iter_chunks(iter_paragraphs(text), limit, measure))
+
+
+def tail_text(text: str, limit: int, measure: Callable[[str], int] = len) -> str:
+    """ส่วนท้ายของ text ขนาดไม่เกิน limit ตัดที่ขอบประโยค
+
+    ใช้ทำบริบทจากคำแปลของ chunk ก่อนหน้า ประโยคภาษาไทยมักไม่มีเครื่องหมายจบประโยค
+    บรรทัดที่ใหญ่เกิน limit จึงตัดตามช่องว่าง (ซึ่งในภาษาไทยมักคั่นประโยคหรือวลี)
+    """
+    kept_lines: List[str] = []
+    size = 0
+    for line in reversed([line.strip() for line in text.split("\n") if line.strip()]):
+        line_size = measure(line)
+        if size + line_size <= limit:
+            kept_lines.append(line)
+            size += line_size + 1
+            continue
+        # บรรทัดนี้ใส่ได้ไม่หมด เก็บเฉพาะประโยคท้ายบรรทัดที่ยังพอดี แล้วหยุด
+        pieces = []
+        for sentence in reversed(split_sentences(line)):
+            units = [sentence] if measure(sentence) <= limit else sentence.split()
+            for unit in reversed(units):
+                unit_size = measure(unit)
+                if size + unit_size > limit:
+                    break
+                pieces.append(unit)
+                size += unit_size + 1
+            else:
+                continue
+            break
+        if pieces:
+            kept_lines.append(" ".join(reversed(pieces)))
+        break
+    return "\n".join(reversed(kept_lines))
+
+
+def split_in_half(text: str) -> Tuple[List[str], str]:
+    """แบ่งข้อความเป็นสองส่วนที่ขอบย่อหน้าใกล้กึ่งกลางที่สุด (หรือขอบประโยค ถ้ามีย่อหน้าเดียว)
+
+    คืน (ส่วนต่างๆ, ตัวคั่นที่ใช้ต่อคำแปลของแต่ละส่วนกลับ) หรือ ([text], "") ถ้าแบ่งไม่ได้
+    """
+    middle = len(text) // 2
+    for pattern, separator in ((r'\n\s*\n', PARAGRAPH_SEPARATOR), (SENTENCE_BOUNDARY.pattern, " ")):
+        cuts = [match.end() for match in re.finditer(pattern, text)]
+        if not cuts:
+            continue
+        cut = min(cuts, key=lambda position: abs(position - middle))
+        parts = [part for part in (text[:cut].strip(), text[cut:].strip()) if part]
+        if len(parts) == 2:
+            return parts, separator
+    return [text], ""
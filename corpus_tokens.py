@@ -0,0 +1,227 @@
+"""
+Corpus Token Accounting
+Token totals for a whole folder of chapters, for quoting turnaround before a
+series is queued. Files are analyzed in parallel worker processes with
+token_stream.analyze_file (batched tokenization, constant memory per file), the
+per-file results are merged into corpus totals and the largest chunks, and the
+GPU time is projected from tokens/s measured by the translator's metrics JSONL
+or a benchmark report. Token estimates use the model's calibration profile. The
+report is written as JSON and/or CSV.
+"""
+
+import csv
+import heapq
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+from glossary import GLOSSARY_FILENAME
+from prompt_templates import DEFAULT_TEMPLATE, LAYOUT_INLINE, get_template
+from telemetry import summarize
+from token_calibration import CalibrationProfile
+from token_stream import DEFAULT_NUM_CTX, MAX_LARGEST, TokenHistogram, analyze_file, format_estimate_basis
+
+CORPUS_LARGEST = 20
+CSV_FIELDS = ("file", "file_bytes", "characters", "chunks", "source_tokens", "input_tokens",
+              "estimated_output_tokens", "max_chunk_tokens", "p90_chunk_tokens", "overflows", "gpu_hours")
+
+
+def list_corpus(input_dir: str, extensions: Tuple[str, ...] = (".txt",)) -> List[str]:
+    """Chapter files of a folder, chosen the same way as NovelTranslator.translate_directory."""
+    return [os.path.join(input_dir, name) for name in sorted(os.listdir(input_dir))
+            if name != GLOSSARY_FILENAME and name.lower().endswith(extensions)]
+
+
+def _analyze_worker(path: str, count_tokens: Callable[[str], int],
+                    count_batch: Optional[Callable[[List[str]], List[int]]], template_name: str,
+                    layout: str, chunk_size: int, chunk_tokens: Optional[int], num_ctx: int,
+                    output_ratio: Optional[float], calibration: Optional[CalibrationProfile]) -> Dict:
+    return analyze_file(path, count_tokens, get_template(template_name), layout,
+                        chunk_size=chunk_size, chunk_tokens=chunk_tokens, num_ctx=num_ctx,
+                        output_ratio=output_ratio, count_batch=count_batch, calibration=calibration)
+
+
+def load_throughput(metrics_path: Optional[str] = None, benchmark_path: Optional[str] = None) -> Optional[Dict]:
+    """Measured token rates from a metrics JSONL (NovelTranslator metrics_path) or a benchmark report.
+
+    prompt/eval tokens/s are model busy rates (Ollama's own durations); throughput is
+    output tokens per wall-clock second for the whole run, so it includes prompt
+    evaluation, queueing and whatever concurrency the run used.
+    """
+    if metrics_path:
+        records = []
+        with open(metrics_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        summary = summarize(records)
+        if not summary["eval_tokens_per_second"]:
+            print(f"No successful requests with token timings in {metrics_path}")
+            return None
+        return {"source": metrics_path,
+                "prompt_tokens_per_second": summary["prompt_tokens_per_second"],
+                "eval_tokens_per_second": summary["eval_tokens_per_second"],
+                "throughput_tokens_per_second": summary["throughput_tokens_per_second"]}
+
+    if benchmark_path:
+        with open(benchmark_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        # The fastest configuration is what a run would be tuned to
+        results = [r for r in report.get("results", []) if r["warm"].get("output_tokens_per_second")]
+        if not results:
+            print(f"No warm results with output tokens/s in {benchmark_path}")
+            return None
+        best = max(results, key=lambda r: r["warm"]["output_tokens_per_second"])
+        warm = best["warm"]
+        return {"source": f"{benchmark_path} ({best['key']})",
+                "prompt_tokens_per_second": warm.get("prompt_tokens_per_second", 0.0),
+                "eval_tokens_per_second": warm.get("eval_tokens_per_second", 0.0),
+                "throughput_tokens_per_second": warm["output_tokens_per_second"]}
+    return None
+
+
+def project_hours(input_tokens: int, output_tokens: int, throughput: Dict) -> Dict:
+    """GPU busy hours (prompt + generation at the measured rates) and wall-clock hours at the measured throughput."""
+    gpu_seconds = 0.0
+    if throughput.get("eval_tokens_per_second"):
+        gpu_seconds += output_tokens / throughput["eval_tokens_per_second"]
+    if throughput.get("prompt_tokens_per_second"):
+        gpu_seconds += input_tokens / throughput["prompt_tokens_per_second"]
+    wall = throughput.get("throughput_tokens_per_second")
+    return {"gpu_hours": gpu_seconds / 3600,
+            "wall_hours": output_tokens / wall / 3600 if wall else None}
+
+
+def analyze_corpus(paths: List[str], count_tokens: Callable[[str], int],
+                   count_batch: Optional[Callable[[List[str]], List[int]]] = None,
+                   template_name: str = DEFAULT_TEMPLATE, layout: str = LAYOUT_INLINE,
+                   chunk_size: int = 2000, chunk_tokens: Optional[int] = None, num_ctx: int = DEFAULT_NUM_CTX,
+                   output_ratio: Optional[float] = None, workers: Optional[int] = None,
+                   throughput: Optional[Dict] = None, calibration: Optional[CalibrationProfile] = None) -> Dict:
+    """Analyze every file on a process pool and merge the results into a corpus report.
+
+    count_tokens/count_batch must be module-level functions so they can be sent to the workers.
+    calibration is the model's learned profile (token_calibration.load_profile); input and
+    output totals, and so the projected hours, are in the model's tokens.
+    """
+    profile = calibration or CalibrationProfile()
+    analyses = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_analyze_worker, path, count_tokens, count_batch, template_name,
+                                   layout, chunk_size, chunk_tokens, num_ctx, output_ratio, profile): path
+                   for path in paths}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                analyses.append(future.result())
+            except Exception as e:
+                print(f"Could not analyze {futures[future]}: {e}")
+            if done % 50 == 0:
+                print(f"  {done}/{len(paths)} files")
+    analyses.sort(key=lambda analysis: analysis["file"])
+
+    histogram = TokenHistogram()
+    largest: List = []
+    files = []
+    for analysis in analyses:
+        histogram.merge(analysis)
+        for chunk in analysis["largest_chunks"]:
+            item = (chunk["tokens"], analysis["file"], chunk["chunk"], chunk["preview"])
+            if len(largest) < CORPUS_LARGEST:
+                heapq.heappush(largest, item)
+            elif item > largest[0]:
+                heapq.heapreplace(largest, item)
+
+        row = {field: analysis[field] for field in CSV_FIELDS[:7]}
+        row.update({"max_chunk_tokens": analysis["chunk_tokens"]["max"],
+                    "p90_chunk_tokens": analysis["chunk_tokens"]["p90"],
+                    "overflows": analysis["overflows"],
+                    "gpu_hours": None})
+        if throughput:
+            row["gpu_hours"] = round(project_hours(analysis["input_tokens"], analysis["estimated_output_tokens"],
+                                                   throughput)["gpu_hours"], 4)
+        files.append(row)
+
+    totals = {field: sum(row[field] for row in files)
+              for field in ("file_bytes", "characters", "chunks", "source_tokens", "input_tokens",
+                            "estimated_output_tokens", "overflows")}
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "prompt_template": template_name,
+        "layout": layout,
+        "chunk_size": chunk_size,
+        "chunk_tokens": chunk_tokens,
+        "num_ctx": num_ctx,
+        "calibrated": profile.calibrated,
+        "input_factor": profile.input_factor,
+        "output_ratio": output_ratio if output_ratio is not None else profile.output_ratio,
+        "files_analyzed": len(files),
+        "files_failed": len(paths) - len(files),
+        "totals": totals,
+        "chunk_token_stats": histogram.summary(),
+        "histogram": histogram.rows(),
+        "largest_chunks": [{"file": file, "chunk": chunk, "tokens": tokens, "preview": preview}
+                           for tokens, file, chunk, preview in sorted(largest, reverse=True)],
+        "throughput": throughput,
+        "projection": project_hours(totals["input_tokens"], totals["estimated_output_tokens"], throughput)
+        if throughput else None,
+        "files": files
+    }
+    return report
+
+
+def write_json(report: Dict, path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def write_csv(report: Dict, path: str) -> None:
+    """One row per file plus a TOTAL row"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(report["files"])
+        total = dict(report["totals"], file="TOTAL",
+                     max_chunk_tokens=report["chunk_token_stats"]["max"],
+                     p90_chunk_tokens=report["chunk_token_stats"]["p90"],
+                     gpu_hours=report["projection"]["gpu_hours"] if report["projection"] else None)
+        writer.writerow(total)
+
+
+def format_report(report: Dict) -> str:
+    totals = report["totals"]
+    stats = report["chunk_token_stats"]
+    lines = [
+        f"Files: {report['files_analyzed']:,}" + (f" ({report['files_failed']} failed)" if report["files_failed"] else ""),
+        f"Characters: {totals['characters']:,} | Chunks: {totals['chunks']:,}",
+        f"Input tokens: {totals['input_tokens']:,} (source {totals['source_tokens']:,})",
+        f"Estimated output tokens: {totals['estimated_output_tokens']:,}",
+        format_estimate_basis(report),
+        f"Tokens per chunk: mean {stats['mean']:.0f}, p50 {stats['p50']:.0f}, p90 {stats['p90']:.0f}, "
+        f"p99 {stats['p99']:.0f}, max {stats['max']}",
+    ]
+    if totals["overflows"]:
+        lines.append(f"❌ {totals['overflows']} chunks do not fit in num_ctx {report['num_ctx']:,}")
+    lines.append(f"Largest chunks (top {min(len(report['largest_chunks']), CORPUS_LARGEST)}, "
+                 f"up to {MAX_LARGEST} per file):")
+    for chunk in report["largest_chunks"][:10]:
+        lines.append(f"  {chunk['tokens']:>6} tokens  {os.path.basename(chunk['file'])} chunk {chunk['chunk']}"
+                     f" - {chunk['preview']!r}")
+
+    projection = report["projection"]
+    if projection:
+        rates = report["throughput"]
+        line = (f"Measured rates ({rates['source']}): prompt {rates['prompt_tokens_per_second']:.0f} tok/s, "
+                f"generate {rates['eval_tokens_per_second']:.1f} tok/s")
+        if rates["throughput_tokens_per_second"]:
+            line += f", end-to-end {rates['throughput_tokens_per_second']:.1f} tok/s"
+        lines.append(line)
+        lines.append(f"Projected GPU time: {projection['gpu_hours']:.1f} h")
+        if projection["wall_hours"] is not None:
+            lines.append(f"Projected turnaround: {projection['wall_hours']:.1f} h")
+    else:
+        lines.append("No measured throughput (use --metrics or --benchmark) - GPU hours not projected")
+    return "\n".join(lines)
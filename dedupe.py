@@ -0,0 +1,173 @@
+"""
+Paragraph Dedupe
+Finds paragraphs that repeat across chapters (recaps, sponsor notices,
+translator notes) with whitespace, punctuation or small wording differences.
+Paragraphs are compared by MinHash signatures of word shingles and bucketed
+with LSH bands, so each paragraph is checked against a few candidates instead
+of every earlier paragraph. Repeated paragraphs are mapped to the first
+occurrence and kept out of the surrounding chunks, so they are translated once,
+when that saves more chunks than the extra chunk boundaries cost.
+"""
+
+import hashlib
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from chunker import PARAGRAPH_SEPARATOR, iter_paragraphs
+
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_WORDS = 3
+# ย่อหน้าสั้น (บทพูดสั้นๆ เช่น "Yes.") ซ้ำได้ตามธรรมชาติ และต้องแปลตามบริบท จึงไม่รวม
+MIN_WORDS = 8
+THRESHOLD = 0.8
+# ย่อหน้าซ้ำที่แยกออกมาตัดข้อความรอบข้างเป็นสองช่วง ซึ่งแบ่ง chunk แยกกัน เพิ่มเฉลี่ยครึ่ง chunk ต่อแห่ง
+BOUNDARY_COST = 0.5
+
+# ค่า XOR ของแต่ละ permutation (คงที่ทุก process เพื่อให้ signature ตรงกันทุกรอบ)
+_MASKS = [int.from_bytes(hashlib.blake2b(str(i).encode(), digest_size=8).digest(), 'big')
+          for i in range(NUM_PERM)]
+_WORD = re.compile(r"\w+")
+
+
+def paragraph_words(paragraph: str) -> List[str]:
+    """คำในย่อหน้าแบบตัวพิมพ์เล็ก ไม่รวมเครื่องหมายวรรคตอนและช่องว่าง"""
+    return _WORD.findall(paragraph.lower())
+
+
+def _shingle_hashes(words: List[str]) -> Set[int]:
+    size = min(SHINGLE_WORDS, len(words))
+    return {int.from_bytes(hashlib.blake2b(" ".join(words[i:i + size]).encode('utf-8'),
+                                           digest_size=8).digest(), 'big')
+            for i in range(len(words) - size + 1)}
+
+
+def minhash(hashes: Set[int], num_perm: int = NUM_PERM) -> Tuple[int, ...]:
+    """MinHash signature ของชุด shingle hash"""
+    return tuple(min(map(mask.__xor__, hashes)) for mask in _MASKS[:num_perm])
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class ParagraphIndex:
+    """ดัชนีย่อหน้าที่จับกลุ่มย่อหน้าซ้ำหรือเกือบซ้ำ (Jaccard ของ shingle ประมาณ >= threshold)
+
+    เพิ่มทุกย่อหน้าของทุกไฟล์ด้วย add_text() ก่อน แล้วใช้ segments() แยกข้อความก่อนแบ่ง chunk
+    ย่อหน้าในกลุ่มเดียวกันถูกแทนด้วยย่อหน้าแรกที่พบของกลุ่ม
+    """
+
+    def __init__(self, threshold: float = THRESHOLD, num_perm: int = NUM_PERM, bands: int = BANDS,
+                 min_words: int = MIN_WORDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.min_words = min_words
+        self.canonical: List[str] = []
+        self.counts: List[int] = []
+        # ข้อความที่ normalize แล้ว -> กลุ่ม (ย่อหน้าที่ต่างกันแค่ช่องว่าง/วรรคตอนไม่ต้องคำนวณ MinHash)
+        self._groups: Dict[str, int] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        # คำและ shingle ของย่อหน้าตัวแทน เก็บเฉพาะกลุ่มที่เคยเป็นผู้สมัคร
+        self._candidate_cache: Dict[int, Tuple[List[str], Set[int]]] = {}
+
+    def _bands(self, signature: Tuple[int, ...]) -> Iterable[Tuple[int, Tuple[int, ...]]]:
+        rows = self.num_perm // self.bands
+        for band in range(self.bands):
+            yield band, signature[band * rows:(band + 1) * rows]
+
+    def _similar(self, words: List[str], shingles: Set[int], group: int) -> bool:
+        """ตรวจผู้สมัครจาก LSH ด้วย Jaccard จริง และต้องมีตัวเลขชุดเดียวกัน
+        (ประกาศ "Chapter 12 ..." กับ "Chapter 13 ..." ต้องแปลแยกกัน)"""
+        if group not in self._candidate_cache:
+            other = paragraph_words(self.canonical[group])
+            self._candidate_cache[group] = (other, _shingle_hashes(other))
+        other, other_shingles = self._candidate_cache[group]
+        if [w for w in words if w.isdigit()] != [w for w in other if w.isdigit()]:
+            return False
+        return jaccard(shingles, other_shingles) >= self.threshold
+
+    def add(self, paragraph: str) -> Optional[int]:
+        """เพิ่มย่อหน้า คืนหมายเลขกลุ่ม หรือ None ถ้าสั้นเกินกว่าจะรวม"""
+        words = paragraph_words(paragraph)
+        if len(words) < self.min_words:
+            return None
+        key = " ".join(words)
+        group = self._groups.get(key)
+        if group is None:
+            shingles = _shingle_hashes(words)
+            signature = minhash(shingles, self.num_perm)
+            candidates = {g for band in self._bands(signature) for g in self._buckets.get(band, ())}
+            group = next((g for g in sorted(candidates) if self._similar(words, shingles, g)), None)
+            if group is None:
+                group = len(self.canonical)
+                self.canonical.append(paragraph)
+                self.counts.append(0)
+                for band in self._bands(signature):
+                    self._buckets.setdefault(band, []).append(group)
+            self._groups[key] = group
+        self.counts[group] += 1
+        return group
+
+    def add_text(self, text: str) -> None:
+        for paragraph in iter_paragraphs(text):
+            self.add(paragraph)
+
+    def repeated(self, paragraph: str) -> Optional[str]:
+        """ย่อหน้าตัวแทนของกลุ่ม ถ้า paragraph ซ้ำกับย่อหน้าอื่น (เรียกหลัง add ครบทุกไฟล์แล้ว)"""
+        group = self._groups.get(" ".join(paragraph_words(paragraph)))
+        if group is None or self.counts[group] < 2:
+            return None
+        return self.canonical[group]
+
+    def worth_splitting(self, group: int, chunk_size: Optional[int] = None,
+                        measure: Callable[[str], int] = len) -> bool:
+        """แยกกลุ่มนี้เป็น chunk ของตัวเองแล้วจำนวนคำขอลดลงหรือไม่
+
+        ไม่แยก: ทุกแห่งอยู่ใน chunk รอบข้าง ใช้ประมาณ count * ขนาด / chunk_size chunk
+        แยก: แปลกลุ่มนี้ 1 คำขอ + chunk ที่เพิ่มจากการตัดข้อความรอบข้าง BOUNDARY_COST ต่อแห่ง
+        chunk_size อยู่ในหน่วยเดียวกับ measure (ตัวอักษร หรือ token) ถ้าไม่ระบุถือว่าคุ้มทุกกลุ่ม
+        """
+        count = self.counts[group]
+        if count < 2:
+            return False
+        if chunk_size is None:
+            return True
+        return count * measure(self.canonical[group]) / chunk_size > 1 + count * BOUNDARY_COST
+
+    def repeated_groups(self, chunk_size: Optional[int] = None, measure: Callable[[str], int] = len) -> int:
+        """จำนวนกลุ่มที่ซ้ำและคุ้มที่จะแยก (ดู worth_splitting)"""
+        return sum(1 for group in range(len(self.counts)) if self.worth_splitting(group, chunk_size, measure))
+
+    def segments(self, text: str, chunk_size: Optional[int] = None,
+                 measure: Callable[[str], int] = len) -> List[Tuple[str, bool]]:
+        """แบ่งข้อความเป็นช่วงของย่อหน้าปกติ และย่อหน้าซ้ำ (แทนด้วยข้อความของย่อหน้าตัวแทน)
+
+        คืน [(ข้อความ, เป็นย่อหน้าซ้ำ)] ให้แบ่ง chunk แต่ละช่วงแยกกัน ย่อหน้าซ้ำทุกแห่งจึงได้ chunk
+        ที่ข้อความเหมือนกันทุกตัวอักษร แปลครั้งเดียวแล้วใช้ร่วมกัน (และ cache ได้)
+        กลุ่มที่แยกแล้วไม่คุ้ม (worth_splitting กับ chunk_size) คงอยู่ในข้อความรอบข้างตามเดิม
+        """
+        worth: Dict[int, bool] = {}
+        result: List[Tuple[str, bool]] = []
+        parts: List[str] = []
+        for paragraph in iter_paragraphs(text):
+            canonical = self.repeated(paragraph)
+            if canonical is not None:
+                group = self._groups[" ".join(paragraph_words(paragraph))]
+                if group not in worth:
+                    worth[group] = self.worth_splitting(group, chunk_size, measure)
+                if not worth[group]:
+                    canonical = None
+            if canonical is None:
+                parts.append(paragraph)
+                continue
+            if parts:
+                result.append((PARAGRAPH_SEPARATOR.join(parts), False))
+                parts = []
+            result.append((canonical, True))
+        if parts:
+            result.append((PARAGRAPH_SEPARATOR.join(parts), False))
+        return result
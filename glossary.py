@@ -0,0 +1,166 @@
+"""
+Glossary
+Per-novel term list (English -> Thai) used to lock terminology. All terms are
+compiled into one case-insensitive regex, so finding the terms of a chunk is a
+single scan. Only the terms that occur in a chunk are added to its prompt, and
+translations are checked and repaired afterwards, for those terms only. The
+built-in default terms match case-sensitively (capitalized forms only), so
+ordinary prose such as "elder brother" is left alone.
+
+Term file (glossary.txt in the novel's input folder), one term per line:
+
+    # English = Thai | wrong variant | wrong variant
+    Qi = ชี่
+    Young Master = คุณชายหนุ่ม | นายน้อย
+
+or a JSON object {"Qi": "ชี่", ...}.
+"""
+
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Pattern
+
+GLOSSARY_FILENAME = "glossary.txt"
+GLOSSARY_HEADER = "ใช้คำแปลศัพท์เฉพาะต่อไปนี้:"
+NOTE_SEPARATOR = " → "
+# บรรทัดรายการศัพท์ใต้ GLOSSARY_HEADER ("Young Master → คุณชายหนุ่ม") ที่โมเดลพิมพ์ซ้ำในคำแปล:
+# ศัพท์ภาษาอังกฤษทั้งซ้าย คำไทยสั้นๆ ทั้งขวา บรรทัดเนื้อเรื่องที่แค่มีลูกศร ("พลัง 10 → 12") ไม่ตรง
+GLOSSARY_NOTE_LINE = r"[A-Za-z][A-Za-z0-9' .\-]{0,40} → [\u0E00-\u0E7F][\u0E00-\u0E7F ]{0,40}"
+
+# ศัพท์ที่ใช้เมื่อไม่มีไฟล์ glossary ของนิยาย (เดิมฝังอยู่ใน prompt แบบละเอียด)
+DEFAULT_TERMS = {
+    "Cultivation": "การเพาะพิถี",
+    "Qi": "ชี่",
+    "Dantian": "ต้านเถียน",
+    "Breakthrough": "ก้าวกระโดด",
+    "Elder": "ผู้อาวุโส",
+    "Young Master": "คุณชายหนุ่ม",
+}
+
+
+class Term:
+    def __init__(self, source: str, thai: str, variants: Optional[List[str]] = None):
+        self.source = source
+        self.thai = thai
+        # variant ที่เป็นส่วนหนึ่งของคำแปลที่ถูกต้องแทนที่ไม่ได้ (จะทำให้คำที่ถูกเสีย)
+        self.variants = [v for v in (variants or []) if v and v not in thai]
+
+
+def _bounded(text: str) -> str:
+    """regex ของ text ที่ไม่จับกลางคำภาษาอังกฤษ
+
+    ขอบที่เป็นอักษรไทยไม่มีขอบเขตคำให้ตรวจ (ภาษาไทยไม่เว้นวรรคระหว่างคำ)
+    """
+    pattern = re.escape(text)
+    if text[0].isascii() and text[0].isalnum():
+        pattern = r"(?<![A-Za-z0-9])" + pattern
+    if text[-1].isascii() and text[-1].isalnum():
+        pattern += r"(?![A-Za-z0-9])"
+    return pattern
+
+
+class Glossary:
+    """รายการศัพท์เฉพาะพร้อมตัวค้นหาแบบหลายคำในครั้งเดียว"""
+
+    def __init__(self, terms: Dict[str, str], variants: Optional[Dict[str, List[str]]] = None,
+                 case_sensitive: bool = False):
+        variants = variants or {}
+        self.case_sensitive = case_sensitive
+        self.terms: Dict[str, Term] = {self._key(source): Term(source, thai, variants.get(source))
+                                       for source, thai in terms.items() if source.strip() and thai.strip()}
+        self._matcher = self._compile(self.terms.values())
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    @classmethod
+    def default(cls) -> "Glossary":
+        """ศัพท์ในตัว (DEFAULT_TERMS) จับเฉพาะรูปตัวพิมพ์ใหญ่ตามที่เขียนไว้ ไม่ให้ "elder brother" ในเนื้อเรื่องตรง"""
+        return cls(DEFAULT_TERMS, case_sensitive=True)
+
+    def _key(self, source: str) -> str:
+        return source if self.case_sensitive else source.lower()
+
+    def _compile(self, terms: Iterable[Term]) -> Optional[Pattern]:
+        """regex เดียวของศัพท์ใน terms (None ถ้าไม่มีศัพท์)"""
+        # คำยาวก่อน ("Young Master" ก่อน "Master") และไม่จับกลางคำภาษาอังกฤษ (รองรับพหูพจน์ -s/-es)
+        terms = sorted(terms, key=lambda t: len(t.source), reverse=True)
+        if not terms:
+            return None
+        alternatives = "|".join(re.escape(term.source) for term in terms)
+        return re.compile(rf"(?<![A-Za-z])({alternatives})(?:es|s)?(?![A-Za-z])",
+                          0 if self.case_sensitive else re.IGNORECASE)
+
+    @classmethod
+    def load(cls, path: str) -> "Glossary":
+        """อ่านไฟล์ศัพท์ (.json หรือข้อความบรรทัดละคำ "English = Thai | variant")"""
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.lower().endswith(".json"):
+                return cls(json.load(f))
+            terms, variants = {}, {}
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#") or "=" not in line:
+                    continue
+                source, target = line.split("=", 1)
+                thai, *wrong = [part.strip() for part in target.split("|")]
+                terms[source.strip()] = thai
+                variants[source.strip()] = wrong
+            return cls(terms, variants)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Glossary":
+        return cls(data.get("terms", {}), data.get("variants"), data.get("case_sensitive", False))
+
+    def to_dict(self) -> Dict:
+        """ศัพท์ทั้งหมดในรูปที่เก็บเป็น JSON ได้ (ใช้กับ from_dict)"""
+        data = {"terms": {term.source: term.thai for term in self.terms.values()},
+                "variants": {term.source: term.variants for term in self.terms.values() if term.variants}}
+        if self.case_sensitive:
+            data["case_sensitive"] = True
+        return data
+
+    @classmethod
+    def for_directory(cls, directory: str) -> Optional["Glossary"]:
+        """glossary.txt ของนิยายในโฟลเดอร์ต้นฉบับ ถ้ามี"""
+        path = os.path.join(directory, GLOSSARY_FILENAME)
+        return cls.load(path) if os.path.exists(path) else None
+
+    def find_terms(self, text: str) -> List[Term]:
+        """ศัพท์ที่ปรากฏใน text เรียงตามตำแหน่งที่พบครั้งแรก"""
+        if not self._matcher:
+            return []
+        found: Dict[str, Term] = {}
+        for match in self._matcher.finditer(text):
+            key = self._key(match.group(1))
+            if key not in found:
+                found[key] = self.terms[key]
+        return list(found.values())
+
+    def prompt_notes(self, text: str) -> str:
+        """รายการศัพท์เฉพาะที่ใช้ใน text สำหรับใส่ใน prompt (ว่างถ้าไม่มีศัพท์ใดปรากฏ)"""
+        terms = self.find_terms(text)
+        if not terms:
+            return ""
+        return GLOSSARY_HEADER + "\n" + "\n".join(f"{t.source}{NOTE_SEPARATOR}{t.thai}" for t in terms)
+
+    def repair(self, translation: str, source: Optional[str] = None) -> str:
+        """แทนศัพท์ที่โมเดลไม่ได้แปล (ยังเป็นภาษาอังกฤษ) และคำแปลที่ผิดตามที่ระบุไว้ ด้วยคำแปลใน glossary
+
+        ถ้าระบุ source (ต้นฉบับของ chunk) จะแก้เฉพาะศัพท์ที่ปรากฏในต้นฉบับ
+        """
+        terms = list(self.terms.values()) if source is None else self.find_terms(source)
+        matcher = self._matcher if source is None else self._compile(terms)
+        if not matcher:
+            return translation
+        translation = matcher.sub(lambda m: self.terms[self._key(m.group(1))].thai, translation)
+        for term in terms:
+            for variant in term.variants:
+                if variant in translation:
+                    translation = re.sub(_bounded(variant), lambda m: term.thai, translation)
+        return translation
+
+    def missing_terms(self, source: str, translation: str) -> List[Term]:
+        """ศัพท์ที่อยู่ในต้นฉบับแต่คำแปลใน glossary ไม่ปรากฏในผลการแปล"""
+        return [term for term in self.find_terms(source) if term.thai not in translation]
@@ -0,0 +1,125 @@
+"""
+Model Session
+Keeps the translation model resident in Ollama for the length of a run: loads it
+with an empty request once the run knows its num_ctx (before the first chunk),
+pins it with keep_alive, reports reloads seen in load_duration and unloads it
+when the run ends.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional, Union
+
+from ollama_client import OllamaClient, OllamaError
+from ollama_pool import OllamaPool
+from telemetry import COLD_LOAD_SECONDS
+
+# ระยะเวลาที่ขอให้ Ollama เก็บโมเดลไว้หลังคำขอล่าสุด (ค่าเริ่มต้นของ Ollama คือ 5m)
+DEFAULT_KEEP_ALIVE = "30m"
+
+
+class ModelSession:
+    """ช่วงการทำงานที่โมเดลถูกโหลดค้างไว้ ใช้แบบ context manager ซ้อนกันได้
+
+    โหลดโมเดลเมื่อรอบการแปลแจ้ง options ที่จะใช้ (ensure_options) ไม่ใช่ตอนเข้า session
+    เพราะ num_ctx ต่างจากที่โหลดไว้ = Ollama โหลดโมเดลใหม่ และปล่อยโมเดล (keep_alive=0)
+    เมื่อออกจากชั้นนอกสุด ถ้า release=False จะไม่ปล่อยโมเดลตอนจบ (ให้ Ollama ปล่อยเองตาม keep_alive)
+
+    ข้อความทั้งหมดส่งผ่าน log (เช่น บรรทัดความคืบหน้าของ translator) เพราะ observe ถูกเรียกจาก worker thread
+    """
+
+    def __init__(self, client: Union[OllamaClient, OllamaPool], model_name: str,
+                 options: Optional[Dict] = None, keep_alive=DEFAULT_KEEP_ALIVE, release: bool = True,
+                 reload_seconds: float = COLD_LOAD_SECONDS, log: Callable[[str], None] = print):
+        self.client = client
+        self.model_name = model_name
+        self.options = options
+        self.keep_alive = keep_alive
+        self.release = release
+        self.reload_seconds = reload_seconds
+        self.log = log
+        self.reloads = 0
+        self.load_time = 0.0
+        # โหลดด้วย self.options แล้วใน session นี้ / มีคำขอแปลใน session นี้ (โมเดลถูกโหลดโดยคำขอนั้น)
+        self.loaded = False
+        self.used = False
+        self._depth = 0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self._depth > 0
+
+    @property
+    def loaded_num_ctx(self) -> int:
+        """num_ctx ที่โหลดโมเดลไว้ใน session นี้ (0 ถ้ายังไม่ได้โหลด)"""
+        return (self.options or {}).get("num_ctx", 0) if self.loaded else 0
+
+    def start(self) -> bool:
+        """โหลดโมเดลด้วยคำขอว่าง คืน False ถ้าโหลดไม่สำเร็จ (การแปลจะโหลดเองในคำขอแรก)"""
+        started = time.time()
+        try:
+            self.client.load(self.model_name, self.keep_alive, self.options)
+        except OllamaError as e:
+            self.log(f"โหลดโมเดลล่วงหน้าไม่สำเร็จ: {e}")
+            return False
+        self.load_time = time.time() - started
+        self.log(f"โหลดโมเดล {self.model_name} พร้อมใช้งานใน {self.load_time:.1f} วินาที (keep_alive {self.keep_alive})")
+        return True
+
+    def ensure_options(self, options: Dict) -> None:
+        """ระหว่าง session: โหลดโมเดลด้วย options นี้ถ้ายังไม่ได้โหลด หรือ num_ctx ต่างจากที่โหลดไว้
+
+        เรียกก่อนคำขอแรกของรอบ คำขอแรกจะได้ไม่ต้องโหลดโมเดลเอง
+        """
+        if not self.active or self.loaded_num_ctx == options.get("num_ctx"):
+            return
+        self.options = options
+        self.loaded = self.start()
+
+    def observe(self, result: Optional[Dict]) -> bool:
+        """ตรวจผลจาก Ollama ระหว่าง session คืน True ถ้าโมเดลถูกโหลดใหม่กลางทาง
+
+        ถ้าโหลดล่วงหน้าไม่สำเร็จ การโหลดที่เห็นในผลแรกคือการโหลดครั้งแรกของ session ไม่นับเป็นการโหลดใหม่
+        """
+        if not self.active or not result:
+            return False
+        with self._lock:
+            initial = not self.loaded and not self.used
+            self.used = True
+        load_seconds = result.get("load_duration", 0) / 1e9
+        if load_seconds < self.reload_seconds or initial:
+            return False
+        with self._lock:
+            self.reloads += 1
+        self.log(f"คำเตือน: โมเดลถูกโหลดใหม่ระหว่างแปล ({load_seconds:.1f} วินาที) "
+              f"อาจมีโมเดลอื่นแย่งหน่วยความจำ หรือ num_ctx ไม่ตรงกับที่โหลดไว้")
+        return True
+
+    def close(self) -> None:
+        if self.reloads:
+            self.log(f"โมเดลถูกโหลดใหม่ {self.reloads} ครั้งระหว่าง session")
+        if not self.release or not (self.loaded or self.used):
+            return
+        try:
+            self.client.unload(self.model_name)
+            self.log(f"ปล่อยโมเดล {self.model_name} ออกจากหน่วยความจำแล้ว")
+        except OllamaError as e:
+            self.log(f"ปล่อยโมเดลไม่สำเร็จ: {e}")
+
+    def __enter__(self) -> "ModelSession":
+        with self._lock:
+            self._depth += 1
+            outermost = self._depth == 1
+        if outermost:
+            self.reloads = 0
+            self.loaded = False
+            self.used = False
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        with self._lock:
+            self._depth -= 1
+            outermost = self._depth == 0
+        if outermost:
+            self.close()
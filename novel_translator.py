@@ -1,214 +1,1050 @@
-import requests
 import json
-import time
 import os
-from typing import List
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager, nullcontext
+from translation_journal import TranslationJournal, hash_text
+from work_queue import FileJob, ProgressDisplay, ORDER_CHAPTER, ORDER_LARGEST, order_jobs
+from translation_cache import TranslationCache, DEFAULT_CACHE_PATH, make_cache_key
+from ollama_client import OllamaClient, OllamaError, OllamaUnavailableError
+from ollama_pool import OllamaPool
+from rate_control import AdaptiveRateController
+from telemetry import MetricsRecorder, format_summary, summarize
+from model_session import DEFAULT_KEEP_ALIVE, ModelSession
+from token_checker import MAX_SANE_LENGTH_RATIO, MIN_SANE_LENGTH_RATIO, TokenChecker
+from runaway_guard import RunawayGuard
+from token_stream import DEFAULT_NUM_CTX
+from token_calibration import DEFAULT_CALIBRATION_PATH, CalibrationProfile, TokenCalibration
+from output_cleaner import OutputCleaner
+from prompt_templates import DEFAULT_TEMPLATE, LAYOUT_INLINE, LAYOUTS, get_template
+from dedupe import ParagraphIndex
+from sync_manifest import SyncManifest, align_chunks
+from glossary import GLOSSARY_FILENAME, GLOSSARY_HEADER, GLOSSARY_NOTE_LINE, Glossary
+import chunker
 
 class NovelTranslator:
-    def __init__(self, model_name="scb10x/typhoon-translate-4b", ollama_url="http://localhost:11434"):
+    def __init__(self, model_name="scb10x/typhoon-translate-4b", ollama_url="http://localhost:11434",
+                 cache_path: Optional[str] = DEFAULT_CACHE_PATH, prompt_template: str = DEFAULT_TEMPLATE,
+                 ollama_urls: Optional[List[str]] = None, metrics_path: Optional[str] = None,
+                 prometheus_path: Optional[str] = None, keep_alive=DEFAULT_KEEP_ALIVE,
+                 release_model: bool = True, prompt_layout: str = LAYOUT_INLINE,
+                 unwanted_phrases: Optional[List[str]] = None, glossary_path: Optional[str] = None,
+                 context_tokens: int = 0, dedupe_paragraphs: bool = False,
+                 calibration_path: Optional[str] = DEFAULT_CALIBRATION_PATH):
         self.model_name = model_name
+        self.prompt = get_template(prompt_template)
+        # "system" ส่งคำสั่งคงที่ใน system field ให้ทุกคำขอขึ้นต้นเหมือนกัน (ใช้ KV cache ของ prefix ซ้ำได้)
+        if prompt_layout not in LAYOUTS:
+            raise ValueError(f"Unknown prompt layout '{prompt_layout}', use one of: {', '.join(LAYOUTS)}")
+        self.prompt_layout = prompt_layout
         self.ollama_url = ollama_url
-        self.api_url = f"{ollama_url}/api/generate"
-        
-    def chunk_text(self, text: str, max_chunk_size: int = 2000) -> List[str]:
-        """แบ่งข้อความเป็น chunks โดยพยายามตัดที่จุดสิ้นสุดประโยค"""
-        # แยกตามย่อหน้า
-        paragraphs = text.split('\n\n')
-        chunks = []
-        current_chunk = ""
-        
-        for paragraph in paragraphs:
-            # ถ้าย่อหน้านี้ + chunk ปัจจุบันยังไม่เกินขีดจำกัด
-            if len(current_chunk + paragraph) < max_chunk_size:
-                current_chunk += paragraph + "\n\n"
-            else:
-                # บันทึก chunk ปัจจุบันและเริ่ม chunk ใหม่
-                if current_chunk.strip():
-                    chunks.append(current_chunk.strip())
-                current_chunk = paragraph + "\n\n"
-        
-        # เพิ่ม chunk สุดท้าย
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
-            
-        return chunks
+        # connection pool + retry แบบ backoff ใช้ร่วมกันทุก thread
+        # ถ้าระบุ ollama_urls หลายเครื่อง จะกระจายคำขอไปยังเครื่องที่ว่างที่สุด
+        if ollama_urls and len(ollama_urls) > 1:
+            self.client = OllamaPool(ollama_urls)
+        else:
+            self.client = OllamaClient(ollama_urls[0] if ollama_urls else ollama_url)
+        self.generation_options = {
+            "temperature": 0.2,      # Lower for more consistent translation
+            "top_p": 0.85,           # Better focus on likely translations
+            "num_ctx": DEFAULT_NUM_CTX,  # Upper bound; each request uses the smallest bucket that fits (request_options)
+            "repeat_penalty": 1.1,   # Prevent repetitive phrases
+            "top_k": 40             # Limit vocabulary choices for quality
+        }
+        # โหลดโมเดลค้างไว้ตลอดการแปลไฟล์/โฟลเดอร์ (with self.session: ...)
+        # คำเตือนจาก session ส่งผ่าน _log เพราะ observe ถูกเรียกจาก worker thread
+        self.session = ModelSession(self.client, model_name, self.generation_options,
+                                    keep_alive=keep_alive, release=release_model, log=self._log)
+        # ตัวทำความสะอาดผลลัพธ์ (วลีทั้งหมด compile เป็น regex เดียว)
+        self.cleaner = OutputCleaner(self.UNWANTED_PHRASES if unwanted_phrases is None else unwanted_phrases,
+                                     line_patterns=self.UNWANTED_LINES)
+        # ศัพท์เฉพาะ: ใส่เฉพาะคำที่พบในแต่ละ chunk ลงใน prompt และแก้คำแปลให้ตรงหลังแปล
+        # ถ้าไม่ระบุ glossary_path จะใช้ glossary.txt ในโฟลเดอร์ต้นฉบับที่กำลังแปล (ถ้ามี)
+        self.glossary = Glossary.load(glossary_path) if glossary_path else Glossary.default()
+        self.glossary_path = glossary_path
+        # จำนวน chunk ที่คำแปลไม่มีศัพท์ตาม glossary ในรอบนี้ แยกตามศัพท์
+        self._missing_terms: Dict[str, int] = {}
+        # งบ token ของบริบท (ท้ายคำแปลของ chunk ก่อนหน้า) ที่ส่งไปกับแต่ละ chunk, 0 = ปิด
+        # เมื่อเปิด chunks ในไฟล์เดียวกันต้องแปลตามลำดับ (ไฟล์ต่างกันยังแปลพร้อมกันได้)
+        self.context_tokens = context_tokens
+        # แยกย่อหน้าที่ซ้ำหรือเกือบซ้ำในหลายบท (recap, ประกาศผู้สนับสนุน, โน้ตผู้แปล) ออกเป็น chunk
+        # ของตัวเองด้วยข้อความเดียวกัน ให้แปลครั้งเดียวต่อรอบและใช้ cache ร่วมกันข้ามรอบ
+        self.dedupe_paragraphs = dedupe_paragraphs
+        self.paragraph_index: Optional[ParagraphIndex] = None
+        # manifest ของโฟลเดอร์ผลลัพธ์ระหว่าง translate_directory
+        self._manifest: Optional[SyncManifest] = None
+        # ตัวควบคุมอัตราการส่งคำขอ (ตั้งค่าระหว่างการแปลแต่ละรอบ)
+        self.rate_controller: Optional[AdaptiveRateController] = None
+        # เรียนรู้จำนวน token จริงของโมเดล (prompt_eval_count/eval_count) เทียบกับที่นับด้วย tokenizer ของเรา
+        # บันทึกใน calibration_path ตอนจบแต่ละรอบ (ส่ง calibration_path=None เพื่อปิด ใช้ค่าเริ่มต้น x1.2)
+        self.calibration = TokenCalibration(calibration_path) if calibration_path else None
+        # ใช้ tokenizer เดียวกับเครื่องมือตรวจ token สำหรับแบ่ง chunk ตามงบ token
+        self.token_checker = TokenChecker(model_name, ollama_url, calibration=(
+            self.calibration.profile(model_name) if self.calibration else CalibrationProfile()))
+        # cache ผลการแปลตามเนื้อหา (ส่ง cache_path=None เพื่อปิด)
+        self.cache = TranslationCache(cache_path) if cache_path else None
+        # เวลาและจำนวน token ต่อคำขอจาก Ollama (เขียนต่อท้าย metrics_path เป็น JSONL ถ้าระบุ)
+        self.metrics = MetricsRecorder(metrics_path)
+        # ไฟล์สรุปแบบ Prometheus text สำหรับ node_exporter textfile collector
+        self.prometheus_path = prometheus_path
+        # ไฟล์และลำดับ chunk ที่ thread นี้กำลังแปล ใช้ติดป้ายให้ metrics
+        self._metrics_context = threading.local()
+        # ตำแหน่งเริ่มของ metrics ในการแปลรอบปัจจุบัน
+        self._metrics_mark = 0
+        # num_ctx ที่ใช้ไปแล้วในรอบนี้ คำขอถัดไปไม่ใช้ต่ำกว่านี้ (เปลี่ยน num_ctx = Ollama โหลดโมเดลใหม่)
+        self._num_ctx_floor = 0
+        self._sizing_lock = threading.Lock()
+        # บรรทัดแสดงความคืบหน้าของ _run_jobs ที่กำลังทำงาน (ข้อความจาก worker thread ส่งผ่าน _log)
+        self._progress: Optional[ProgressDisplay] = None
+        
+    def chunk_text(self, text: str, max_chunk_size: int = 2000, max_chunk_tokens: Optional[int] = None) -> List[str]:
+        """แบ่งข้อความเป็น chunks โดยพยายามตัดที่จุดสิ้นสุดประโยค
+
+        ถ้าระบุ max_chunk_tokens จะรวมย่อหน้าตามจำนวน token จริง (นับด้วย TokenChecker.count_tokens)
+        แทนจำนวนตัวอักษร และไม่เกินงบ token ที่ num_ctx รองรับได้
+        """
+        if max_chunk_tokens:
+            budget = min(max_chunk_tokens, self.chunk_token_budget())
+            return chunker.chunk_text(text, budget, self.token_checker.count_tokens)
+        return chunker.chunk_text(text, max_chunk_size)
+    
+    def chunk_token_budget(self, output_ratio: Optional[float] = None, safety_margin: int = 256) -> int:
+        """จำนวน token สูงสุดของต้นฉบับต่อ chunk ที่ยังเหลือที่ให้ prompt และคำแปลใน num_ctx
+
+        นับด้วย tokenizer ของเรา แล้วแปลงเป็น token ของโมเดลตาม calibration profile
+        output_ratio คือ token ของคำแปลต่อ token ต้นฉบับ (ไม่ระบุ = p90 ที่เรียนรู้ไว้ หรือ 1.2)
+        """
+        prompt_tokens = self.prompt.fixed_tokens(self.token_checker.count_tokens, self.prompt_layout)
+        if self.context_tokens:
+            prompt_tokens += self.context_tokens + self.token_checker.count_tokens(self.CONTEXT_HEADER)
+        return self.token_checker.calibration.chunk_token_budget(prompt_tokens, self.generation_options["num_ctx"],
+                                                                 output_ratio, safety_margin)
+    
+    # หัวข้อของบริบทจาก chunk ก่อนหน้าใน prompt
+    CONTEXT_HEADER = "ข้อความที่แปลแล้วก่อนหน้านี้ (ใช้ให้ชื่อ สรรพนาม และน้ำเสียงต่อเนื่อง ไม่ต้องแปลซ้ำ):"
+    
+    # รายการคำหรือประโยคที่ต้องการลบออกจากผลการแปล (บรรทัดที่มีวลีเหล่านี้จะถูกทิ้งทั้งบรรทัด)
+    # บรรทัดที่มีแต่เลขข้อ เช่น "1." ถูกทิ้งแยกต่างหากโดย OutputCleaner
+    UNWANTED_PHRASES = [
+        "คุณคือนักแปลมืออาชีพ",
+        "กรุณาแปลเนื้อหาต่อไปนี้",
+        "หลักการแปล:",
+        "การแปล:",
+        "แปลเนื้อหาต่อไปนี้จากภาษาอังกฤษเป็นภาษาไทย",
+        "รักษาความหมายและบรรยากาศ",
+        "ใช้ภาษาไทยที่อ่านง่าย",
+        "แปลศัพท์เฉพาะ:",
+        "คงชื่อตัวละคร",
+        "ปรับการใช้ภาษา",
+        "รักษาบุคลิกและสไตล์",
+        GLOSSARY_HEADER,
+        CONTEXT_HEADER
+    ]
+    # regex ของบรรทัดที่ต้องทิ้งเมื่อตรงทั้งบรรทัด: รายการศัพท์ใน prompt ที่โมเดลพิมพ์ซ้ำ
+    # (ไม่ทิ้งทุกบรรทัดที่มี "→" เพราะบรรทัดสถานะ/ค่าพลังในเนื้อเรื่องก็ใช้ลูกศร)
+    UNWANTED_LINES = [GLOSSARY_NOTE_LINE]
+    
+    def clean_line(self, line: str) -> Optional[str]:
+        """ทำความสะอาดบรรทัดเดียว คืน None ถ้าต้องทิ้งบรรทัดนี้"""
+        return self.cleaner.clean_line(line)
     
     def clean_translation_output(self, text: str) -> str:
         """ทำความสะอาดผลลัพธ์การแปลโดยลบส่วนที่ไม่ต้องการออก"""
-        # รายการคำหรือประโยคที่ต้องการลบออก
-        unwanted_phrases = [
-            "คุณคือนักแปลมืออาชีพ",
-            "กรุณาแปลเนื้อหาต่อไปนี้",
-            "หลักการแปล:",
-            "การแปล:",
-            "แปลเนื้อหาต่อไปนี้จากภาษาอังกฤษเป็นภาษาไทย",
-            "รักษาความหมายและบรรยากาศ",
-            "ใช้ภาษาไทยที่อ่านง่าย",
-            "แปลศัพท์เฉพาะ:",
-            "คงชื่อตัวละคร",
-            "ปรับการใช้ภาษา",
-            "รักษาบุคลิกและสไตล์",
-            "1.", "2.", "3.", "4.", "5.", "6."
-        ]
-        
-        lines = text.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            # ข้ามบรรทัดว่างและบรรทัดที่มีคำที่ไม่ต้องการ
-            if not line:
-                continue
-            
-            # ตรวจสอบว่าบรรทัดนี้มีคำที่ไม่ต้องการหรือไม่
-            should_skip = False
-            for phrase in unwanted_phrases:
-                if phrase in line:
-                    should_skip = True
-                    break
-            
-            # ข้ามบรรทัดที่มีเฉพาะตัวเลขและจุด (เช่น "1.", "2.")
-            if line.strip() in ['1.', '2.', '3.', '4.', '5.', '6.']:
-                should_skip = True
-            
-            if not should_skip:
-                cleaned_lines.append(line)
-        
-        # รวมบรรทัดที่สะอาดแล้วและลบบรรทัดว่างที่ซ้ำ
-        result = '\n'.join(cleaned_lines)
-        
-        # ลบบรรทัดว่างที่ซ้ำกันออก
-        while '\n\n\n' in result:
-            result = result.replace('\n\n\n', '\n\n')
-        
-        return result.strip()
+        return self.cleaner.clean(text)
     
-    def translate_chunk(self, text: str) -> str:
-        """แปลข้อความ chunk เดียว"""
-        prompt = f"""แปลข้อความต่อไปนี้จากภาษาอังกฤษเป็นภาษาไทยให้เป็นธรรมชาติและเหมาะสมกับนิยาย Wuxia/Xianxia โดยคงชื่อตัวละครและสถานที่ไว้:
-
-{text}"""
+    def finish_translation(self, raw: str, source: str) -> str:
+        """ผลลัพธ์ดิบ -> คำแปลสุดท้าย: ทำความสะอาดแล้วแก้ศัพท์เฉพาะที่อยู่ในต้นฉบับ (source) ให้ตรงกับ glossary"""
+        return self.glossary.repair(self.clean_translation_output(raw), source)
+    
+    def _prompt_notes(self, text: str, context: str = "") -> str:
+        """ข้อความเสริมของ chunk: ศัพท์เฉพาะที่พบ และบริบทจาก chunk ก่อนหน้า (ถ้ามี)"""
+        notes = [self.glossary.prompt_notes(text)]
+        if context:
+            notes.append(self.CONTEXT_HEADER + "\n" + context)
+        return "\n\n".join(note for note in notes if note)
+    
+    def previous_context(self, previous_translation: Optional[str]) -> str:
+        """ท้ายคำแปลของ chunk ก่อนหน้าที่ไม่เกิน context_tokens (ว่างถ้าปิดโหมดบริบท)"""
+        if not self.context_tokens or not previous_translation:
+            return ""
+        return chunker.tail_text(previous_translation, self.context_tokens, self.token_checker.count_tokens)
+    
+    def _job_context(self, job: FileJob, index: int) -> str:
+        if index == 0 or job.translated[index - 1] is None:
+            return ""
+        # chunk ก่อนหน้าที่แปลไม่สำเร็จเก็บต้นฉบับไว้ ไม่ใช้เป็นบริบท
+        if job.translated[index - 1] == job.chunks[index - 1]:
+            return ""
+        return self.previous_context(job.translated[index - 1])
+    
+    def _cache_key(self, text: str, context: str = "") -> Optional[str]:
+        if not self.cache:
+            return None
+        # ศัพท์และบริบทที่ใส่ใน prompt เป็นส่วนหนึ่งของ prompt จึงรวมใน key
+        # (แก้ glossary แล้วจะแปลใหม่เฉพาะ chunk ที่ได้รับผล)
+        signature = self.prompt.signature(self.prompt_layout) + "\n" + self._prompt_notes(text, context)
+        return make_cache_key(text, signature, self.model_name, self.generation_options)
+    
+    def _prompt_tokens(self, fields: dict) -> int:
+        """จำนวน token ของ prompt ทั้งหมดที่ส่ง (system + prompt) นับด้วย tokenizer ของเรา"""
+        count_tokens = self.token_checker.count_tokens
+        return count_tokens(fields.get("system", "")) + count_tokens(fields["prompt"])
+    
+    def _reserve_num_ctx(self, num_ctx: int) -> int:
+        """num_ctx ที่คำขอนี้ใช้: ไม่ต่ำกว่าที่ใช้ไปแล้วในรอบนี้ โมเดลจึงถูกโหลดใหม่อย่างมากครั้งละ bucket"""
+        with self._sizing_lock:
+            self._num_ctx_floor = max(self._num_ctx_floor, num_ctx)
+            return self._num_ctx_floor
+    
+    def request_options(self, text: str, fields: dict) -> dict:
+        """options ของคำขอหนึ่ง: num_ctx ขนาดเล็กสุดที่พอกับ prompt และคำแปล และ num_predict ตามความยาวคำแปลที่คาด
 
+        ขนาดคำนวณด้วย TokenChecker.size_request (calibration profile เดียวกับ optimize_settings)
+        generation_options["num_ctx"] เป็นเพดาน
+        """
+        sizing = self.token_checker.size_request(self._prompt_tokens(fields), self.token_checker.count_tokens(text),
+                                                 self.generation_options["num_ctx"])
+        return dict(self.generation_options, num_ctx=self._reserve_num_ctx(sizing["num_ctx"]),
+                    num_predict=sizing["num_predict"])
+    
+    def _remaining_context(self, payload: dict) -> int:
+        """token ที่เหลือใน num_ctx ของคำขอหลังหัก prompt (เพดาน num_predict สูงสุดที่เป็นไปได้)"""
+        return payload["options"]["num_ctx"] - self.token_checker.calibration.model_tokens(
+            self._prompt_tokens(payload))
+    
+    def _build_payload(self, text: str, context: str = "") -> dict:
+        fields = self.prompt.payload_fields(text, self.prompt_layout, self._prompt_notes(text, context))
         payload = {
             "model": self.model_name,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.2,      # Lower for more consistent translation
-                "top_p": 0.85,           # Better focus on likely translations
-                "max_tokens": 6000,      # Increased for longer Thai translations
-                "num_ctx": 16384,        # Increased context window for better coherence
-                "repeat_penalty": 1.1,   # Prevent repetitive phrases
-                "top_k": 40             # Limit vocabulary choices for quality
-            }
+            "options": self.request_options(text, fields),
+            "keep_alive": self.session.keep_alive
         }
+        payload.update(fields)
+        return payload
+    
+    def size_run(self, jobs: List[FileJob]) -> None:
+        """เลือก num_ctx ของรอบนี้จาก chunk ที่ต้องใช้ bucket ใหญ่ที่สุดก่อนเริ่มแปล
+
+        ถ้าอยู่ใน session จะโหลดโมเดลด้วย num_ctx นี้ตอนนี้ (ครั้งเดียวก่อนคำขอแรก)
+        ถ้าโมเดลถูกโหลดไว้แล้วใน session ด้วย num_ctx ที่ใหญ่พอ ใช้ค่านั้นต่อโดยไม่โหลดใหม่
+        """
+        count_tokens = self.token_checker.count_tokens
+        # บริบทจาก chunk ก่อนหน้ายังไม่รู้ตอนนี้ จึงเผื่อเต็มงบ context_tokens
+        reserved = self.context_tokens + count_tokens(self.CONTEXT_HEADER) if self.context_tokens else 0
+        ceiling = self.generation_options["num_ctx"]
+        largest = 0
+        for job in jobs:
+            for index in job.pending_indices():
+                text = job.chunks[index]
+                fields = self.prompt.payload_fields(text, self.prompt_layout, self._prompt_notes(text))
+                sizing = self.token_checker.size_request(self._prompt_tokens(fields) + reserved,
+                                                         count_tokens(text), ceiling)
+                largest = max(largest, sizing["num_ctx"])
+        if largest:
+            if largest <= self.session.loaded_num_ctx <= ceiling:
+                largest = self.session.loaded_num_ctx
+            num_ctx = self._reserve_num_ctx(largest)
+            print(f"num_ctx ของรอบนี้: {num_ctx:,} (เพดาน {ceiling:,}) num_predict กำหนดแยกตามความยาวแต่ละส่วน")
+            self.session.ensure_options(dict(self.generation_options, num_ctx=num_ctx))
+    
+    @contextmanager
+    def _chunk_context(self, job: FileJob, index: int):
+        """ติดป้ายไฟล์และลำดับ chunk ให้ metrics ของคำขอที่ thread นี้ส่งระหว่างนี้"""
+        self._metrics_context.file = job.input_file
+        self._metrics_context.chunk = index
+        try:
+            yield
+        finally:
+            self._metrics_context.file = None
+            self._metrics_context.chunk = None
+    
+    def _record_metrics(self, queued: float, started: float, ok: bool, result: Optional[dict] = None,
+                        **fields) -> None:
+        self.metrics.record(started, time.time(), ok, result, queued,
+                            file=getattr(self._metrics_context, 'file', None),
+                            chunk=getattr(self._metrics_context, 'chunk', None),
+                            model=self.model_name, **fields)
+    
+    def _record_cache_hit(self) -> None:
+        now = time.time()
+        self._record_metrics(now, now, True, cache_hit=True)
+    
+    def _log(self, message: str) -> None:
+        """ข้อความระหว่างแปล chunk: ผ่านบรรทัดความคืบหน้าถ้ากำลังแสดงอยู่ (worker thread) ไม่ให้บรรทัดนั้นเสีย"""
+        progress = self._progress
+        if progress:
+            progress.log(message)
+        else:
+            print(message)
+    
+    def _calibrate(self, payload: dict, text: str, raw: str, result: Optional[dict]) -> None:
+        """เก็บจำนวน token ที่ Ollama รายงานของคำขอนี้คู่กับที่นับเอง ลง calibration profile"""
+        if not self.calibration or not result or "eval_count" not in result:
+            return
+        count_tokens = self.token_checker.count_tokens
+        self.calibration.observe(
+            self.model_name,
+            prompt_local=self._prompt_tokens(payload),
+            prompt_model=result.get("prompt_eval_count", 0),
+            source_local=count_tokens(text),
+            output_local=count_tokens(raw),
+            output_model=result["eval_count"],
+            truncated=result.get("done_reason") == "length")
+    
+    def _translate_job_chunk(self, job: FileJob, index: int, context: str = "") -> Optional[str]:
+        with self._chunk_context(job, index):
+            return self.translate_chunk_raw(job.chunks[index], context)
+    
+    def _generate_guarded(self, payload: dict, text: str) -> Optional[dict]:
+        """เรียก /api/generate แบบ stream ผ่านตัวควบคุมอัตรา (ถ้ามี) แจ้งผลให้ปรับจังหวะการส่ง และบันทึก metrics
+
+        ยกเลิกทันทีที่ RunawayGuard พบว่าโมเดลวนซ้ำหรือยาวเกิน และไม่รับคำแปลที่จบแล้วแต่สั้นเกิน
+        คืน JSON สุดท้ายของ stream (response รวมทุกส่วน) หรือ None ถ้าถูกยกเลิก/ไม่รับ
+        """
+        guard = RunawayGuard(text, MAX_SANE_LENGTH_RATIO, MIN_SANE_LENGTH_RATIO)
+        controller = self.rate_controller
+        queued = time.time()
+        started = controller.acquire() if controller else queued
+        # ถูกยกเลิกหรือผิดพลาดที่ไม่ใช่ความแออัด (status_code 0) ไม่ทำให้ตัวควบคุมอัตราลดจังหวะ
+        outcome = {"ok": False, "status_code": 0, "result": None}
+        parts = []
+        stream = None
+        try:
+            stream = self.client.generate_stream(payload)
+            for data in stream:
+                parts.append(data.get('response', ''))
+                if data.get('done'):
+                    outcome.update(ok=True, result=dict(data, response="".join(parts)))
+                    break
+                if guard.feed(parts[-1]):
+                    break
+            if not outcome["ok"] and guard.reason is None:
+                raise OllamaError("Stream ended before the response was complete")
+        except OllamaError as e:
+            outcome["status_code"] = e.status_code
+            raise
+        finally:
+            # ปิด stream เพื่อให้ Ollama หยุด generate ทันทีเมื่อยกเลิก
+            if stream is not None:
+                stream.close()
+            if controller:
+                controller.release(started, **outcome)
+            if outcome["ok"]:
+                self._record_metrics(queued, started, True, outcome["result"])
+                self.session.observe(outcome["result"])
+            else:
+                self._record_metrics(queued, started, False, status_code=outcome["status_code"],
+                                     aborted=guard.reason, output_chars=guard.length)
+        
+        if not outcome["ok"]:
+            self._log(f"ยกเลิกการแปล: {guard.reason}")
+            return None
+        if outcome["result"].get("done_reason") != "length" and guard.finish():
+            self._log(f"ไม่รับคำแปล: {guard.reason}")
+            return None
+        return outcome["result"]
+    
+    def translate_chunk(self, text: str, context: str = "") -> str:
+        """แปลข้อความ chunk เดียว
+
+        context คือคำแปลท้าย chunk ก่อนหน้า (ดู previous_context) ส่งไปให้โมเดลใช้เชื่อมความต่อเนื่อง
+        """
+        raw = self.translate_chunk_raw(text, context)
+        if raw is None:
+            return text
+        
+        # ทำความสะอาดผลลัพธ์และแก้ศัพท์เฉพาะก่อนส่งคืน
+        return self.finish_translation(raw, text)
+    
+    # options ของการแปลซ้ำหลังโมเดลวนซ้ำ: ลงโทษคำซ้ำแรงขึ้นและมองย้อนหลังไกลขึ้น
+    RUNAWAY_RETRY_OPTIONS = {"repeat_penalty": 1.3, "repeat_last_n": 256, "temperature": 0.4}
+    # แบ่งครึ่ง chunk ที่ยังวนซ้ำได้กี่ชั้น
+    MAX_SPLIT_DEPTH = 2
+    
+    def translate_chunk_raw(self, text: str, context: str = "") -> Optional[str]:
+        """แปลข้อความ chunk เดียว คืนผลลัพธ์ดิบของโมเดล (ยังไม่ทำความสะอาด) หรือ None ถ้าแปลไม่สำเร็จ
+
+        ถ้าโมเดลวนซ้ำหรือคำแปลยาว/สั้นผิดปกติ (ดู RunawayGuard) จะแปลใหม่ด้วย RUNAWAY_RETRY_OPTIONS
+        และถ้ายังไม่ผ่าน จะแบ่ง chunk ครึ่งหนึ่งแล้วแปลทีละครึ่ง
+        """
+        return self._translate_raw(text, context, 0)
+    
+    def _translate_halves(self, text: str, context: str, depth: int) -> Optional[str]:
+        """แปล text ทีละครึ่ง (แต่ละครึ่งผ่าน guard และแบ่งต่อได้จนถึง MAX_SPLIT_DEPTH) แล้วต่อผลดิบกลับ"""
+        halves, separator = chunker.split_in_half(text)
+        if depth >= self.MAX_SPLIT_DEPTH or len(halves) < 2:
+            self._log("แปลส่วนนี้ไม่สำเร็จ: คำแปลผิดปกติ และแบ่งย่อยต่อไม่ได้")
+            return None
+        self._log(f"แบ่งส่วนที่แปลไม่ผ่านเป็นสองส่วน ({len(halves[0])} + {len(halves[1])} ตัวอักษร)")
+        raws = []
+        for half in halves:
+            raw = self._translate_raw(half, context, depth + 1)
+            if raw is None:
+                return None
+            raws.append(raw.strip())
+        return separator.join(raws)
+    
+    def _translate_raw(self, text: str, context: str, depth: int, rejected: bool = False) -> Optional[str]:
+        """rejected=True: ผลของการแปลครั้งแรก (แบบ stream) ไม่ผ่าน guard แล้ว เริ่มจากการแปลซ้ำเลย"""
+        cache_key = self._cache_key(text, context)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self._record_cache_hit()
+                return cached
+        
+        payload = self._build_payload(text, context)
         
         try:
-            response = requests.post(self.api_url, json=payload, timeout=300)
-            response.raise_for_status()
-            result = response.json()
+            result = None if rejected else self._generate_guarded(payload, text)
+            if result is None:
+                self._log("แปลใหม่ด้วย repeat_penalty ที่สูงขึ้น")
+                payload["options"] = dict(payload["options"], **self.RUNAWAY_RETRY_OPTIONS)
+                result = self._generate_guarded(payload, text)
+            if result is None:
+                raw = self._translate_halves(text, context, depth)
+                if raw is not None and cache_key:
+                    self.cache.put(cache_key, raw)
+                return raw
+            
+            self._calibrate(payload, text, result.get('response', ''), result)
+            if result.get('done_reason') == "length":
+                # คำแปลยาวกว่าเพดาน num_predict ที่คาดไว้: แปลใหม่ครั้งเดียวโดยให้ใช้ที่เหลือใน num_ctx ได้ทั้งหมด
+                room = self._remaining_context(payload)
+                if room > payload["options"]["num_predict"]:
+                    self._log(f"คำแปลถูกตัดที่ num_predict {payload['options']['num_predict']} token "
+                              f"แปลใหม่ด้วยเพดาน {room}")
+                    payload["options"] = dict(payload["options"], num_predict=room)
+                    result = self._generate_guarded(payload, text)
+                    if result is None:
+                        raw = self._translate_halves(text, context, depth)
+                        if raw is not None and cache_key:
+                            self.cache.put(cache_key, raw)
+                        return raw
+                    self._calibrate(payload, text, result.get('response', ''), result)
             
             if 'response' in result:
-                # ทำความสะอาดผลลัพธ์การแปลก่อนส่งคืน
-                cleaned_result = self.clean_translation_output(result['response'])
-                return cleaned_result
+                if result.get('done_reason') == "length":
+                    # คำแปลไม่ครบ: ถือว่าแปลไม่สำเร็จ ไม่เก็บลง cache/journal ไฟล์จึงยังไม่ถูกนับว่าแปลครบ
+                    self._log("แปลส่วนนี้ไม่สำเร็จ: คำแปลยังถูกตัดที่เพดาน num_ctx ควรลดขนาด chunk")
+                    return None
+                if cache_key:
+                    self.cache.put(cache_key, result['response'])
+                return result['response']
             else:
-                print(f"ข้อผิดพลาด: ไม่พบ response ใน result")
-                return text
+                self._log(f"ข้อผิดพลาด: ไม่พบ response ใน result")
+                return None
                 
-        except requests.exceptions.Timeout:
-            print("หมดเวลารอ - ลองใหม่...")
-            time.sleep(5)
-            return self.translate_chunk(text)  # ลองใหม่
-        except requests.exceptions.RequestException as e:
-            print(f"ข้อผิดพลาดในการเชื่อมต่อ: {e}")
-            return text
+        except OllamaUnavailableError as e:
+            self._log(f"เชื่อมต่อ Ollama ไม่ได้: {e}")
+            return None
+        except OllamaError as e:
+            self._log(f"แปลไม่สำเร็จหลังลองใหม่ครบแล้ว: {e}")
+            return None
         except Exception as e:
-            print(f"ข้อผิดพลาด: {e}")
-            return text
+            self._log(f"ข้อผิดพลาด: {e}")
+            return None
     
-    def translate_file(self, input_file: str, output_file: str, chunk_size: int = 2000, 
-                      delay_between_chunks: float = 1.0) -> None:
-        """แปลไฟล์ทั้งหมด"""
-        print(f"กำลังอ่านไฟล์: {input_file}")
+    def translate_chunk_stream(self, text: str, on_line: Optional[Callable[[str], None]] = None,
+                               max_output_ratio: float = MAX_SANE_LENGTH_RATIO, context: str = "") -> Optional[str]:
+        """แปล chunk เดียวแบบ stream ทำความสะอาด (และแก้ศัพท์เฉพาะ) ทีละบรรทัดและส่งแต่ละบรรทัดให้ on_line ทันที
+
+        ยกเลิกการ generate ถ้าโมเดลวนซ้ำหรือผลลัพธ์ยาวเกิน max_output_ratio เท่าของต้นฉบับ และไม่รับคำแปล
+        ที่สั้นกว่า MIN_SANE_LENGTH_RATIO เท่า (RunawayGuard) บรรทัดที่ส่งให้ on_line ไปแล้วเอาคืนไม่ได้
+        จึงไม่แปลใหม่ในโหมดนี้
+        คืนคำแปลที่ทำความสะอาดแล้ว หรือ None ถ้าแปลไม่สำเร็จหรือถูกยกเลิก
+        """
+        translated = self._translate_chunk_stream(text, on_line, max_output_ratio, context)
+        return translated[1] if translated else None
+    
+    def _translate_chunk_stream(self, text: str, on_line: Optional[Callable[[str], None]],
+                                max_output_ratio: float, context: str = "",
+                                on_discard: Optional[Callable[[], None]] = None) -> Optional[Tuple[str, str]]:
+        """เหมือน translate_chunk_stream แต่คืน (ผลลัพธ์ดิบ, คำแปลที่ทำความสะอาดแล้ว)
+
+        ถ้ามี on_discard และ RunawayGuard ไม่รับคำแปล จะเรียก on_discard ให้ผู้เรียกทิ้งบรรทัดที่ได้ไปแล้ว
+        แล้วแปลซ้ำ/แบ่งครึ่งแบบ translate_chunk_raw และส่งบรรทัดของผลใหม่ให้ on_line
+        """
+        cache_key = self._cache_key(text, context)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self._record_cache_hit()
+                cleaned = self.finish_translation(cached, text)
+                if on_line:
+                    for line in cleaned.split('\n'):
+                        on_line(line)
+                return cached, cleaned
+        
+        raw_parts = []
+        guard = RunawayGuard(text, max_output_ratio, MIN_SANE_LENGTH_RATIO)
+        # ส่งต่อเฉพาะบรรทัดที่จบแล้ว ส่วนที่ยังไม่จบรอ fragment ถัดไป
+        line_cleaner = self.cleaner.stream()
+        cleaned_lines = []
+        
+        def emit(lines: List[str]) -> None:
+            lines = [self.glossary.repair(line, text) for line in lines]
+            cleaned_lines.extend(lines)
+            if on_line:
+                for line in lines:
+                    on_line(line)
+        
+        payload = self._build_payload(text, context)
+        # บรรทัดที่เขียนลงไฟล์แล้วแปลใหม่ไม่ได้ จึงไม่จำกัดที่ num_predict ที่คาดไว้ ให้ใช้ที่เหลือใน num_ctx ทั้งหมด
+        payload["options"]["num_predict"] = self._remaining_context(payload)
+        
+        controller = self.rate_controller
+        queued = time.time()
+        started = controller.acquire() if controller else queued
+        outcome = {"ok": False, "status_code": 0, "result": None}
+        stream = None
+        try:
+            stream = self.client.generate_stream(payload)
+            for data in stream:
+                if data.get('done'):
+                    outcome.update(ok=True, result=data)
+                fragment = data.get('response', '')
+                raw_parts.append(fragment)
+                emit(line_cleaner.feed(fragment))
+                
+                if not outcome["ok"] and guard.feed(fragment):
+                    break
+            if not outcome["ok"] and guard.reason is None:
+                # stream จบโดยไม่มี record done: คำแปลไม่ครบ ห้ามเก็บลง cache/journal
+                raise OllamaError("Stream ended before the response was complete")
+        except OllamaUnavailableError as e:
+            outcome["status_code"] = None
+            self._log(f"เชื่อมต่อ Ollama ไม่ได้: {e}")
+            return None
+        except OllamaError as e:
+            outcome["status_code"] = e.status_code
+            self._log(f"แปลไม่สำเร็จ: {e}")
+            return None
+        finally:
+            # ปิด stream เพื่อให้ Ollama หยุด generate ทันทีเมื่อยกเลิก
+            if stream is not None:
+                stream.close()
+            if controller:
+                controller.release(started, **outcome)
+            if outcome["ok"]:
+                self._record_metrics(queued, started, True, outcome["result"], stream=True)
+                self.session.observe(outcome["result"])
+            else:
+                self._record_metrics(queued, started, False, stream=True, status_code=outcome["status_code"],
+                                     aborted=guard.reason)
+        
+        if outcome["ok"] and outcome["result"].get("done_reason") != "length":
+            guard.finish()
+        if guard.reason:
+            self._log(f"ไม่รับคำแปล: {guard.reason}" if outcome["ok"] else f"ยกเลิกการแปล: {guard.reason}")
+            if on_discard is None:
+                return None
+            on_discard()
+            raw = self._translate_raw(text, context, 0, rejected=True)
+            if raw is None:
+                return None
+            cleaned = self.finish_translation(raw, text)
+            if on_line:
+                for line in cleaned.split('\n'):
+                    on_line(line)
+            return raw, cleaned
+        
+        emit(line_cleaner.finish())
+        
+        raw = "".join(raw_parts)
+        self._calibrate(payload, text, raw, outcome["result"])
+        if (outcome["result"] or {}).get("done_reason") == "length":
+            # คำแปลไม่ครบ: ถือว่าแปลไม่สำเร็จ ไม่บันทึกลง cache/journal ไฟล์จึงยังไม่ถูกนับว่าแปลครบ
+            self._log(f"แปลส่วนนี้ไม่สำเร็จ: คำแปลถูกตัดที่เพดาน num_ctx ({payload['options']['num_predict']} token) "
+                      f"ควรลดขนาด chunk")
+            return None
+        if cache_key:
+            self.cache.put(cache_key, raw)
+        
+        return raw, '\n'.join(cleaned_lines)
+    
+    def _translate_job_streaming(self, job: FileJob) -> bool:
+        """แปลทีละ chunk แบบ stream และเขียนผลลงไฟล์ทันทีที่ได้แต่ละบรรทัด (ผู้เรียก size_run ก่อน)"""
+        total_chunks = len(job.chunks)
+        
+        try:
+            f = open(job.output_file, 'w', encoding='utf-8')
+        except Exception as e:
+            print(f"ข้อผิดพลาดในการบันทึก: {e}")
+            return False
+        
+        with f:
+            for index, chunk in enumerate(job.chunks):
+                if index > 0:
+                    f.write("\n\n")
+                
+                # chunk ที่แปลไว้แล้วใน journal เขียนลงไฟล์ได้เลย
+                if job.translated[index] is not None:
+                    f.write(job.translated[index])
+                    f.flush()
+                    continue
+                
+                print(f"กำลังแปลส่วนที่ {index + 1}/{total_chunks} (stream)")
+                chunk_start = f.tell()
+                written_lines = 0
+                
+                def write_line(line: str) -> None:
+                    nonlocal written_lines
+                    f.write(line if written_lines == 0 else "\n" + line)
+                    f.flush()
+                    written_lines += 1
+                
+                def discard() -> None:
+                    # ตัดไฟล์กลับไปก่อนบรรทัดแรกของ chunk นี้
+                    nonlocal written_lines
+                    f.seek(chunk_start)
+                    f.truncate()
+                    written_lines = 0
+                
+                with self._chunk_context(job, index):
+                    result = self._translate_chunk_stream(chunk, write_line, MAX_SANE_LENGTH_RATIO,
+                                                          self._job_context(job, index), discard)
+                if result is None:
+                    # เหมือนโหมดปกติ: ใช้ต้นฉบับแทนบรรทัดที่เขียนไปแล้วของ chunk นี้
+                    discard()
+                    f.write(chunk)
+                    f.flush()
+                    self._store_chunk(job, index, chunk)
+                else:
+                    raw, translated = result
+                    self._store_chunk(job, index, translated, raw)
         
-        # อ่านไฟล์ต้นฉบับ
+        print(f"\nการแปลเสร็จสิ้น! บันทึกที่: {job.output_file}")
+        print(f"  {self._file_summary(job)}")
+        self._mark_job_complete(job)
+        return True
+    
+    @contextmanager
+    def _rate_control(self, max_workers: int, delay_between_chunks: float):
+        """เปิดใช้ตัวควบคุมอัตราแบบ AIMD ระหว่างการแปลรอบหนึ่ง
+
+        เริ่มจาก 1 คำขอและระยะห่าง delay_between_chunks แล้วปรับตามการตอบสนองของเซิร์ฟเวอร์
+        โดยมีคำขอพร้อมกันไม่เกิน max_workers
+        """
+        previous = self.rate_controller
+        self.rate_controller = AdaptiveRateController(max_concurrency=max_workers,
+                                                      initial_delay=delay_between_chunks)
+        try:
+            yield self.rate_controller
+        finally:
+            self.rate_controller = previous
+    
+    def _store_chunk(self, job: FileJob, index: int, translated: str, raw: Optional[str] = None) -> None:
+        """เก็บผลแปลของ chunk ใน job และบันทึก chunk ที่แปลสำเร็จ (มี raw) ลง journal
+
+        ถ้าแปลไม่สำเร็จ (raw เป็น None) translated คือข้อความต้นฉบับ ไม่บันทึกเพื่อให้แปลใหม่ในรอบหน้า
+        """
+        chunk = job.chunks[index]
+        job.translated[index] = translated
+        job.remaining -= 1
+        if raw is not None:
+            job.journal.record(index, hash_text(chunk), translated, raw,
+                               [term.source for term in self.glossary.find_terms(chunk)])
+            for term in self.glossary.missing_terms(chunk, translated):
+                self._missing_terms[term.source] = self._missing_terms.get(term.source, 0) + 1
+    
+    def _file_summary(self, job: FileJob) -> str:
+        return format_summary(summarize(self.metrics.since(self._metrics_mark, file=job.input_file)))
+    
+    def _print_run_summary(self) -> None:
+        """สรุป latency และ tokens/s ของคำขอทั้งหมดในรอบนี้ เขียนไฟล์ Prometheus ถ้าตั้งไว้ และบันทึก calibration"""
+        if self._missing_terms:
+            counts = ", ".join(f"{source} ({count})" for source, count in
+                               sorted(self._missing_terms.items(), key=lambda item: -item[1]))
+            print(f"\nศัพท์ที่คำแปลไม่ตรง glossary (จำนวนส่วน): {counts}")
+        if self.calibration:
+            print(f"\nToken calibration: {self.token_checker.calibration.describe()}")
+            try:
+                self.calibration.save()
+            except OSError as e:
+                print(f"บันทึกไฟล์ calibration ไม่สำเร็จ: {e}")
+        records = self.metrics.since(self._metrics_mark)
+        if not records:
+            return
+        print(f"\nสรุปประสิทธิภาพ: {format_summary(summarize(records))}")
+        if self.prometheus_path:
+            try:
+                self.metrics.write_prometheus(self.prometheus_path, records)
+            except OSError as e:
+                print(f"เขียนไฟล์ metrics ไม่สำเร็จ: {e}")
+    
+    def _mark_job_complete(self, job: FileJob) -> None:
+        # บันทึกว่าแปลครบแล้วเฉพาะเมื่อทุก chunk แปลสำเร็จ
+        if all(job.journal.get(i, hash_text(chunk)) is not None for i, chunk in enumerate(job.chunks)):
+            job.journal.mark_complete(job.source_hash, len(job.chunks), self.glossary.to_dict())
+            if self._manifest:
+                self._manifest.update(os.path.basename(job.input_file), job.input_file,
+                                      job.source_hash, job.chunks)
+    
+    def _write_job(self, job: FileJob) -> Optional[str]:
+        """รวมผลการแปลและบันทึกไฟล์ผลลัพธ์ คืนข้อความแจ้งผล"""
+        try:
+            with open(job.output_file, 'w', encoding='utf-8') as f:
+                f.write(job.assemble())
+        except Exception as e:
+            return f"ข้อผิดพลาดในการบันทึก {job.output_file}: {e}"
+        
+        self._mark_job_complete(job)
+        return f"การแปลเสร็จสิ้น! บันทึกที่: {job.output_file}\n  {self._file_summary(job)}"
+    
+    def _run_jobs(self, jobs: List[FileJob], max_workers: int) -> None:
+        """แปล chunks ของทุกไฟล์ผ่านคิวเดียวด้วย worker pool
+
+        chunks ถูกส่งเข้าคิวตามลำดับของ jobs และเรียงตาม index ในไฟล์ ไฟล์ใดแปลครบแล้วจะถูกรวม
+        และบันทึกทันที โดยไม่ต้องรอไฟล์อื่น
+
+        ถ้าเปิดโหมดบริบท (context_tokens) แต่ละไฟล์มี chunk ในคิวครั้งละหนึ่ง chunk ถัดไปจะเข้าคิว
+        เมื่อ chunk ก่อนหน้าแปลเสร็จ เพื่อใช้คำแปลนั้นเป็นบริบท
+
+        chunks ที่ข้อความเหมือนกันทุกตัวอักษร (เช่น ย่อหน้าซ้ำที่ ParagraphIndex แยกออกมา) แปลครั้งเดียว
+        ก่อน chunks อื่น แล้วใช้ผลเดียวกันทุกตำแหน่ง
+        """
+        pending = {job: job.pending_indices() for job in jobs}
+        self.size_run(jobs)
+        progress = ProgressDisplay(sum(len(indices) for indices in pending.values()), len(jobs))
+        
+        for job in jobs:
+            if job.is_done():
+                progress.log(self._write_job(job))
+                progress.file_done()
+        
+        def complete(job: FileJob, index: int, raw: Optional[str]) -> None:
+            if raw is None:
+                translated = job.chunks[index]
+            else:
+                translated = self.finish_translation(raw, job.chunks[index])
+            self._store_chunk(job, index, translated, raw)
+            progress.chunk_done(self.token_checker.count_tokens(translated))
+            
+            if job.is_done():
+                progress.log(self._write_job(job))
+                progress.file_done()
+        
+        duplicates: Dict[str, List[Tuple[FileJob, int]]] = {}
+        for job in jobs:
+            for index in pending[job]:
+                duplicates.setdefault(job.chunks[index], []).append((job, index))
+        duplicates = {text: places for text, places in duplicates.items() if len(places) > 1}
+        
+        self._progress = progress
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                if duplicates:
+                    leaders = {executor.submit(self._translate_job_chunk, *places[0]): places
+                               for places in duplicates.values()}
+                    for future in as_completed(leaders):
+                        raw = future.result()
+                        for job, index in leaders[future]:
+                            pending[job].remove(index)
+                            complete(job, index, raw)
+                    saved = sum(len(places) - 1 for places in duplicates.values())
+                    progress.log(f"ข้อความซ้ำ {len(duplicates)} ชุด แปลครั้งเดียว ลดคำขอ {saved} ครั้ง")
+                
+                futures = {}
+                
+                def submit(job: FileJob) -> None:
+                    index = pending[job].pop(0)
+                    future = executor.submit(self._translate_job_chunk, job, index, self._job_context(job, index))
+                    futures[future] = (job, index)
+                
+                for job in jobs:
+                    while pending[job]:
+                        submit(job)
+                        if self.context_tokens:
+                            break
+                
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job, index = futures.pop(future)
+                        complete(job, index, future.result())
+                        if self.context_tokens and pending[job]:
+                            submit(job)
+        finally:
+            self._progress = None
+        progress.finish()
+        
+        if self.rate_controller:
+            stats = self.rate_controller.stats()
+            print(f"คำขอพร้อมกันล่าสุด {stats['concurrency']}/{max_workers}, "
+                  f"ระยะห่าง {stats['delay']:.2f} วินาที, เซิร์ฟเวอร์แออัด {stats['overloads']} ครั้ง")
+    
+    def read_source(self, input_file: str) -> Optional[str]:
+        """อ่านไฟล์ต้นฉบับ ลอง encoding อื่นถ้าไม่ใช่ utf-8"""
         try:
             with open(input_file, 'r', encoding='utf-8') as f:
-                content = f.read()
+                return f.read()
         except FileNotFoundError:
             print(f"ไม่พบไฟล์: {input_file}")
-            return
+            return None
         except UnicodeDecodeError:
             # ลองอ่านด้วย encoding อื่น
             encodings = ['utf-8', 'cp1252', 'iso-8859-1']
-            content = None
             for encoding in encodings:
                 try:
                     with open(input_file, 'r', encoding=encoding) as f:
                         content = f.read()
                     print(f"อ่านไฟล์สำเร็จด้วย encoding: {encoding}")
-                    break
+                    return content
                 except UnicodeDecodeError:
                     continue
             
-            if content is None:
-                print("ไม่สามารถอ่านไฟล์ได้")
-                return
+            print("ไม่สามารถอ่านไฟล์ได้")
+            return None
+    
+    def is_translation_complete(self, input_file: str, output_file: str) -> bool:
+        """ตรวจว่าไฟล์ผลลัพธ์แปลครบแล้วและต้นฉบับไม่ได้เปลี่ยนตั้งแต่แปล"""
+        if not os.path.exists(output_file) or not os.path.exists(TranslationJournal.path_for(output_file)):
+            return False
         
-        # แบ่งเป็น chunks
-        chunks = self.chunk_text(content, chunk_size)
-        total_chunks = len(chunks)
+        content = self.read_source(input_file)
+        if content is None:
+            return False
         
-        print(f"แบ่งข้อความเป็น {total_chunks} ส่วน")
-        print("เริ่มการแปล...")
+        return TranslationJournal.for_output(output_file).is_complete(hash_text(content))
+    
+    def _journal_translation(self, journal: TranslationJournal, index: int, chunk: str) -> Optional[str]:
+        """คำแปลเดิมจาก journal ทำความสะอาดใหม่จากผลลัพธ์ดิบถ้ามี เพื่อใช้กฎการทำความสะอาดและ glossary ล่าสุด"""
+        source_hash = hash_text(chunk)
+        # chunk ที่เลื่อนตำแหน่ง (ต้นฉบับถูกแก้ก่อนหน้า chunk นี้) ใช้คำแปลเดิมของข้อความเดียวกัน
+        journal.adopt(index, source_hash)
+        raw = journal.get_raw(index, source_hash)
+        if raw is not None:
+            return self.finish_translation(raw, chunk)
+        return journal.get(index, source_hash)
+    
+    def build_paragraph_index(self, input_files: List[str], chunk_size: int = 2000,
+                              chunk_tokens: Optional[int] = None) -> ParagraphIndex:
+        """ดัชนีย่อหน้าซ้ำ/เกือบซ้ำของทุกไฟล์ ใช้แยกย่อหน้าซ้ำออกจาก chunks ใน prepare_job"""
+        index = ParagraphIndex()
+        for input_file in input_files:
+            content = self.read_source(input_file)
+            if content is not None:
+                index.add_text(content)
+        repeated = index.repeated_groups(*self._chunk_limit(chunk_size, chunk_tokens))
+        if repeated:
+            print(f"พบย่อหน้าที่ซ้ำกันหลายแห่ง {repeated} ชุด จะแปลชุดละครั้งเดียว")
+        return index
+    
+    def _chunk_limit(self, chunk_size: int, chunk_tokens: Optional[int]) -> Tuple[int, Callable[[str], int]]:
+        """ขนาด chunk สูงสุดและฟังก์ชันวัดขนาดในหน่วยเดียวกัน (token หรือตัวอักษร) แบบเดียวกับ chunk_text"""
+        if chunk_tokens:
+            return min(chunk_tokens, self.chunk_token_budget()), self.token_checker.count_tokens
+        return chunk_size, len
+    
+    def _split_chunks(self, content: str, chunk_size: int, chunk_tokens: Optional[int]) -> List[str]:
+        if self.paragraph_index:
+            # แบ่ง chunk ระหว่างย่อหน้าซ้ำ ย่อหน้าซ้ำแต่ละแห่ง (ที่แยกแล้วคุ้ม) ได้ chunk ของตัวเอง
+            limit = self._chunk_limit(chunk_size, chunk_tokens)
+            return [chunk for segment, _ in self.paragraph_index.segments(content, *limit)
+                    for chunk in self.chunk_text(segment, chunk_size, chunk_tokens)]
+        return self.chunk_text(content, chunk_size, chunk_tokens)
+    
+    def prepare_job(self, input_file: str, output_file: str, chunk_size: int = 2000,
+                    chunk_tokens: Optional[int] = None,
+                    previous_chunks: Optional[List[Dict]] = None) -> Optional[FileJob]:
+        """อ่านและแบ่งไฟล์เป็น chunks พร้อมผลแปลเดิมจาก journal (<output_file>.journal.jsonl)
+
+        previous_chunks คือขอบ chunk จากการแปลครั้งก่อน (จาก SyncManifest) ส่วนที่ไม่ได้แก้ใช้ขอบเดิม
+        จึงแปลใหม่เฉพาะส่วนที่แก้
+        """
+        content = self.read_source(input_file)
+        if content is None:
+            return None
         
-        translated_chunks = []
+        if previous_chunks:
+            chunks = align_chunks(content, previous_chunks,
+                                  lambda text: self._split_chunks(text, chunk_size, chunk_tokens))
+        else:
+            chunks = self._split_chunks(content, chunk_size, chunk_tokens)
+        journal = TranslationJournal.for_output(output_file)
+        translated = [self._journal_translation(journal, i, chunk) for i, chunk in enumerate(chunks)]
+        return FileJob(input_file, output_file, hash_text(content), chunks, translated, journal)
+    
+    def translate_file(self, input_file: str, output_file: str, chunk_size: int = 2000, 
+                      delay_between_chunks: float = 1.0, max_workers: int = 1,
+                      stream: bool = False, chunk_tokens: Optional[int] = None) -> None:
+        """แปลไฟล์ทั้งหมด
+
+        max_workers > 1 จะส่ง chunks ไปแปลพร้อมกันสูงสุด max_workers คำขอ
+        (ควรตั้งให้ตรงกับ OLLAMA_NUM_PARALLEL ของเซิร์ฟเวอร์) ผลลัพธ์ยังคงเรียงตามลำดับ chunk
+
+        stream=True จะรับผลจาก Ollama ทีละส่วนและเขียนลงไฟล์ผลลัพธ์ทันที (แปลทีละ chunk)
+
+        chunk_tokens กำหนดขนาด chunk เป็นจำนวน token แทน chunk_size (ตัวอักษร)
+
+        delay_between_chunks เป็นระยะห่างเริ่มต้นระหว่างคำขอ ตัวควบคุมอัตราจะลดลงเมื่อเซิร์ฟเวอร์ตอบทัน
+        และเพิ่มขึ้น (พร้อมลดจำนวนคำขอพร้อมกัน) เมื่อเซิร์ฟเวอร์แออัด
+
+        ทุก chunk ที่แปลเสร็จจะถูกบันทึกลง journal (<output_file>.journal.jsonl) ทันที
+        ถ้าการแปลถูกขัดจังหวะ การรันครั้งถัดไปจะแปลเฉพาะ chunks ที่ยังขาดอยู่
+        """
+        print(f"กำลังอ่านไฟล์: {input_file}")
+        self._metrics_mark = self.metrics.mark()
+        self._missing_terms = {}
+        self._num_ctx_floor = 0
         
-        # แปลทีละ chunk
-        for i, chunk in enumerate(chunks, 1):
-            print(f"กำลังแปลส่วนที่ {i}/{total_chunks}")
-            
-            translated = self.translate_chunk(chunk)
-            translated_chunks.append(translated)
-            
-            # แสดงความคืบหน้า
-            progress = (i / total_chunks) * 100
-            print(f"ความคืบหน้า: {progress:.1f}%")
-            
-            # รอระหว่าง chunks เพื่อไม่ให้ระบบทำงานหนักเกินไป
-            if i < total_chunks:
-                time.sleep(delay_between_chunks)
+        with self._novel_glossary(os.path.dirname(input_file) or "."):
+            # อ่านไฟล์ต้นฉบับและแบ่งเป็น chunks
+            if self.dedupe_paragraphs:
+                self.paragraph_index = self.build_paragraph_index([input_file], chunk_size, chunk_tokens)
+            job = self.prepare_job(input_file, output_file, chunk_size, chunk_tokens)
+            self.paragraph_index = None
+            if job is None:
+                return
         
-        # รวมผลการแปล
-        translated_content = "\n\n".join(translated_chunks)
+            total_chunks = len(job.chunks)
+            print(f"แบ่งข้อความเป็น {total_chunks} ส่วน")
         
-        # บันทึกผลลัพธ์
-        try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(translated_content)
-            print(f"\nการแปลเสร็จสิ้น! บันทึกที่: {output_file}")
-        except Exception as e:
-            print(f"ข้อผิดพลาดในการบันทึก: {e}")
+            if job.remaining < total_chunks:
+                print(f"พบผลการแปลเดิม {total_chunks - job.remaining} ส่วน จะแปลต่อเฉพาะ {job.remaining} ส่วนที่เหลือ")
+            print("เริ่มการแปล...")
+        
+            # โหลดโมเดลไว้ก่อนและตรึงด้วย keep_alive จนจบไฟล์ (ไม่โหลดถ้าไม่มีอะไรต้องแปล)
+            session = self.session if job.remaining else nullcontext()
+            if stream:
+                if max_workers > 1:
+                    print("โหมด stream เขียนไฟล์ตามลำดับ จึงแปลทีละส่วน")
+                with session, self._rate_control(1, delay_between_chunks):
+                    self.size_run([job])
+                    self._translate_job_streaming(job)
+            else:
+                with session, self._rate_control(max_workers, delay_between_chunks):
+                    self._run_jobs([job], max_workers)
+        
+        self._print_run_summary()
     
     def translate_directory(self, input_dir: str, output_dir: str, 
-                           file_extensions: List[str] = ['.txt'], **kwargs) -> None:
-        """แปลไฟล์ทั้งหมดในโฟลเดอร์"""
+                           file_extensions: List[str] = ['.txt'], chunk_size: int = 2000,
+                           delay_between_chunks: float = 1.0, max_workers: int = 1,
+                           stream: bool = False, chunk_tokens: Optional[int] = None,
+                           order: str = ORDER_LARGEST) -> None:
+        """แปลไฟล์ทั้งหมดในโฟลเดอร์
+
+        แบ่งทุกไฟล์เป็น chunks ก่อน แล้วแปลจากคิวเดียวกันด้วย worker pool ขนาด max_workers
+        order="largest" ส่งไฟล์ใหญ่เข้าคิวก่อน, order="chapter" เรียงตามเลขบทในชื่อไฟล์
+        """
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
-        for filename in os.listdir(input_dir):
-            if any(filename.lower().endswith(ext) for ext in file_extensions):
-                input_path = os.path.join(input_dir, filename)
-                output_filename = f"translated_{filename}"
-                output_path = os.path.join(output_dir, output_filename)
-                
-                print(f"\n{'='*50}")
-                print(f"กำลังแปล: {filename}")
-                print(f"{'='*50}")
-                
-                self.translate_file(input_path, output_path, **kwargs)
+        if self.cache:
+            self.cache.reset_stats()
+        self._metrics_mark = self.metrics.mark()
+        self._missing_terms = {}
+        self._num_ctx_floor = 0
+        
+        # ขนาด เวลาแก้ไข hash และขอบ chunk ของไฟล์ที่แปลครบแล้ว (<output_dir>/.translation_manifest.json)
+        self._manifest = SyncManifest(output_dir)
+        try:
+            with self._novel_glossary(input_dir):
+                self._translate_directory(input_dir, output_dir, file_extensions, chunk_size,
+                                          delay_between_chunks, max_workers, stream, chunk_tokens, order)
+        finally:
+            try:
+                self._manifest.save()
+            except OSError as e:
+                print(f"บันทึก manifest ไม่สำเร็จ: {e}")
+            self._manifest = None
+    
+    @contextmanager
+    def _novel_glossary(self, input_dir: str):
+        """ใช้ glossary.txt ในโฟลเดอร์ต้นฉบับระหว่างการแปลโฟลเดอร์นั้น (ถ้ามีและไม่ได้ระบุ glossary_path)"""
+        previous = self.glossary
+        try:
+            glossary = None if self.glossary_path else Glossary.for_directory(input_dir)
+        except (OSError, ValueError) as e:
+            print(f"อ่านไฟล์ glossary ไม่สำเร็จ ใช้ศัพท์เดิม: {e}")
+            glossary = None
+        if glossary is not None:
+            print(f"ใช้ glossary ของนิยาย: {len(glossary)} ศัพท์")
+            self.glossary = glossary
+        try:
+            yield self.glossary
+        finally:
+            self.glossary = previous
+    
+    def _translate_directory(self, input_dir: str, output_dir: str, file_extensions: List[str],
+                             chunk_size: int, delay_between_chunks: float, max_workers: int,
+                             stream: bool, chunk_tokens: Optional[int], order: str) -> None:
+        filenames = [filename for filename in sorted(os.listdir(input_dir))
+                     if filename != GLOSSARY_FILENAME
+                     and any(filename.lower().endswith(ext) for ext in file_extensions)]
+        # ดัชนีย่อหน้ารวมไฟล์ที่แปลครบแล้วด้วย ย่อหน้าตัวแทนจึงเหมือนเดิมทุกรอบ (cache hit ข้ามรอบ)
+        self.paragraph_index = self.build_paragraph_index(
+            [os.path.join(input_dir, filename) for filename in filenames],
+            chunk_size, chunk_tokens) if self.dedupe_paragraphs else None
+        
+        jobs = []
+        unchanged = 0
+        for filename in filenames:
+            input_path = os.path.join(input_dir, filename)
+            output_filename = f"translated_{filename}"
+            output_path = os.path.join(output_dir, output_filename)
+            
+            # ขนาดและเวลาแก้ไขตรงกับ manifest: ไม่ต้องอ่านไฟล์หรือ journal
+            if self._manifest.is_unchanged(filename, input_path, output_path):
+                unchanged += 1
+                continue
+            
+            entry = self._manifest.get(filename)
+            if self.is_translation_complete(input_path, output_path):
+                print(f"ข้ามไฟล์ที่แปลครบแล้ว: {filename}")
+                # บันทึกลง manifest (หรืออัปเดตเวลาแก้ไข) ให้รอบหน้าไม่ต้องอ่านไฟล์นี้อีก
+                job = self.prepare_job(input_path, output_path, chunk_size, chunk_tokens,
+                                       entry["chunks"] if entry else None)
+                if job is not None:
+                    self._manifest.update(filename, input_path, job.source_hash, job.chunks)
+                continue
+            
+            job = self.prepare_job(input_path, output_path, chunk_size, chunk_tokens,
+                                   entry["chunks"] if entry else None)
+            if job is not None:
+                jobs.append(job)
+        self.paragraph_index = None
+        if unchanged:
+            print(f"ข้าม {unchanged} ไฟล์ที่ไม่เปลี่ยนแปลงตั้งแต่แปลครั้งล่าสุด")
+        
+        jobs = order_jobs(jobs, order)
+        pending_chunks = sum(job.remaining for job in jobs)
+        print(f"\n{'='*50}")
+        print(f"แปล {len(jobs)} ไฟล์, {pending_chunks} ส่วนที่ต้องแปล")
+        print(f"{'='*50}")
+        
+        if stream and pending_chunks:
+            # โหมด stream เขียนทีละไฟล์ตามลำดับ
+            with self.session, self._rate_control(1, delay_between_chunks):
+                self.size_run(jobs)
+                for job in jobs:
+                    print(f"\nกำลังแปล: {os.path.basename(job.input_file)}")
+                    self._translate_job_streaming(job)
+        elif pending_chunks:
+            # โหลดโมเดลไว้ก่อนและตรึงด้วย keep_alive จนจบโฟลเดอร์ ไม่ให้ถูก unload ระหว่างไฟล์
+            with self.session, self._rate_control(max_workers, delay_between_chunks):
+                self._run_jobs(jobs, max_workers)
+        else:
+            # ไม่มีอะไรต้องแปล แต่ยังต้องบันทึกไฟล์ที่ journal มีคำแปลครบแล้ว
+            self._run_jobs(jobs, max_workers)
+        
+        if isinstance(self.client, OllamaPool):
+            print("\nสถานะเครื่อง Ollama:")
+            for host in self.client.stats():
+                status = "ปกติ" if host['healthy'] else "ไม่พร้อม"
+                print(f"  {host['url']}: {status}, สำเร็จ {host['completed']}, ล้มเหลว {host['failed']}")
+        
+        if self.cache:
+            stats = self.cache.stats()
+            print(f"\nCache: hit {stats['hits']} / miss {stats['misses']} "
+                  f"({stats['hit_rate'] * 100:.1f}%), ขนาด {stats['size_bytes'] / 1024 / 1024:.1f} MB")
+        
+        self._print_run_summary()
 
 def main():
     # สร้าง translator instance
@@ -246,7 +1082,12 @@ def main():
             delay = input("หน่วงเวลาระหว่าง chunks วินาที (ค่าเริ่มต้น 1): ").strip()
             delay = float(delay) if delay.replace('.','').isdigit() else 1.0
             
-            translator.translate_file(input_file, output_file, chunk_size, delay)
+            workers = input("จำนวนคำขอที่แปลพร้อมกัน (ค่าเริ่มต้น 1): ").strip()
+            workers = int(workers) if workers.isdigit() and int(workers) > 0 else 1
+            
+            stream = input("เขียนผลลงไฟล์ทันทีแบบ stream? (y/N): ").strip().lower() == 'y'
+            
+            translator.translate_file(input_file, output_file, chunk_size, delay, workers, stream)
             
         elif choice == "2":
             # แปลทั้งโฟลเดอร์
@@ -268,8 +1109,15 @@ def main():
             delay = input("หน่วงเวลาระหว่าง chunks วินาที (ค่าเริ่มต้น 1): ").strip()
             delay = float(delay) if delay.replace('.','').isdigit() else 1.0
             
+            workers = input("จำนวนคำขอที่แปลพร้อมกัน (ค่าเริ่มต้น 1): ").strip()
+            workers = int(workers) if workers.isdigit() and int(workers) > 0 else 1
+            
+            order = input("ลำดับการแปล: largest = ไฟล์ใหญ่ก่อน, chapter = ตามเลขบท (ค่าเริ่มต้น largest): ").strip().lower()
+            order = order if order in (ORDER_LARGEST, ORDER_CHAPTER) else ORDER_LARGEST
+            
             translator.translate_directory(input_dir, output_dir, extensions, 
-                                         chunk_size=chunk_size, delay_between_chunks=delay)
+                                         chunk_size=chunk_size, delay_between_chunks=delay,
+                                         max_workers=workers, order=order)
             
         elif choice == "3":
             print("ขอบคุณที่ใช้งาน!")
@@ -0,0 +1,191 @@
+"""
+Ollama Client
+Shared HTTP layer for novel_translator.py and token_checker.py: one pooled
+keep-alive session, separate connect/read timeouts and bounded retries with
+exponential backoff and jitter.
+"""
+
+import json
+import random
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+
+# HTTP status ที่ลองใหม่ได้ (เซิร์ฟเวอร์ยุ่งหรือผิดพลาดชั่วคราว)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class OllamaError(Exception):
+    """เรียก Ollama ไม่สำเร็จหลังจากลองครบตาม retry policy แล้ว"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class OllamaUnavailableError(OllamaError):
+    """เชื่อมต่อเซิร์ฟเวอร์ไม่ได้ (เซิร์ฟเวอร์ปิดอยู่หรือ circuit เปิดอยู่)"""
+
+
+class RetryPolicy:
+    """Exponential backoff แบบ full jitter ที่จำกัดจำนวนครั้ง"""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """เวลารอก่อนลองครั้งที่ attempt + 1 (attempt เริ่มที่ 1)"""
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+
+class OllamaClient:
+    """Client ของ Ollama HTTP API ที่ใช้ connection pool ร่วมกันระหว่าง thread
+
+    ถ้าเชื่อมต่อไม่ได้ติดกัน down_after ครั้ง จะถือว่าเซิร์ฟเวอร์ล่มและปฏิเสธคำขอทันที
+    (ไม่รอ backoff) เป็นเวลา down_cooldown วินาที ก่อนจะลองเชื่อมต่อใหม่
+    """
+
+    def __init__(self, base_url: str = DEFAULT_OLLAMA_URL, connect_timeout: float = 5.0,
+                 read_timeout: float = 300.0, retry_policy: Optional[RetryPolicy] = None,
+                 pool_size: int = 16, down_after: int = 2, down_cooldown: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.down_after = down_after
+        self.down_cooldown = down_cooldown
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._connect_failures = 0
+        self._down_until = 0.0
+
+    def _check_available(self) -> None:
+        if time.time() < self._down_until:
+            raise OllamaUnavailableError(f"Ollama at {self.base_url} is unreachable, not retrying yet")
+
+    def _record_connect_failure(self) -> bool:
+        """นับการเชื่อมต่อล้มเหลว คืน True ถ้าถือว่าเซิร์ฟเวอร์ล่มแล้ว"""
+        with self._lock:
+            self._connect_failures += 1
+            if self._connect_failures >= self.down_after:
+                self._down_until = time.time() + self.down_cooldown
+                return True
+            return False
+
+    def _record_success(self) -> None:
+        with self._lock:
+            self._connect_failures = 0
+            self._down_until = 0.0
+
+    def request(self, method: str, path: str, payload: Optional[Dict] = None,
+                read_timeout: Optional[float] = None, stream: bool = False) -> requests.Response:
+        """ส่งคำขอพร้อม retry คืน Response ที่ status 2xx หรือ raise OllamaError"""
+        url = f"{self.base_url}{path}"
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        last_error = None
+
+        for attempt in range(1, self.retry_policy.max_attempts + 1):
+            self._check_available()
+            try:
+                response = self.session.request(method, url, json=payload, timeout=timeout, stream=stream)
+            except requests.exceptions.ConnectionError as e:
+                # ConnectTimeout เป็น subclass ของ ConnectionError ด้วย
+                last_error = OllamaUnavailableError(f"Cannot connect to {url}: {e}")
+                if self._record_connect_failure():
+                    raise last_error
+            except requests.exceptions.Timeout as e:
+                last_error = OllamaError(f"Timed out waiting for {url}: {e}")
+                self._record_success()
+            else:
+                self._record_success()
+                if response.ok:
+                    return response
+
+                last_error = OllamaError(f"HTTP {response.status_code}: {response.text[:200]}",
+                                         response.status_code)
+                response.close()
+                if response.status_code not in RETRYABLE_STATUS:
+                    raise last_error
+
+            if attempt < self.retry_policy.max_attempts:
+                time.sleep(self.retry_policy.delay(attempt))
+
+        raise last_error
+
+    def post_json(self, path: str, payload: Dict, read_timeout: Optional[float] = None) -> Dict:
+        response = self.request("POST", path, payload, read_timeout=read_timeout)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise OllamaError(f"Invalid JSON from {path}: {e}")
+
+    def generate(self, payload: Dict, read_timeout: Optional[float] = None) -> Dict:
+        """เรียก /api/generate แบบไม่ stream"""
+        return self.post_json("/api/generate", dict(payload, stream=False), read_timeout=read_timeout)
+
+    def generate_stream(self, payload: Dict, read_timeout: Optional[float] = None) -> Iterator[Dict]:
+        """เรียก /api/generate แบบ stream คืน object NDJSON ทีละบรรทัด
+
+        read_timeout ใช้กับช่วงห่างระหว่างข้อมูลแต่ละชิ้น ไม่ใช่เวลารวม
+        ถ้าผู้เรียกหยุดอ่านกลางทาง (break / close) การเชื่อมต่อจะถูกปิดและ Ollama จะหยุด generate
+        """
+        response = self.request("POST", "/api/generate", dict(payload, stream=True),
+                                read_timeout=read_timeout, stream=True)
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError as e:
+                    raise OllamaError(f"Invalid stream data from /api/generate: {e}")
+                if "error" in data:
+                    raise OllamaError(f"Ollama error: {data['error']}")
+                yield data
+                if data.get("done"):
+                    break
+        except requests.exceptions.RequestException as e:
+            raise OllamaError(f"Stream interrupted: {e}")
+        finally:
+            response.close()
+
+    def load(self, model_name: str, keep_alive=None, options: Optional[Dict] = None) -> Dict:
+        """โหลดโมเดลไว้ล่วงหน้าด้วยคำขอที่ไม่มี prompt (ไม่ generate) และตั้ง keep_alive
+
+        options ควรมี num_ctx เดียวกับที่ใช้แปล ไม่อย่างนั้น Ollama จะโหลดโมเดลใหม่ในคำขอแรก
+        """
+        payload = {"model": model_name}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        if options:
+            payload["options"] = options
+        return self.generate(payload)
+
+    def unload(self, model_name: str) -> Dict:
+        """ขอให้ Ollama เอาโมเดลออกจากหน่วยความจำทันที (keep_alive=0)"""
+        return self.generate({"model": model_name, "keep_alive": 0}, read_timeout=60)
+
+    def show(self, model_name: str) -> Dict:
+        """เรียก /api/show เพื่อดูข้อมูลโมเดล"""
+        return self.post_json("/api/show", {"name": model_name}, read_timeout=10)
+
+    def tags(self, read_timeout: float = 5.0) -> Dict:
+        """เรียก /api/tags (รายชื่อโมเดล) ใช้ตรวจว่าเซิร์ฟเวอร์ทำงานอยู่"""
+        response = self.request("GET", "/api/tags", read_timeout=read_timeout)
+        return response.json()
+
+    def close(self) -> None:
+        self.session.close()
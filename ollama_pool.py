@@ -0,0 +1,209 @@
+"""
+Ollama Pool
+Spreads requests across several Ollama hosts. Each request goes to the healthy
+host with the fewest outstanding requests relative to its weight; a request
+that fails on one host is re-dispatched to another.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from ollama_client import OllamaClient, OllamaError, OllamaUnavailableError, RetryPolicy
+
+
+class Endpoint:
+    """สถานะของ Ollama host หนึ่งตัวใน pool"""
+
+    def __init__(self, client: OllamaClient, weight: float = 1.0):
+        self.client = client
+        self.weight = weight
+        self.outstanding = 0
+        self.healthy = True
+        self.checked_at = 0.0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def url(self) -> str:
+        return self.client.base_url
+
+    def load(self) -> float:
+        """ภาระงานเทียบกับน้ำหนัก ค่าน้อยคือว่างกว่า"""
+        return (self.outstanding + 1) / self.weight
+
+
+class OllamaPool:
+    """กลุ่มของ Ollama hosts ที่ใช้แทน OllamaClient ได้ (มี generate/generate_stream/show/tags)
+
+    host ที่ล้มเหลวจะถูกพักไว้และตรวจสุขภาพใหม่ผ่าน /api/tags เมื่อผ่านไป health_interval วินาที
+    """
+
+    def __init__(self, urls: List[str], weights: Optional[List[float]] = None,
+                 health_interval: float = 30.0, **client_kwargs):
+        if not urls:
+            raise ValueError("OllamaPool needs at least one URL")
+        weights = weights or [1.0] * len(urls)
+        if len(weights) != len(urls):
+            raise ValueError("weights must have one entry per URL")
+
+        # ลองซ้ำบน host เดิมน้อยครั้ง เพราะ pool จะส่งต่อไป host อื่นเอง
+        client_kwargs.setdefault("retry_policy", RetryPolicy(max_attempts=2))
+        self.endpoints = [Endpoint(OllamaClient(url, **client_kwargs), weight)
+                          for url, weight in zip(urls, weights)]
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return ", ".join(endpoint.url for endpoint in self.endpoints)
+
+    def _probe(self, endpoint: Endpoint) -> bool:
+        try:
+            endpoint.client.tags()
+            healthy = True
+        except OllamaError:
+            healthy = False
+        with self._lock:
+            endpoint.healthy = healthy
+            endpoint.checked_at = time.time()
+        return healthy
+
+    def check_health(self) -> Dict[str, bool]:
+        """ตรวจทุก host ผ่าน /api/tags คืนสถานะของแต่ละ URL"""
+        return {endpoint.url: self._probe(endpoint) for endpoint in self.endpoints}
+
+    def _acquire(self, exclude: List[Endpoint]) -> Endpoint:
+        """เลือก host ที่ภาระน้อยที่สุดในบรรดา host ที่ใช้งานได้"""
+        now = time.time()
+        # host ที่พักไว้นานพอแล้วให้ตรวจสุขภาพใหม่
+        for endpoint in self.endpoints:
+            if not endpoint.healthy and endpoint not in exclude and now - endpoint.checked_at >= self.health_interval:
+                self._probe(endpoint)
+
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.healthy and e not in exclude]
+            if not candidates:
+                raise OllamaUnavailableError(f"No healthy Ollama host in pool ({self.base_url})")
+            endpoint = min(candidates, key=Endpoint.load)
+            endpoint.outstanding += 1
+            return endpoint
+
+    def _release(self, endpoint: Endpoint, ok: bool) -> None:
+        with self._lock:
+            endpoint.outstanding -= 1
+            if ok:
+                endpoint.completed += 1
+            else:
+                endpoint.failed += 1
+                endpoint.healthy = False
+                endpoint.checked_at = time.time()
+
+    @contextmanager
+    def _dispatch(self, exclude: List[Endpoint]) -> Iterator[Endpoint]:
+        endpoint = self._acquire(exclude)
+        try:
+            yield endpoint
+        except OllamaError as e:
+            # 4xx เป็นปัญหาของคำขอ ไม่ใช่ของ host
+            host_failed = e.status_code is None or e.status_code >= 500
+            self._release(endpoint, ok=not host_failed)
+            if host_failed:
+                exclude.append(endpoint)
+            raise
+        except BaseException:
+            self._release(endpoint, ok=True)
+            raise
+        else:
+            self._release(endpoint, ok=True)
+
+    def generate(self, payload: Dict, read_timeout: Optional[float] = None) -> Dict:
+        """เรียก /api/generate บน host ที่ว่างที่สุด ถ้า host ล้มเหลวส่งต่อไป host อื่น"""
+        exclude: List[Endpoint] = []
+        while True:
+            excluded = len(exclude)
+            try:
+                with self._dispatch(exclude) as endpoint:
+                    return endpoint.client.generate(payload, read_timeout=read_timeout)
+            except OllamaError:
+                # ลองต่อเฉพาะเมื่อ host ที่ใช้ล้มเหลวและถูกตัดออกไปแล้ว
+                if len(exclude) == excluded:
+                    raise
+
+    def generate_stream(self, payload: Dict, read_timeout: Optional[float] = None) -> Iterator[Dict]:
+        """เรียก /api/generate แบบ stream ส่งต่อไป host อื่นได้เฉพาะก่อนได้รับข้อมูลชิ้นแรก"""
+        exclude: List[Endpoint] = []
+        while True:
+            excluded = len(exclude)
+            received = False
+            try:
+                with self._dispatch(exclude) as endpoint:
+                    stream = endpoint.client.generate_stream(payload, read_timeout=read_timeout)
+                    try:
+                        for data in stream:
+                            received = True
+                            yield data
+                    finally:
+                        stream.close()
+                    return
+            except OllamaError:
+                if received or len(exclude) == excluded:
+                    raise
+
+    def _broadcast(self, call) -> Dict[str, Optional[Dict]]:
+        """เรียก call(client) บนทุก host ที่ใช้งานได้พร้อมกัน คืนผลต่อ URL (None ถ้าล้มเหลว)"""
+        endpoints = [e for e in self.endpoints if e.healthy]
+        results: Dict[str, Optional[Dict]] = {}
+
+        def run(endpoint: Endpoint) -> None:
+            try:
+                results[endpoint.url] = call(endpoint.client)
+            except OllamaError as e:
+                results[endpoint.url] = None
+                if e.status_code is None or e.status_code >= 500:
+                    with self._lock:
+                        endpoint.healthy = False
+                        endpoint.checked_at = time.time()
+
+        threads = [threading.Thread(target=run, args=(endpoint,)) for endpoint in endpoints]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def load(self, model_name: str, keep_alive=None, options: Optional[Dict] = None) -> Dict[str, Optional[Dict]]:
+        """โหลดโมเดลไว้ล่วงหน้าบนทุก host"""
+        results = self._broadcast(lambda client: client.load(model_name, keep_alive, options))
+        if results and not any(results.values()):
+            raise OllamaUnavailableError(f"Could not load {model_name} on any host ({self.base_url})")
+        return results
+
+    def unload(self, model_name: str) -> Dict[str, Optional[Dict]]:
+        """เอาโมเดลออกจากหน่วยความจำของทุก host"""
+        return self._broadcast(lambda client: client.unload(model_name))
+
+    def show(self, model_name: str) -> Dict:
+        with self._dispatch([]) as endpoint:
+            return endpoint.client.show(model_name)
+
+    def tags(self, read_timeout: float = 5.0) -> Dict:
+        with self._dispatch([]) as endpoint:
+            return endpoint.client.tags(read_timeout=read_timeout)
+
+    def stats(self) -> List[Dict]:
+        """สถิติต่อ host: สถานะ คำขอค้าง สำเร็จ ล้มเหลว"""
+        with self._lock:
+            return [{
+                "url": e.url,
+                "healthy": e.healthy,
+                "weight": e.weight,
+                "outstanding": e.outstanding,
+                "completed": e.completed,
+                "failed": e.failed
+            } for e in self.endpoints]
+
+    def close(self) -> None:
+        for endpoint in self.endpoints:
+            endpoint.client.close()
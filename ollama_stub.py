@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Ollama Stub Server
+A tiny stand-in for the Ollama HTTP API (/api/generate, /api/tags, /api/show)
+for trying the translator, the host pool and benchmarks without a GPU.
+It "translates" by prefixing every non-empty prompt line and reports fake
+timing metadata in the same fields Ollama uses. With --load-delay the first
+request after start-up or after an unload (keep_alive=0) pays a simulated
+model load, reported in load_duration; so does a request whose num_ctx differs
+from the one the model was loaded with, as in Ollama. Output is cut at
+options.num_predict tokens (done_reason "length"). Prompt evaluation is charged only for the
+part of system + prompt that does not share a prefix with the previous request,
+like llama.cpp's prompt cache.
+
+For tests, make_server/start_in_background also take respond (a function from
+the prompt to the response text, e.g. a looping or too-short "translation") and
+drop_done, which ends every stream without its final done record like a
+connection cut mid-generation. generations counts the translation requests
+(non-empty prompts) served.
+
+    python3 ollama_stub.py --port 11435 --delay 0.5
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    # ตั้งค่าผ่าน make_server
+    delay = 0.0
+    fail_status: Optional[int] = None
+    load_delay = 0.0
+    loaded = False
+    loaded_num_ctx: Optional[int] = None
+    respond: Optional[Callable[[str], str]] = None
+    drop_done = False
+    last_input = ""
+    requests_served = 0
+    generations = 0
+    _count_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body: Dict, status: int = 200) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "stub"}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        body = self._read_json()
+        if self.path == "/api/show":
+            self._send_json({"details": {"family": "stub"}, "model_info": {}})
+            return
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        with self._count_lock:
+            type(self).requests_served += 1
+
+        if self.fail_status:
+            self._send_json({"error": "stub failure"}, self.fail_status)
+            return
+
+        start = time.time()
+        load_ns = 0
+        options = body.get("options") or {}
+        with self._count_lock:
+            num_ctx = options.get("num_ctx", type(self).loaded_num_ctx)
+            # num_ctx อื่นจากที่โหลดไว้ = Ollama โหลดโมเดลใหม่
+            cold = not type(self).loaded or num_ctx != type(self).loaded_num_ctx
+            type(self).loaded = body.get("keep_alive") not in (0, "0", "0s")
+            type(self).loaded_num_ctx = num_ctx
+        if cold and self.load_delay:
+            time.sleep(self.load_delay)
+            load_ns = int(self.load_delay * 1e9)
+
+        prompt = body.get("prompt", "")
+        if not prompt:
+            # คำขอว่างใช้โหลด/ปล่อยโมเดลเท่านั้น
+            self._send_json({"model": body.get("model", "stub"), "response": "", "done": True,
+                             "done_reason": "unload" if not type(self).loaded else "load",
+                             "total_duration": int((time.time() - start) * 1e9), "load_duration": load_ns})
+            return
+
+        with self._count_lock:
+            type(self).generations += 1
+
+        # ส่วนที่ขึ้นต้นเหมือนคำขอก่อนหน้าไม่ต้องประมวลผล prompt ใหม่
+        full_input = body.get("system", "") + "\n" + prompt
+        with self._count_lock:
+            previous = type(self).last_input
+            type(self).last_input = full_input
+        shared = len(os.path.commonprefix([previous, full_input]))
+        uncached = (len(full_input) - shared) / max(len(full_input), 1)
+
+        compute_start = time.time()
+        time.sleep(self.delay)
+        if self.respond:
+            output = self.respond(prompt)
+        else:
+            output = "\n".join(f"[th] {line}" for line in prompt.split("\n") if line.strip())
+        done_reason = "stop"
+        num_predict = options.get("num_predict", -1)
+        if 0 < num_predict < len(output) // 4:
+            output = output[:num_predict * 4]
+            done_reason = "length"
+        elapsed = int((time.time() - compute_start) * 1e9)
+        metadata = {
+            "model": body.get("model", "stub"),
+            "done": True,
+            "done_reason": done_reason,
+            "total_duration": int((time.time() - start) * 1e9),
+            "load_duration": load_ns,
+            "prompt_eval_count": len(full_input) // 4,
+            "prompt_eval_duration": int(elapsed // 10 * uncached),
+            "eval_count": len(output) // 4,
+            "eval_duration": elapsed - elapsed // 10
+        }
+
+        if body.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for i in range(0, len(output), 16):
+                fragment = {"response": output[i:i + 16], "done": False}
+                self.wfile.write((json.dumps(fragment, ensure_ascii=False) + "\n").encode('utf-8'))
+                self.wfile.flush()
+            if not self.drop_done:
+                self.wfile.write((json.dumps(dict(metadata, response="")) + "\n").encode('utf-8'))
+        else:
+            self._send_json(dict(metadata, response=output))
+
+
+def make_server(port: int = 0, delay: float = 0.0, fail_status: Optional[int] = None,
+                host: str = "127.0.0.1", load_delay: float = 0.0,
+                respond: Optional[Callable[[str], str]] = None, drop_done: bool = False) -> ThreadingHTTPServer:
+    """สร้าง stub server (port=0 ให้ระบบเลือก port ว่าง ดูได้จาก server.server_address)"""
+    handler = type("ConfiguredStubHandler", (StubOllamaHandler,),
+                   {"delay": delay, "fail_status": fail_status, "load_delay": load_delay,
+                    "respond": staticmethod(respond) if respond else None, "drop_done": drop_done})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(port: int = 0, delay: float = 0.0, fail_status: Optional[int] = None,
+                        load_delay: float = 0.0, respond: Optional[Callable[[str], str]] = None,
+                        drop_done: bool = False) -> ThreadingHTTPServer:
+    """เริ่ม stub server ใน thread แยก คืน server (เรียก server.shutdown() เพื่อหยุด)"""
+    server = make_server(port, delay, fail_status, load_delay=load_delay, respond=respond, drop_done=drop_done)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server for testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--delay", type=float, default=0.5, help="seconds per generate request")
+    parser.add_argument("--fail-status", type=int, default=None, help="answer every generate with this HTTP status")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="simulated model load time in seconds")
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.delay, args.fail_status, args.host, args.load_delay)
+    print(f"Stub Ollama listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
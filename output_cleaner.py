@@ -0,0 +1,100 @@
+"""
+Output Cleaner
+Removes echoed prompt instructions and list markers from model output. All
+unwanted phrases are compiled into one regex, so each line is scanned once,
+and the same cleaner works on a whole output or on streamed fragments.
+"""
+
+import re
+from typing import Iterable, Iterator, List, Optional
+
+# บรรทัดที่มีแต่เลขข้อ เช่น "1." หรือ "12)" (เลขข้อของหลักการแปลที่โมเดลพิมพ์ซ้ำ)
+BARE_MARKER = r"\d{1,2}[.)]"
+
+
+class OutputCleaner:
+    """ทำความสะอาดผลการแปลทีละบรรทัด
+
+    ทิ้งบรรทัดว่าง, บรรทัดที่มีวลีใน phrases, บรรทัดที่ตรงกับ regex ใน line_patterns ทั้งบรรทัด
+    และบรรทัดที่มีแต่เลขข้อ (drop_bare_markers)
+    บรรทัดเนื้อเรื่องที่แค่มี "1." อยู่ข้างใน (เช่น "ราคา 1.5 ตำลึง") จะไม่ถูกทิ้ง
+    """
+
+    def __init__(self, phrases: Iterable[str], drop_bare_markers: bool = True, line_patterns: Iterable[str] = ()):
+        self.phrases = list(phrases)
+        # วลียาวก่อน เพื่อให้ alternation จับวลีที่ยาวที่สุดที่ตรงกัน
+        alternatives = [re.escape(p) for p in sorted(set(self.phrases), key=len, reverse=True) if p]
+        self._phrase_re = re.compile("|".join(alternatives)) if alternatives else None
+        self._marker_re = re.compile(BARE_MARKER) if drop_bare_markers else None
+        self.line_patterns = list(line_patterns)
+        self._line_re = re.compile("|".join(f"(?:{p})" for p in self.line_patterns)) if self.line_patterns else None
+
+    def clean_line(self, line: str) -> Optional[str]:
+        """ทำความสะอาดบรรทัดเดียว คืน None ถ้าต้องทิ้งบรรทัดนี้"""
+        line = line.strip()
+        if not line:
+            return None
+        if self._phrase_re and self._phrase_re.search(line):
+            return None
+        if self._is_dropped(line):
+            return None
+        return line
+
+    def iter_clean(self, lines: Iterable[str]) -> Iterator[str]:
+        for line in lines:
+            cleaned = self.clean_line(line)
+            if cleaned is not None:
+                yield cleaned
+
+    def _is_dropped(self, line: str) -> bool:
+        """บรรทัดที่มีแต่เลขข้อ หรือตรงกับ line_patterns ทั้งบรรทัด (line ต้อง strip แล้ว)"""
+        if self._marker_re is not None and len(line) <= 3 and self._marker_re.fullmatch(line) is not None:
+            return True
+        return self._line_re is not None and self._line_re.fullmatch(line) is not None
+
+    def clean(self, text: str) -> str:
+        """ทำความสะอาดผลลัพธ์ทั้งก้อน (ทิ้งบรรทัดว่างทั้งหมด จึงไม่มีบรรทัดว่างซ้ำเหลืออยู่)
+
+        ค้นวลีด้วย regex เดียวบนข้อความทั้งก้อน แล้วตัดทั้งบรรทัดที่พบ
+        บรรทัดที่เหลือแค่ strip และกรองบรรทัดว่าง/เลขข้อ/line_patterns โดยไม่ต้องตรวจวลีทีละบรรทัด
+        """
+        kept = []
+        pos = 0
+        if self._phrase_re:
+            match = self._phrase_re.search(text)
+            while match:
+                start = text.rfind("\n", 0, match.start()) + 1
+                end = text.find("\n", match.end())
+                if end == -1:
+                    end = len(text)
+                kept.append(text[pos:start])
+                pos = end
+                match = self._phrase_re.search(text, end)
+        kept.append(text[pos:])
+
+        lines = [line.strip() for line in "".join(kept).split("\n")]
+        return "\n".join(line for line in lines if line and not self._is_dropped(line))
+
+    def stream(self) -> "StreamCleaner":
+        return StreamCleaner(self)
+
+
+class StreamCleaner:
+    """รับผลลัพธ์เป็นชิ้นๆ (fragment จาก stream) คืนบรรทัดที่จบแล้วและสะอาดแล้วทันที"""
+
+    def __init__(self, cleaner: OutputCleaner):
+        self.cleaner = cleaner
+        self._pending = ""
+
+    def feed(self, fragment: str) -> List[str]:
+        """เพิ่ม fragment คืนบรรทัดที่ครบแล้ว เก็บส่วนที่ยังไม่จบบรรทัดไว้รอ fragment ถัดไป"""
+        if "\n" not in fragment:
+            self._pending += fragment
+            return []
+        *complete, self._pending = (self._pending + fragment).split("\n")
+        return list(self.cleaner.iter_clean(complete))
+
+    def finish(self) -> List[str]:
+        """บรรทัดสุดท้ายที่ไม่มี newline ปิดท้าย"""
+        pending, self._pending = self._pending, ""
+        return list(self.cleaner.iter_clean([pending]))
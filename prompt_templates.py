@@ -0,0 +1,123 @@
+"""
+Prompt Templates
+Single registry of the translation prompts used by novel_translator.py,
+token_checker.py and quick_token_check.py, so token estimates measure the
+prompt that is actually sent.
+
+Two layouts are supported. "inline" sends the template with the text substituted
+into it. "system" sends every fixed instruction in Ollama's `system` field and only
+the source text as the prompt. Every request then starts with the same tokens, so
+llama.cpp can reuse the cached prompt evaluation of that prefix between chunks.
+"""
+
+from typing import Callable, Dict, Optional, Tuple
+
+LAYOUT_INLINE = "inline"
+LAYOUT_SYSTEM = "system"
+LAYOUTS = (LAYOUT_INLINE, LAYOUT_SYSTEM)
+
+
+class PromptTemplate:
+    """Prompt ที่มีตำแหน่ง {text} สำหรับข้อความต้นฉบับ
+
+    จำนวน token ของส่วนคงที่ (ทุกอย่างยกเว้น {text}) นับครั้งเดียวต่อตัวนับ token แล้วเก็บไว้
+    การประเมิน token ต่อ chunk จึงนับเฉพาะข้อความของ chunk
+    """
+
+    def __init__(self, name: str, template: str, system: Optional[str] = None):
+        if "{text}" not in template:
+            raise ValueError(f"Prompt template '{name}' has no {{text}} placeholder")
+        self.name = name
+        self.template = template
+        self.prefix, self.suffix = template.split("{text}", 1)
+        # คำสั่งคงที่ทั้งหมดสำหรับ layout "system" (ถ้าไม่ระบุ ใช้ส่วนก่อนและหลัง {text} ต่อกัน)
+        self.system = system if system is not None else "\n\n".join(
+            part.strip() for part in (self.prefix, self.suffix) if part.strip())
+        self._fixed_tokens: Dict[Tuple[Callable, str], int] = {}
+
+    def render(self, text: str, notes: str = "") -> str:
+        """prompt เต็มสำหรับ text โดยใส่ notes (เช่น ศัพท์เฉพาะของ chunk) ไว้หน้าข้อความ"""
+        if notes:
+            text = notes + "\n\n" + text
+        return self.prefix + text + self.suffix
+
+    def payload_fields(self, text: str, layout: str = LAYOUT_INLINE, notes: str = "") -> Dict[str, str]:
+        """ฟิลด์ prompt (และ system) ของคำขอ /api/generate สำหรับ text ตาม layout
+
+        notes ที่เปลี่ยนไปตาม chunk อยู่หลังส่วนคงที่เสมอ เพื่อไม่ให้ prefix ที่ใช้ร่วมกันเปลี่ยน
+        """
+        if layout == LAYOUT_SYSTEM:
+            return {"system": self.system, "prompt": notes + "\n\n" + text if notes else text}
+        if layout == LAYOUT_INLINE:
+            return {"prompt": self.render(text, notes)}
+        raise ValueError(f"Unknown prompt layout '{layout}', use one of: {', '.join(LAYOUTS)}")
+
+    def signature(self, layout: str = LAYOUT_INLINE) -> str:
+        """ข้อความที่ระบุ prompt ที่ส่งจริงตาม layout ใช้เป็นส่วนหนึ่งของ cache key"""
+        if layout == LAYOUT_SYSTEM:
+            return f"[system]\n{self.system}\n[prompt]\n{{text}}"
+        return self.template
+
+    def fixed_tokens(self, count_tokens: Callable[[str], int], layout: str = LAYOUT_INLINE) -> int:
+        """จำนวน token ของส่วนคงที่ของ prompt (cache ตาม count_tokens และ layout)"""
+        key = (count_tokens, layout)
+        if key not in self._fixed_tokens:
+            if layout == LAYOUT_SYSTEM:
+                self._fixed_tokens[key] = count_tokens(self.system)
+            else:
+                self._fixed_tokens[key] = count_tokens(self.prefix) + count_tokens(self.suffix)
+        return self._fixed_tokens[key]
+
+    def count_tokens(self, text: str, count_tokens: Callable[[str], int], layout: str = LAYOUT_INLINE) -> int:
+        """จำนวน token ของ prompt เต็มสำหรับ text โดยนับเฉพาะ text ใหม่"""
+        return self.fixed_tokens(count_tokens, layout) + count_tokens(text)
+
+
+TEMPLATES: Dict[str, PromptTemplate] = {}
+
+
+def register(name: str, template: str, system: Optional[str] = None) -> PromptTemplate:
+    TEMPLATES[name] = PromptTemplate(name, template, system)
+    return TEMPLATES[name]
+
+
+def get_template(name: str) -> PromptTemplate:
+    try:
+        return TEMPLATES[name]
+    except KeyError:
+        raise KeyError(f"Unknown prompt template '{name}', available: {', '.join(TEMPLATES)}")
+
+
+# prompt ที่ NovelTranslator ส่งให้โมเดลจริง
+register("translate", """แปลข้อความต่อไปนี้จากภาษาอังกฤษเป็นภาษาไทยให้เป็นธรรมชาติและเหมาะสมกับนิยาย Wuxia/Xianxia โดยคงชื่อตัวละครและสถานที่ไว้:
+
+{text}""")
+
+# prompt แบบละเอียดพร้อมหลักการแปลและศัพท์เฉพาะ
+register("translate_detailed", """คุณคือนักแปลมืออาชีพที่มีความเชี่ยวชาญในการแปลนิยาย Wuxia/Xianxia จีนจากภาษาอังกฤษเป็นภาษาไทย
+
+กรุณาแปลเนื้อหาต่อไปนี้จากภาษาอังกฤษเป็นภาษาไทย:
+
+{text}
+
+หลักการแปล:
+1. รักษาความหมายและบรรยากาศของนิยาย Wuxia/Xianxia ไว้
+2. ใช้ภาษาไทยที่อ่านง่ายและไหลลื่น
+3. แปลศัพท์เฉพาะตามรายการศัพท์ที่ให้มา
+4. คงชื่อตัวละครและสถานที่เฉพาะไว้
+5. ปรับการใช้ภาษาให้เหมาะสมกับผู้อ่านไทย
+6. รักษาบุคลิกและสไตล์การพูดของตัวละครไว้
+
+การแปล:""", system="""คุณคือนักแปลมืออาชีพที่มีความเชี่ยวชาญในการแปลนิยาย Wuxia/Xianxia จีนจากภาษาอังกฤษเป็นภาษาไทย
+
+หลักการแปล:
+1. รักษาความหมายและบรรยากาศของนิยาย Wuxia/Xianxia ไว้
+2. ใช้ภาษาไทยที่อ่านง่ายและไหลลื่น
+3. แปลศัพท์เฉพาะตามรายการศัพท์ที่ให้มา
+4. คงชื่อตัวละครและสถานที่เฉพาะไว้
+5. ปรับการใช้ภาษาให้เหมาะสมกับผู้อ่านไทย
+6. รักษาบุคลิกและสไตล์การพูดของตัวละครไว้
+
+แปลข้อความที่ได้รับจากภาษาอังกฤษเป็นภาษาไทย ตอบเฉพาะคำแปล""")
+
+DEFAULT_TEMPLATE = "translate"
@@ -4,45 +4,54 @@ Quick Token Check Script
 A simple way to check token usage for your novel translation chunks
 """
 
+import argparse
+import functools
 import tiktoken
-import sys
 import os
+from typing import List, Optional
+from prompt_templates import DEFAULT_TEMPLATE, get_template
+from token_stream import DEFAULT_NUM_CTX, analyze_file, format_analysis
+from token_calibration import DEFAULT_CALIBRATION_PATH, load_profile
+import corpus_tokens
 
-def count_tokens(text: str) -> int:
-    """Count tokens using tiktoken"""
-    try:
-        tokenizer = tiktoken.get_encoding("cl100k_base")
-        return len(tokenizer.encode(text))
-    except:
-        # Fallback: approximate count
-        return len(text) // 4
-
-def analyze_chunk(text: str) -> dict:
-    """Analyze a text chunk for translation"""
-    # Your prompt template
-    prompt_template = """คุณคือนักแปลมืออาชีพที่มีความเชี่ยวชาญในการแปลนิยาย Wuxia/Xianxia จีนจากภาษาอังกฤษเป็นภาษาไทย
+DEFAULT_MODEL = "scb10x/typhoon-translate-4b"
 
-กรุณาแปลเนื้อหาต่อไปนี้จากภาษาอังกฤษเป็นภาษาไทย:
+@functools.lru_cache(maxsize=1)
+def get_encoder():
+    """Build the tiktoken encoder once; None when it cannot be loaded (e.g. offline)"""
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
 
-{text}
+def count_tokens(text: str) -> int:
+    """Count tokens using tiktoken"""
+    encoder = get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text))
+    # Fallback: approximate count
+    return len(text) // 4
 
-หลักการแปล:
-1. รักษาความหมายและบรรยากาศของนิยาย Wuxia/Xianxia ไว้
-2. ใช้ภาษาไทยที่อ่านง่ายและไหลลื่น
-3. แปลศัพท์เฉพาะ: Cultivation→การเพาะพิถี, Qi→ชี่, Dantian→ต้านเถียน, Breakthrough→ก้าวกระโดด, Elder→ผู้อาวุโส, Young Master→คุณชายหนุ่ม
-4. คงชื่อตัวละครและสถานที่เฉพาะไว้
-5. ปรับการใช้ภาษาให้เหมาะสมกับผู้อ่านไทย
-6. รักษาบุคลิกและสไตล์การพูดของตัวละครไว้
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Count tokens of many texts in one call (tiktoken encodes the batch in parallel threads)"""
+    encoder = get_encoder()
+    if encoder is not None:
+        return [len(tokens) for tokens in encoder.encode_batch(texts)]
+    return [len(text) // 4 for text in texts]
 
-การแปล:"""
-    
-    full_prompt = prompt_template.format(text=text)
+def analyze_chunk(text: str, template_name: str = DEFAULT_TEMPLATE,
+                  model_name: str = DEFAULT_MODEL, calibration_path: str = DEFAULT_CALIBRATION_PATH) -> dict:
+    """Analyze a text chunk for translation"""
+    # Same prompt the translator sends; its fixed part is tokenized once and cached
+    template = get_template(template_name)
+    # Model-token factors learned by translation runs (cl100k x1.2 until calibrated)
+    profile = load_profile(model_name, calibration_path)
     
     # Token counts
-    system_tokens = count_tokens(prompt_template.replace("{text}", ""))
+    system_tokens = template.fixed_tokens(count_tokens)
     input_tokens = count_tokens(text)
-    total_input_tokens = count_tokens(full_prompt)
-    estimated_output_tokens = int(input_tokens * 1.2)  # Thai output is usually longer
+    total_input_tokens = profile.model_tokens(system_tokens + input_tokens)
+    estimated_output_tokens = int(input_tokens * profile.output_ratio)
     total_tokens = total_input_tokens + estimated_output_tokens
     
     return {
@@ -54,29 +63,87 @@ def analyze_chunk(text: str) -> dict:
         "total_estimated_tokens": total_tokens
     }
 
+def analyze_path(filename: str, chunk_size: int = 2000, chunk_tokens: Optional[int] = None,
+                 num_ctx: int = DEFAULT_NUM_CTX, template_name: str = DEFAULT_TEMPLATE,
+                 model_name: str = DEFAULT_MODEL, calibration_path: str = DEFAULT_CALIBRATION_PATH) -> None:
+    """Stream a file chunk by chunk (constant memory) and print the per-chunk token distribution"""
+    print(f"Analyzing file: {filename}")
+    analysis = analyze_file(filename, count_tokens, get_template(template_name),
+                            chunk_size=chunk_size, chunk_tokens=chunk_tokens, num_ctx=num_ctx,
+                            calibration=load_profile(model_name, calibration_path))
+    unit = f"{chunk_tokens} tokens" if chunk_tokens else f"{chunk_size} characters"
+    print(f"\n📊 Token Analysis ({unit} per chunk):")
+    print(format_analysis(analysis))
+
+def analyze_directory(input_dir: str, args) -> None:
+    """Token accounting for every chapter of a folder, tokenized on a process pool"""
+    paths = corpus_tokens.list_corpus(input_dir)
+    if not paths:
+        print(f"No .txt files found in {input_dir}")
+        return
+    
+    throughput = corpus_tokens.load_throughput(args.metrics, args.benchmark)
+    if args.eval_tps:
+        throughput = {"source": "command line", "prompt_tokens_per_second": args.prompt_tps or 0.0,
+                      "eval_tokens_per_second": args.eval_tps, "throughput_tokens_per_second": None}
+    
+    print(f"Analyzing {len(paths)} files in {input_dir}")
+    report = corpus_tokens.analyze_corpus(paths, count_tokens, count_tokens_batch,
+                                          chunk_size=args.chunk_size, chunk_tokens=args.chunk_tokens,
+                                          num_ctx=args.num_ctx, workers=args.workers, throughput=throughput,
+                                          calibration=load_profile(args.model, args.calibration))
+    print(f"\n📊 Corpus Token Analysis:")
+    print(corpus_tokens.format_report(report))
+    if args.json:
+        corpus_tokens.write_json(report, args.json)
+        print(f"JSON report written to {args.json}")
+    if args.csv:
+        corpus_tokens.write_csv(report, args.csv)
+        print(f"CSV report written to {args.csv}")
+
 def main():
-    if len(sys.argv) > 1:
+    parser = argparse.ArgumentParser(description="Check token usage of a text, a novel file or a folder of chapters")
+    parser.add_argument("file", nargs="?", help="file to analyze (streamed chunk by chunk) or folder of chapters")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="chunk size in characters")
+    parser.add_argument("--chunk-tokens", type=int, default=None, help="chunk size in tokens instead")
+    parser.add_argument("--num-ctx", type=int, default=DEFAULT_NUM_CTX, help="context window to check against")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="model whose learned token calibration to use")
+    parser.add_argument("--calibration", default=DEFAULT_CALIBRATION_PATH,
+                        help="calibration file written by translation runs")
+    corpus = parser.add_argument_group("folder mode")
+    corpus.add_argument("--workers", type=int, default=None, help="tokenizer processes (default: CPU count)")
+    corpus.add_argument("--json", default=None, help="write the corpus report as JSON")
+    corpus.add_argument("--csv", default=None, help="write per-file token counts as CSV")
+    corpus.add_argument("--metrics", default=None, help="translator metrics JSONL with measured tokens/s")
+    corpus.add_argument("--benchmark", default=None, help="benchmark report with measured tokens/s")
+    corpus.add_argument("--eval-tps", type=float, default=None, help="generation tokens/s (overrides measured)")
+    corpus.add_argument("--prompt-tps", type=float, default=None, help="prompt evaluation tokens/s")
+    args = parser.parse_args()
+    
+    if args.file and os.path.isdir(args.file):
+        analyze_directory(args.file, args)
+        return
+    
+    if args.file:
         # File provided as argument
-        filename = sys.argv[1]
-        if os.path.exists(filename):
-            with open(filename, 'r', encoding='utf-8') as f:
-                text = f.read()
-            print(f"Analyzing file: {filename}")
+        if os.path.exists(args.file):
+            analyze_path(args.file, args.chunk_size, args.chunk_tokens, args.num_ctx,
+                         model_name=args.model, calibration_path=args.calibration)
         else:
-            print(f"File not found: {filename}")
-            return
-    else:
-        # Interactive mode
-        print("Quick Token Checker")
-        print("==================")
-        text = input("Enter text to analyze (or filename): ").strip()
-        
-        if os.path.exists(text):
-            with open(text, 'r', encoding='utf-8') as f:
-                text = f.read()
-            print(f"Analyzing file content...")
+            print(f"File not found: {args.file}")
+        return
+    
+    # Interactive mode
+    print("Quick Token Checker")
+    print("==================")
+    text = input("Enter text to analyze (or filename): ").strip()
+    
+    if os.path.exists(text):
+        analyze_path(text, args.chunk_size, args.chunk_tokens, args.num_ctx,
+                     model_name=args.model, calibration_path=args.calibration)
+        return
     
-    analysis = analyze_chunk(text)
+    analysis = analyze_chunk(text, model_name=args.model, calibration_path=args.calibration)
     
     print(f"\n📊 Token Analysis:")
     print(f"Text length: {analysis['text_length']:,} characters")
@@ -87,7 +154,7 @@ def main():
     print(f"Total estimated: {analysis['total_estimated_tokens']} tokens")
     
     # Context limits
-    current_limit = 16384  # Updated limit
+    current_limit = DEFAULT_NUM_CTX  # the translator's num_ctx ceiling
     max_limit = 131072     # Model maximum
     
     print(f"\n🎯 Context Analysis:")
@@ -0,0 +1,119 @@
+"""
+Rate Control
+AIMD controller that replaces the fixed sleep between chunks. It grows the
+number of requests in flight while Ollama keeps up and backs off (fewer
+requests, longer pacing delay) on HTTP 429/503, timeouts or when responses
+show the request spent most of its time queued instead of computing.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+# สถานะที่แปลว่าเซิร์ฟเวอร์รับงานไม่ไหว
+OVERLOAD_STATUS = {429, 503}
+
+
+class AdaptiveRateController:
+    """ควบคุมจำนวนคำขอที่ค้างอยู่และระยะห่างระหว่างคำขอแบบ additive-increase / multiplicative-decrease
+
+    - สำเร็จและไม่แออัด: limit เพิ่มขึ้นราว 1 ต่อ limit คำขอ และ delay ลดลงครึ่งหนึ่ง
+    - แออัด (429/503, timeout, หรือเวลาที่รอคิวนานเกิน queue_ratio เท่าของเวลาประมวลผล
+      และเกิน min_queue_delay วินาที): limit ลดลงตาม decrease_factor และ delay เพิ่มเป็นสองเท่า
+      (อย่างน้อย backoff_delay)
+
+    min_queue_delay กันไม่ให้คำขอสั้นๆ ที่เวลา HTTP/parse ไม่กี่ ms มากกว่าเวลาประมวลผล ถูกนับว่าแออัด
+    """
+
+    def __init__(self, max_concurrency: int = 1, min_concurrency: int = 1, initial_concurrency: int = 1,
+                 initial_delay: float = 0.0, backoff_delay: float = 1.0, max_delay: float = 30.0,
+                 decrease_factor: float = 0.5, queue_ratio: float = 2.0, min_queue_delay: float = 1.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self.delay = initial_delay
+        self.backoff_delay = backoff_delay
+        self.max_delay = max_delay
+        self.decrease_factor = decrease_factor
+        self.queue_ratio = queue_ratio
+        self.min_queue_delay = min_queue_delay
+
+        self.in_flight = 0
+        self.successes = 0
+        self.overloads = 0
+        self._next_start = 0.0
+        self._last_decrease = 0.0
+        self._latency_baseline: Optional[float] = None
+        self._cond = threading.Condition()
+
+    @property
+    def concurrency(self) -> int:
+        return int(self.limit)
+
+    def acquire(self) -> float:
+        """รอจนกว่าจะส่งคำขอได้ (มีช่องว่างและพ้นระยะ delay) คืนเวลาที่เริ่มคำขอ"""
+        with self._cond:
+            while True:
+                now = time.time()
+                if self.in_flight < self.concurrency and now >= self._next_start:
+                    self.in_flight += 1
+                    self._next_start = now + self.delay
+                    return now
+                timeout = max(self._next_start - now, 0.0) if self.in_flight < self.concurrency else None
+                self._cond.wait(timeout)
+
+    def release(self, started: float, ok: bool = True, status_code: Optional[int] = None,
+                result: Optional[Dict] = None) -> None:
+        """แจ้งผลของคำขอที่เริ่มเมื่อ started
+
+        ok=False กับ status_code เป็น None ถือว่าเป็น timeout / เชื่อมต่อไม่ได้
+        result คือ JSON จาก Ollama (ใช้ total/prompt_eval/eval_duration ตรวจว่าคำขอรอคิวนานหรือไม่)
+        """
+        latency = time.time() - started
+
+        with self._cond:
+            if ok:
+                overloaded = self._is_congested(latency, result)
+            else:
+                overloaded = status_code is None or status_code in OVERLOAD_STATUS
+
+            self.in_flight -= 1
+            if overloaded and started < self._last_decrease:
+                # คำขอที่เริ่มก่อนการลดครั้งล่าสุดสะท้อน limit เดิม ไม่ลดซ้ำ
+                self.overloads += 1
+            elif overloaded:
+                self.overloads += 1
+                self._last_decrease = time.time()
+                self.limit = max(float(self.min_concurrency), self.limit * self.decrease_factor)
+                self.delay = min(self.max_delay, max(self.delay * 2, self.backoff_delay))
+                self._next_start = max(self._next_start, time.time() + self.delay)
+            elif ok:
+                self.successes += 1
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+                self.delay = self.delay / 2 if self.delay > 0.05 else 0.0
+                self._next_start = min(self._next_start, time.time() + self.delay)
+            self._cond.notify_all()
+
+    def _is_congested(self, latency: float, result: Optional[Dict]) -> bool:
+        compute_ns = 0
+        if result:
+            compute_ns = result.get("prompt_eval_duration", 0) + result.get("eval_duration", 0)
+        if compute_ns > 0:
+            # เวลาที่เหลือนอกจากการประมวลผลและโหลดโมเดลคือเวลารอคิวบนเซิร์ฟเวอร์ (รวม overhead ของ HTTP)
+            compute_s = compute_ns / 1e9
+            queued = latency - result.get("load_duration", 0) / 1e9 - compute_s
+            return queued > max(self.min_queue_delay, compute_s * self.queue_ratio)
+
+        # ไม่มีข้อมูลจาก Ollama: เทียบกับ latency ปกติที่เห็นมา (EWMA)
+        baseline = self._latency_baseline
+        self._latency_baseline = latency if baseline is None else baseline * 0.8 + latency * 0.2
+        return (baseline is not None and latency > baseline * self.queue_ratio * 2
+                and latency - baseline > self.min_queue_delay)
+
+    def stats(self) -> Dict:
+        return {
+            "concurrency": self.concurrency,
+            "delay": self.delay,
+            "successes": self.successes,
+            "overloads": self.overloads
+        }
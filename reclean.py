@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Re-clean Translations
+Re-applies the current output cleaning rules to already translated files without
+calling the model again. It reads the raw model outputs kept in each
+<output>.journal.jsonl (memory-mapped) and rebuilds the output files, one journal
+per worker process. Term repairs use the glossary recorded in the journal when the
+file was translated, or the glossary file given with --glossary. Journals written
+before the glossary was recorded get no term repair unless --glossary is given.
+
+    python3 reclean.py translated_novels
+    python3 reclean.py translated_novels --export-dir cleaned_novels --workers 8
+    python3 reclean.py translated_novels --glossary english/glossary.txt
+"""
+
+import argparse
+import json
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from glossary import Glossary
+from output_cleaner import OutputCleaner
+from translation_journal import JOURNAL_SUFFIX
+
+# ตัวทำความสะอาดของแต่ละ worker process (สร้างครั้งเดียวใน _init_worker)
+_cleaner: Optional[OutputCleaner] = None
+_glossary: Optional[Glossary] = None
+# glossary จาก journal แยกตาม JSON ของศัพท์ (ไฟล์ของนิยายเดียวกันใช้ชุดเดียวกัน สร้างครั้งเดียว)
+_journal_glossaries: Dict[str, Glossary] = {}
+
+
+def _init_worker(phrases: List[str], glossary: Optional[Glossary] = None,
+                 line_patterns: Optional[List[str]] = None) -> None:
+    global _cleaner, _glossary
+    _cleaner = OutputCleaner(phrases, line_patterns=line_patterns or ())
+    _glossary = glossary
+
+
+def _glossary_for(data: Optional[Dict]) -> Optional[Glossary]:
+    """glossary ที่ใช้แก้ศัพท์: --glossary ถ้าระบุ ไม่เช่นนั้นชุดที่บันทึกใน journal ตอนแปล (None = ไม่แก้ศัพท์)"""
+    if _glossary is not None or data is None:
+        return _glossary
+    key = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    if key not in _journal_glossaries:
+        _journal_glossaries[key] = Glossary.from_dict(data)
+    return _journal_glossaries[key]
+
+
+def iter_records(path: str) -> Iterator[Dict]:
+    """อ่าน record ของ journal ผ่าน mmap ข้ามบรรทัดที่เสียหาย"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for line in iter(data.readline, b""):
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def reclean_journal(journal_path: str, export_dir: Optional[str] = None, dry_run: bool = False) -> Dict:
+    """ทำความสะอาดคำแปลของไฟล์เดียวใหม่จาก journal และเขียนไฟล์ผลลัพธ์ถ้าเนื้อหาเปลี่ยน"""
+    output_file = journal_path[:-len(JOURNAL_SUFFIX)]
+    result = {"file": output_file, "status": "skipped", "chunks": 0, "legacy_chunks": 0, "glossary": False}
+
+    chunks: Dict[int, Dict] = {}
+    total = None
+    glossary_data = None
+    for record in iter_records(journal_path):
+        if record.get("type") == "chunk":
+            chunks[record["index"]] = record
+            # มี chunk ใหม่หลัง record complete แปลว่าไฟล์กำลังถูกแปลใหม่อยู่
+            total = None
+        elif record.get("type") == "complete":
+            total = record.get("chunks")
+            glossary_data = record.get("glossary")
+
+    if total is None or any(i not in chunks for i in range(total)):
+        result["reason"] = "แปลยังไม่ครบ"
+        return result
+
+    glossary = _glossary_for(glossary_data)
+    result["glossary"] = glossary is not None
+    parts = []
+    for i in range(total):
+        record = chunks[i]
+        if "raw" in record:
+            cleaned = _cleaner.clean(record["raw"])
+            if glossary:
+                # แก้เฉพาะศัพท์ที่พบในต้นฉบับของ chunk ตอนแปล (record เก่าที่ไม่ได้บันทึกไว้: ทุกศัพท์)
+                terms = record.get("terms")
+                cleaned = glossary.repair(cleaned, "\n".join(terms) if terms is not None else None)
+            parts.append(cleaned)
+        else:
+            # record เก่าที่ไม่มีผลลัพธ์ดิบ ใช้คำแปลที่ทำความสะอาดไว้แล้ว
+            parts.append(record["translation"])
+            result["legacy_chunks"] += 1
+    content = "\n\n".join(parts)
+    result["chunks"] = total
+
+    target = os.path.join(export_dir, os.path.basename(output_file)) if export_dir else output_file
+    try:
+        with open(target, 'r', encoding='utf-8') as f:
+            unchanged = f.read() == content
+    except (FileNotFoundError, UnicodeDecodeError):
+        unchanged = False
+    if unchanged:
+        result["status"] = "unchanged"
+        return result
+
+    result["status"] = "changed"
+    if not dry_run:
+        # เขียนไฟล์ชั่วคราวแล้วแทนที่ ไฟล์เดิมจะไม่เสียถ้าถูกหยุดกลางคัน
+        temp = target + ".tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp, target)
+    return result
+
+
+def find_journals(output_dir: str) -> List[str]:
+    return sorted(os.path.join(output_dir, name) for name in os.listdir(output_dir)
+                  if name.endswith(JOURNAL_SUFFIX))
+
+
+def reclean_directory(output_dir: str, phrases: List[str], export_dir: Optional[str] = None,
+                      workers: Optional[int] = None, dry_run: bool = False,
+                      glossary: Optional[Glossary] = None,
+                      line_patterns: Optional[List[str]] = None) -> List[Dict]:
+    """ทำความสะอาดทุกไฟล์ที่มี journal ใน output_dir ใหม่ด้วย process pool
+
+    glossary (ถ้าระบุ) ใช้แทนศัพท์ที่บันทึกไว้ใน journal ของทุกไฟล์
+    """
+    journals = find_journals(output_dir)
+    if export_dir and not dry_run:
+        os.makedirs(export_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(phrases, glossary, line_patterns)) as executor:
+        # chunksize ใหญ่ขึ้นลด overhead การส่งงานเมื่อมีไฟล์หลายพันไฟล์
+        chunksize = max(1, len(journals) // ((workers or os.cpu_count() or 1) * 4))
+        return list(executor.map(reclean_journal, journals, [export_dir] * len(journals),
+                                 [dry_run] * len(journals), chunksize=chunksize))
+
+
+def main():
+    from novel_translator import NovelTranslator
+
+    parser = argparse.ArgumentParser(description="ทำความสะอาดไฟล์ที่แปลแล้วใหม่จากผลลัพธ์ดิบใน journal")
+    parser.add_argument("output_dir", help="โฟลเดอร์ผลการแปล (มีไฟล์ .journal.jsonl)")
+    parser.add_argument("--export-dir", default=None, help="เขียนผลลงโฟลเดอร์นี้แทนการเขียนทับ")
+    parser.add_argument("--workers", type=int, default=None, help="จำนวน process (ค่าเริ่มต้น = จำนวน CPU)")
+    parser.add_argument("--dry-run", action="store_true", help="แสดงเฉพาะไฟล์ที่จะเปลี่ยน ไม่เขียนไฟล์")
+    parser.add_argument("--glossary", default=None,
+                        help="ไฟล์ศัพท์เฉพาะของนิยาย (ค่าเริ่มต้น = ศัพท์ที่บันทึกใน journal ตอนแปล)")
+    args = parser.parse_args()
+    glossary = Glossary.load(args.glossary) if args.glossary else None
+
+    started = time.time()
+    results = reclean_directory(args.output_dir, NovelTranslator.UNWANTED_PHRASES, args.export_dir,
+                                args.workers, args.dry_run, glossary, NovelTranslator.UNWANTED_LINES)
+
+    for result in results:
+        if result["status"] == "changed":
+            print(f"{'จะเปลี่ยน' if args.dry_run else 'เขียนใหม่'}: {result['file']}")
+        elif result["status"] == "skipped":
+            print(f"ข้าม ({result['reason']}): {result['file']}")
+
+    counts = {status: sum(1 for r in results if r["status"] == status)
+              for status in ("changed", "unchanged", "skipped")}
+    legacy = sum(r["legacy_chunks"] for r in results)
+    print(f"\n{len(results)} ไฟล์: เปลี่ยน {counts['changed']}, เหมือนเดิม {counts['unchanged']}, "
+          f"ข้าม {counts['skipped']} ใน {time.time() - started:.1f} วินาที")
+    if legacy:
+        print(f"{legacy} ส่วนไม่มีผลลัพธ์ดิบใน journal (แปลก่อนมีการบันทึก raw) จึงใช้คำแปลเดิม")
+    unrepaired = sum(1 for r in results if r["status"] != "skipped" and not r["glossary"])
+    if unrepaired:
+        print(f"{unrepaired} ไฟล์ไม่มีศัพท์บันทึกใน journal (แปลก่อนมีการบันทึก glossary) จึงไม่แก้ศัพท์ "
+              f"ระบุ --glossary เพื่อแก้")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Runaway Guard
+Watches a translation while the model is generating it and says when to stop:
+the recent output is mostly repeated character n-grams (the model is looping on
+a phrase), or the output is already longer than estimate_quality accepts for
+the source. Once generation completes, finish() also rejects output shorter
+than that range. Character n-grams are used because Thai is written without
+spaces between words.
+"""
+
+from typing import Optional
+
+NGRAM = 8
+# ขนาดช่วงท้ายของผลลัพธ์ที่ตรวจการวนซ้ำ และตรวจทุกๆ กี่ตัวอักษรที่ได้เพิ่ม
+WINDOW = 480
+CHECK_EVERY = 64
+# สัดส่วน n-gram ซ้ำในช่วงท้ายที่ถือว่าวนซ้ำ (ข้อความปกติมักต่ำกว่า 0.2 วลีที่วนซ้ำเข้าใกล้ 1)
+MAX_REPEATED_FRACTION = 0.5
+# ต้นฉบับที่ซ้ำเองอยู่แล้ว (เสียงกรีดร้อง, เส้นคั่น) ยอมให้คำแปลซ้ำได้มากกว่าต้นฉบับเท่านี้
+SOURCE_MARGIN = 0.2
+# ต้นฉบับสั้นมาก ("Huh?") คำแปลยาวหรือสั้นกว่าหลายเท่าได้ จึงไม่ตัดก่อนความยาวนี้
+# และไม่ตรวจความยาวขั้นต่ำของต้นฉบับที่สั้นกว่านี้
+MIN_OUTPUT_LIMIT = 200
+
+
+def repeated_fraction(text: str, n: int = NGRAM) -> float:
+    """สัดส่วนของ character n-gram ใน text ที่ซ้ำกับ n-gram ก่อนหน้า"""
+    total = len(text) - n + 1
+    if total <= 0:
+        return 0.0
+    distinct = len({text[i:i + n] for i in range(total)})
+    return 1.0 - distinct / total
+
+
+def source_repetition(text: str, window: int = WINDOW) -> float:
+    """สัดส่วน n-gram ซ้ำสูงสุดในช่วงขนาด window ของต้นฉบับ"""
+    if len(text) <= window:
+        return repeated_fraction(text)
+    return max(repeated_fraction(text[start:start + window])
+               for start in range(0, len(text) - window // 2, window // 2))
+
+
+class RunawayGuard:
+    """ป้อนผลลัพธ์ทีละส่วนด้วย feed() คืนเหตุผล (ข้อความ) เมื่อควรยกเลิกการ generate"""
+
+    def __init__(self, source: str, max_length_ratio: float, min_length_ratio: float = 0.0):
+        self.max_length_ratio = max_length_ratio
+        self.max_length = max(int(len(source) * max_length_ratio), MIN_OUTPUT_LIMIT)
+        self.min_length_ratio = min_length_ratio
+        self.min_length = int(len(source) * min_length_ratio) if len(source) >= MIN_OUTPUT_LIMIT else 0
+        self.max_repeated = max(MAX_REPEATED_FRACTION, source_repetition(source) + SOURCE_MARGIN)
+        self.length = 0
+        self.reason: Optional[str] = None
+        self._tail = ""
+        self._next_check = WINDOW
+
+    def feed(self, fragment: str) -> Optional[str]:
+        self.length += len(fragment)
+        self._tail = (self._tail + fragment)[-WINDOW:]
+        if self.length > self.max_length:
+            self.reason = f"ผลลัพธ์ยาวเกิน {self.max_length_ratio:g} เท่าของต้นฉบับ"
+        elif self.length >= self._next_check:
+            self._next_check = self.length + CHECK_EVERY
+            fraction = repeated_fraction(self._tail)
+            if fraction > self.max_repeated:
+                self.reason = f"โมเดลวนซ้ำ (ข้อความซ้ำ {fraction:.0%} ของ {WINDOW} ตัวอักษรล่าสุด)"
+        return self.reason
+
+    def finish(self) -> Optional[str]:
+        """เรียกเมื่อ generate จบครบ (ไม่ถูกตัดที่ num_predict) คืนเหตุผลถ้าผลลัพธ์สั้นเกินไป"""
+        if self.reason is None and self.length < self.min_length:
+            self.reason = f"ผลลัพธ์สั้นกว่า {self.min_length_ratio:g} เท่าของต้นฉบับ"
+        return self.reason
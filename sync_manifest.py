@@ -0,0 +1,119 @@
+"""
+Sync Manifest
+Per output-folder record of what was translated from each source file: size,
+mtime, content hash and the chunk boundaries that were used. translate_directory
+uses it to skip unchanged files without reading them, and to keep the old chunk
+boundaries around the unchanged parts of an edited file, so only the edited
+region is sent to the model and spliced into the existing translation.
+"""
+
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+from chunker import PARAGRAPH_SEPARATOR, iter_paragraphs
+from translation_journal import hash_text
+
+MANIFEST_FILENAME = ".translation_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def chunk_entry(chunk: str) -> Dict:
+    """hash ของ chunk และของย่อหน้าแรก พร้อมจำนวนย่อหน้า ใช้หา chunk เดิมในต้นฉบับที่ถูกแก้"""
+    paragraphs = chunk.split(PARAGRAPH_SEPARATOR)
+    return {"hash": hash_text(chunk), "first": hash_text(paragraphs[0]), "paragraphs": len(paragraphs)}
+
+
+def align_chunks(text: str, previous: List[Dict], chunk_fn: Callable[[str], List[str]]) -> List[str]:
+    """แบ่ง text เป็น chunks โดยใช้ขอบ chunk เดิมซ้ำทุกที่ที่ย่อหน้ายังเหมือนเดิม
+
+    ช่วงที่ไม่ตรงกับ chunk เดิม (ย่อหน้าใหม่หรือถูกแก้) แบ่งใหม่ด้วย chunk_fn
+    การแก้ต้นบทจึงไม่ทำให้ขอบ chunk ทั้งไฟล์เลื่อนและต้องแปลใหม่ทั้งหมด
+    """
+    by_first: Dict[str, List[Dict]] = {}
+    for entry in previous:
+        by_first.setdefault(entry["first"], []).append(entry)
+
+    paragraphs = list(iter_paragraphs(text))
+    chunks: List[str] = []
+    run: List[str] = []
+    i = 0
+    while i < len(paragraphs):
+        match = None
+        for entry in by_first.get(hash_text(paragraphs[i]), ()):
+            candidate = PARAGRAPH_SEPARATOR.join(paragraphs[i:i + entry["paragraphs"]])
+            if hash_text(candidate) == entry["hash"]:
+                match = (candidate, entry["paragraphs"])
+                break
+        if match is None:
+            run.append(paragraphs[i])
+            i += 1
+            continue
+        if run:
+            chunks.extend(chunk_fn(PARAGRAPH_SEPARATOR.join(run)))
+            run = []
+        chunks.append(match[0])
+        i += match[1]
+    if run:
+        chunks.extend(chunk_fn(PARAGRAPH_SEPARATOR.join(run)))
+    return chunks
+
+
+class SyncManifest:
+    """ไฟล์ .translation_manifest.json ในโฟลเดอร์ผลลัพธ์ เก็บข้อมูลของไฟล์ที่แปลครบแล้ว"""
+
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        self.files: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.files = data.get("files", {})
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError) as e:
+            print(f"อ่าน manifest ไม่ได้ จะตรวจทุกไฟล์ใหม่: {e}")
+
+    @staticmethod
+    def _stat(input_file: str) -> Dict:
+        stat = os.stat(input_file)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def get(self, name: str) -> Optional[Dict]:
+        return self.files.get(name)
+
+    def is_unchanged(self, name: str, input_file: str, output_file: str) -> bool:
+        """ขนาดและเวลาแก้ไขของต้นฉบับตรงกับตอนแปลครั้งล่าสุด และไฟล์ผลลัพธ์ยังอยู่ (ไม่ต้องอ่านไฟล์)"""
+        entry = self.files.get(name)
+        if not entry or not os.path.exists(output_file):
+            return False
+        try:
+            stat = self._stat(input_file)
+        except OSError:
+            return False
+        return entry["size"] == stat["size"] and entry["mtime_ns"] == stat["mtime_ns"]
+
+    def update(self, name: str, input_file: str, source_hash: str, chunks: List[str]) -> None:
+        """บันทึกไฟล์ที่แปลครบแล้ว พร้อมขอบ chunk ที่ใช้"""
+        try:
+            stat = self._stat(input_file)
+        except OSError:
+            return
+        with self._lock:
+            self.files[name] = dict(stat, source_hash=source_hash, chunks=[chunk_entry(c) for c in chunks])
+            self._dirty = True
+
+    def save(self) -> None:
+        """เขียน manifest (ไฟล์ชั่วคราวแล้วแทนที่ manifest เดิมจะไม่เสียถ้าถูกหยุดกลางคัน)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            temp = self.path + ".tmp"
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump({"version": MANIFEST_VERSION, "files": self.files}, f)
+            os.replace(temp, self.path)
+            self._dirty = False
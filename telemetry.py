@@ -0,0 +1,147 @@
+"""
+Telemetry
+Per-request performance records built from Ollama's response metadata
+(total/load/prompt_eval/eval durations and counts) plus client-side queue
+wait and latency, with p50/p95 summaries and JSONL / Prometheus text output.
+"""
+
+import json
+import threading
+from typing import Dict, Iterable, List, Optional
+
+# ฟิลด์เวลาจาก Ollama เป็น nanoseconds
+OLLAMA_FIELDS = ("total_duration", "load_duration", "prompt_eval_count",
+                 "prompt_eval_duration", "eval_count", "eval_duration")
+
+# load_duration ที่นานกว่านี้ถือว่าโมเดลถูกโหลดใหม่ (ไม่ได้อยู่ในหน่วยความจำอยู่แล้ว)
+COLD_LOAD_SECONDS = 1.0
+
+
+def percentile(values: List[float], p: float) -> float:
+    """percentile แบบ linear interpolation (p อยู่ระหว่าง 0-100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(records: Iterable[Dict]) -> Dict:
+    """สรุปสถิติของคำขอที่ส่งถึงโมเดลจริง (ไม่รวม cache hit)"""
+    records = list(records)
+    requests = [r for r in records if not r.get("cache_hit")]
+    ok = [r for r in requests if r.get("ok")]
+    latencies = [r["latency"] for r in ok]
+    waits = [r.get("queue_wait", 0.0) for r in requests]
+
+    eval_count = sum(r.get("eval_count", 0) for r in ok)
+    eval_seconds = sum(r.get("eval_duration", 0) for r in ok) / 1e9
+    prompt_count = sum(r.get("prompt_eval_count", 0) for r in ok)
+    prompt_seconds = sum(r.get("prompt_eval_duration", 0) for r in ok) / 1e9
+    load_seconds = sum(r.get("load_duration", 0) for r in ok) / 1e9
+    wall = (max(r["finished"] for r in ok) - min(r["started"] for r in ok)) if ok else 0.0
+
+    return {
+        "requests": len(requests),
+        "failed": len(requests) - len(ok),
+        "aborted": sum(1 for r in requests if r.get("aborted")),
+        "cache_hits": len(records) - len(requests),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "queue_wait_p50": percentile(waits, 50),
+        "queue_wait_p95": percentile(waits, 95),
+        "load_seconds": load_seconds,
+        "cold_loads": sum(1 for r in ok if r.get("load_duration", 0) / 1e9 >= COLD_LOAD_SECONDS),
+        "prompt_tokens": prompt_count,
+        "output_tokens": eval_count,
+        "prompt_tokens_per_second": prompt_count / prompt_seconds if prompt_seconds else 0.0,
+        "eval_tokens_per_second": eval_count / eval_seconds if eval_seconds else 0.0,
+        "throughput_tokens_per_second": eval_count / wall if wall else 0.0
+    }
+
+
+def format_summary(summary: Dict) -> str:
+    aborted = f", ยกเลิกเพราะวนซ้ำ {summary['aborted']}" if summary.get('aborted') else ""
+    return (f"คำขอ {summary['requests']} (ล้มเหลว {summary['failed']}{aborted}, cache {summary['cache_hits']}) | "
+            f"latency p50 {summary['latency_p50']:.2f}s p95 {summary['latency_p95']:.2f}s | "
+            f"รอคิว p50 {summary['queue_wait_p50']:.2f}s | "
+            f"prompt {summary['prompt_tokens_per_second']:.0f} tok/s | "
+            f"generate {summary['eval_tokens_per_second']:.1f} tok/s | "
+            f"โหลดโมเดล {summary['load_seconds']:.1f}s ({summary['cold_loads']} ครั้ง)")
+
+
+class MetricsRecorder:
+    """เก็บ record ต่อคำขอในหน่วยความจำ และเขียนต่อท้ายไฟล์ JSONL ถ้าระบุ jsonl_path"""
+
+    def __init__(self, jsonl_path: Optional[str] = None):
+        self.jsonl_path = jsonl_path
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def record(self, started: float, finished: float, ok: bool, result: Optional[Dict] = None,
+               queued: Optional[float] = None, **fields) -> Dict:
+        """บันทึกคำขอหนึ่งครั้ง
+
+        started/finished คือเวลาที่ส่งคำขอและได้ผลครบ, queued คือเวลาที่เริ่มรอส่งคำขอ
+        (ช่วง queued -> started คือเวลาที่รอตัวควบคุมอัตรา)
+        result คือ JSON จาก Ollama (ข้อความสุดท้ายของ stream ก็ได้)
+        """
+        record = {
+            "timestamp": finished,
+            "started": started,
+            "finished": finished,
+            "latency": finished - started,
+            "queue_wait": (started - queued) if queued else 0.0,
+            "ok": ok
+        }
+        record.update(fields)
+        if result:
+            for key in OLLAMA_FIELDS:
+                if key in result:
+                    record[key] = result[key]
+
+        with self._lock:
+            self.records.append(record)
+            if self.jsonl_path:
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+    def mark(self) -> int:
+        """ตำแหน่งปัจจุบัน ใช้คู่กับ since() เพื่อสรุปเฉพาะช่วงการทำงานหนึ่ง"""
+        with self._lock:
+            return len(self.records)
+
+    def since(self, mark: int = 0, **filters) -> List[Dict]:
+        with self._lock:
+            records = self.records[mark:]
+        return [r for r in records if all(r.get(k) == v for k, v in filters.items())]
+
+    def write_prometheus(self, path: str, records: Optional[List[Dict]] = None) -> None:
+        """เขียนสรุปในรูปแบบ Prometheus text exposition (ใช้กับ node_exporter textfile collector)"""
+        summary = summarize(self.records if records is None else records)
+        lines = []
+        for name, key, help_text in (
+            ("translator_requests_total", "requests", "Requests sent to Ollama"),
+            ("translator_requests_failed_total", "failed", "Requests that failed"),
+            ("translator_requests_aborted_total", "aborted", "Generations cancelled by the runaway guard"),
+            ("translator_cache_hits_total", "cache_hits", "Chunks answered from cache"),
+            ("translator_prompt_tokens_total", "prompt_tokens", "Prompt tokens evaluated"),
+            ("translator_output_tokens_total", "output_tokens", "Tokens generated"),
+            ("translator_model_load_seconds_total", "load_seconds", "Time spent loading the model"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {summary[key]}"]
+
+        lines += ["# HELP translator_request_latency_seconds Request latency",
+                  "# TYPE translator_request_latency_seconds summary",
+                  f'translator_request_latency_seconds{{quantile="0.5"}} {summary["latency_p50"]:.6f}',
+                  f'translator_request_latency_seconds{{quantile="0.95"}} {summary["latency_p95"]:.6f}']
+        for name, key in (("translator_eval_tokens_per_second", "eval_tokens_per_second"),
+                          ("translator_prompt_tokens_per_second", "prompt_tokens_per_second")):
+            lines += [f"# TYPE {name} gauge", f"{name} {summary[key]:.3f}"]
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+# โมดูลของโปรเจกต์อยู่ที่ราก repo ไม่ได้ติดตั้งเป็น package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ollama_stub import start_in_background
+from novel_translator import NovelTranslator
+
+
+@pytest.fixture
+def stub():
+    """เริ่ม stub server ด้วย options ของ start_in_background คืน server (หยุดให้เองเมื่อจบ test)"""
+    servers = []
+
+    def start(**options):
+        server = start_in_background(**options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def make_translator():
+    """สร้าง NovelTranslator ที่ชี้ไปที่ stub server ไม่ใช้ cache และ calibration profile เว้นแต่ระบุ"""
+    def make(server, **options) -> NovelTranslator:
+        options.setdefault("cache_path", None)
+        options.setdefault("calibration_path", None)
+        return NovelTranslator(model_name="stub", ollama_url=f"http://127.0.0.1:{server.server_address[1]}",
+                               **options)
+
+    return make
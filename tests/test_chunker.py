@@ -0,0 +1,61 @@
+import chunker
+from chunker import PARAGRAPH_SEPARATOR
+
+
+def test_paragraphs_are_packed_up_to_the_limit():
+    paragraphs = ["a" * 40, "b" * 40, "c" * 40]
+    chunks = chunker.chunk_text(PARAGRAPH_SEPARATOR.join(paragraphs), 82)
+    # 40 + 2 + 40 = 82 พอดี limit ส่วนย่อหน้าที่สามไม่พอ
+    assert chunks == [PARAGRAPH_SEPARATOR.join(paragraphs[:2]), paragraphs[2]]
+
+
+def test_chunks_never_exceed_limit():
+    text = PARAGRAPH_SEPARATOR.join(f"Sentence {i} is here. And another one follows it closely." * (i % 4 + 1)
+                                    for i in range(30))
+    for limit in (30, 64, 100, 250):
+        chunks = chunker.chunk_text(text, limit)
+        assert all(len(chunk) <= limit for chunk in chunks)
+        assert " ".join(" ".join(chunks).split()) == " ".join(text.split())
+
+
+def test_oversized_paragraph_splits_at_sentences():
+    paragraph = "The river was cold. She crossed it anyway! Why did he wait? Nobody knew."
+    chunks = chunker.chunk_text(paragraph, 45)
+    assert chunks == ["The river was cold. She crossed it anyway!", "Why did he wait? Nobody knew."]
+
+
+def test_oversized_sentence_splits_at_words():
+    chunks = chunker.chunk_text("one two three four five six seven", 10)
+    assert chunks == ["one two", "three four", "five six", "seven"]
+
+
+def test_last_piece_joins_next_paragraph():
+    chunks = chunker.chunk_text("Aaaa aaaa. Bbbb bbbb.\n\nCc.", 15)
+    assert chunks == ["Aaaa aaaa.", "Bbbb bbbb.\n\nCc."]
+
+
+def test_blank_paragraphs_are_skipped():
+    assert list(chunker.iter_paragraphs("\n\nfirst\n\n   \n\nsecond\n")) == ["first", "second"]
+
+
+def test_token_measure():
+    words = PARAGRAPH_SEPARATOR.join(["alpha beta gamma"] * 6)
+    chunks = chunker.chunk_text(words, 7, measure=lambda text: len(text.split()))
+    assert [len(chunk.split()) for chunk in chunks] == [6, 6, 6]
+
+
+def test_tail_text_keeps_whole_sentences():
+    text = "First line.\nThe second line has two sentences. This is the last one."
+    assert chunker.tail_text(text, 21) == "This is the last one."
+    assert chunker.tail_text(text, 20) == "is the last one."
+    assert chunker.tail_text(text, 100) == text
+
+
+def test_split_in_half_prefers_paragraphs():
+    parts, separator = chunker.split_in_half("One. Two.\n\nThree. Four.")
+    assert parts == ["One. Two.", "Three. Four."]
+    assert separator == PARAGRAPH_SEPARATOR
+    parts, separator = chunker.split_in_half("One. Two. Three. Four.")
+    assert parts == ["One. Two.", "Three. Four."]
+    assert separator == " "
+    assert chunker.split_in_half("unsplittable") == (["unsplittable"], "")
@@ -0,0 +1,93 @@
+import os
+
+from translation_journal import TranslationJournal
+
+PARAGRAPHS = [
+    "The knight rode into the valley at dawn.",
+    "She drew her sword and waited by the river.",
+    "Nothing moved in the tall grass for a long time.",
+    "At last the bandits came over the hill, laughing.",
+]
+
+
+def write_source(path, paragraphs=PARAGRAPHS):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs) + "\n")
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_translate_file_journals_every_chunk(stub, make_translator, tmp_path):
+    server = stub()
+    source, output = str(tmp_path / "chapter.txt"), str(tmp_path / "out.txt")
+    write_source(source)
+    translator = make_translator(server)
+
+    translator.translate_file(source, output, chunk_size=60, delay_between_chunks=0)
+
+    assert server.RequestHandlerClass.generations == len(PARAGRAPHS)
+    assert read(output).splitlines()[0] == f"[th] {PARAGRAPHS[0]}"
+    assert os.path.exists(TranslationJournal.path_for(output))
+    assert translator.is_translation_complete(source, output)
+
+
+def test_rerun_skips_journaled_chunks(stub, make_translator, tmp_path):
+    server = stub()
+    source, output = str(tmp_path / "chapter.txt"), str(tmp_path / "out.txt")
+    write_source(source)
+    make_translator(server).translate_file(source, output, chunk_size=60, delay_between_chunks=0)
+    first = read(output)
+
+    make_translator(server).translate_file(source, output, chunk_size=60, delay_between_chunks=0)
+
+    assert server.RequestHandlerClass.generations == len(PARAGRAPHS)
+    assert read(output) == first
+
+
+def test_resume_translates_only_missing_chunks(stub, make_translator, tmp_path):
+    server = stub()
+    source, output = str(tmp_path / "chapter.txt"), str(tmp_path / "out.txt")
+    write_source(source)
+    make_translator(server).translate_file(source, output, chunk_size=60, delay_between_chunks=0)
+    first = read(output)
+
+    # ตัด journal ให้เหลือเฉพาะสองส่วนแรก เหมือนการแปลที่ถูกขัดจังหวะ
+    journal_path = TranslationJournal.path_for(output)
+    lines = read(journal_path).splitlines(keepends=True)
+    with open(journal_path, "w", encoding="utf-8") as f:
+        f.writelines(lines[:2])
+    os.remove(output)
+    translator = make_translator(server)
+    assert not translator.is_translation_complete(source, output)
+
+    translator.translate_file(source, output, chunk_size=60, delay_between_chunks=0)
+
+    assert server.RequestHandlerClass.generations == len(PARAGRAPHS) + 2
+    assert read(output) == first
+    assert translator.is_translation_complete(source, output)
+
+
+def test_directory_sync_retranslates_only_changed_chunk(stub, make_translator, tmp_path):
+    server = stub()
+    input_dir, output_dir = tmp_path / "novel", tmp_path / "thai"
+    input_dir.mkdir()
+    write_source(str(input_dir / "chapter1.txt"))
+    write_source(str(input_dir / "chapter2.txt"), [f"Chapter two, part {i}." for i in range(len(PARAGRAPHS))])
+    make_translator(server).translate_directory(str(input_dir), str(output_dir), chunk_size=60,
+                                                delay_between_chunks=0)
+    served = server.RequestHandlerClass.generations
+
+    edited = list(PARAGRAPHS)
+    edited[2] = "Nothing moved in the tall grass until the crows rose."
+    write_source(str(input_dir / "chapter1.txt"), edited)
+    make_translator(server).translate_directory(str(input_dir), str(output_dir), chunk_size=60,
+                                                delay_between_chunks=0)
+
+    assert server.RequestHandlerClass.generations == served + 1
+    assert server.RequestHandlerClass.last_input.endswith(edited[2])
+    translated = read(str(output_dir / "translated_chapter1.txt"))
+    assert f"[th] {edited[2]}" in translated
+    assert f"[th] {PARAGRAPHS[2]}" not in translated
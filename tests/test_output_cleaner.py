@@ -0,0 +1,71 @@
+from glossary import Glossary
+from novel_translator import NovelTranslator
+from output_cleaner import OutputCleaner
+
+# ผลลัพธ์ที่โมเดลพิมพ์ส่วนของ prompt ซ้ำ: หัวข้อ glossary, รายการศัพท์, หลักการแปล และเลขข้อ
+ECHOED = "\n".join([
+    "ใช้คำแปลศัพท์เฉพาะต่อไปนี้:",
+    "Young Master → คุณชายหนุ่ม",
+    "Elder → ผู้อาวุโส",
+    "หลักการแปล:",
+    "1.",
+    "คุณชายหนุ่มเดินเข้าไปในหอคัมภีร์",
+    "",
+    "พลังยุทธ์ 10 → 12",
+    "Qi → ชี่ ไหลเวียนในร่างเขาอีกครั้ง แล้วเขาก็ลืมตา",
+    "ราคา 1.5 ตำลึง",
+])
+EXPECTED = "\n".join([
+    "คุณชายหนุ่มเดินเข้าไปในหอคัมภีร์",
+    "พลังยุทธ์ 10 → 12",
+    "Qi → ชี่ ไหลเวียนในร่างเขาอีกครั้ง แล้วเขาก็ลืมตา",
+    "ราคา 1.5 ตำลึง",
+])
+
+
+def make_cleaner() -> OutputCleaner:
+    return OutputCleaner(NovelTranslator.UNWANTED_PHRASES, line_patterns=NovelTranslator.UNWANTED_LINES)
+
+
+def test_clean_drops_echoed_prompt_lines():
+    assert make_cleaner().clean(ECHOED) == EXPECTED
+
+
+def test_clean_line_matches_clean():
+    cleaner = make_cleaner()
+    lines = [cleaner.clean_line(line) for line in ECHOED.split("\n")]
+    assert "\n".join(line for line in lines if line is not None) == EXPECTED
+
+
+def test_stream_matches_clean_for_any_fragment_size():
+    cleaner = make_cleaner()
+    for size in (1, 3, 16, len(ECHOED)):
+        stream = cleaner.stream()
+        lines = []
+        for i in range(0, len(ECHOED), size):
+            lines.extend(stream.feed(ECHOED[i:i + size]))
+        lines.extend(stream.finish())
+        assert "\n".join(lines) == EXPECTED
+
+
+def test_translation_drops_echoed_prompt_in_both_modes(stub, make_translator, tmp_path):
+    # โมเดลพิมพ์ prompt กลับมาทั้งหมด รวมทั้งคำสั่งแปลและรายการศัพท์ของ glossary
+    server = stub(respond=lambda prompt: prompt)
+    source = tmp_path / "chapter.txt"
+    source.write_text("The Young Master bowed to the Elder at the gate of the sect, as the rules of the "
+                      "mountain required of every disciple who returned from the world below.\n\n"
+                      "The Elder said nothing for a long while. Wind moved through the pines, and somewhere "
+                      "far below a bell rang out the hour of the evening meal.\n", encoding="utf-8")
+    outputs = {}
+    for stream in (False, True):
+        translator = make_translator(server)
+        translator.glossary = Glossary({"Young Master": "คุณชายหนุ่ม", "Elder": "ผู้อาวุโส"})
+        output = tmp_path / f"out-{stream}.txt"
+        translator.translate_file(str(source), str(output), delay_between_chunks=0, stream=stream)
+        outputs[stream] = output.read_text(encoding="utf-8")
+
+    lines = outputs[False].split("\n")
+    assert len(lines) == 2
+    assert lines[0].startswith("The คุณชายหนุ่ม bowed to the ผู้อาวุโส at the gate")
+    assert lines[1].startswith("The ผู้อาวุโส said nothing")
+    assert outputs[True] == outputs[False]
@@ -0,0 +1,85 @@
+import time
+
+from ollama_client import OllamaClient
+from ollama_stub import start_in_background
+from rate_control import AdaptiveRateController
+
+
+def ollama_result(compute_s: float, load_s: float = 0.0) -> dict:
+    return {"prompt_eval_duration": int(compute_s * 1e9 * 0.1),
+            "eval_duration": int(compute_s * 1e9 * 0.9),
+            "load_duration": int(load_s * 1e9)}
+
+
+def test_fast_successes_never_increase_delay():
+    controller = AdaptiveRateController(max_concurrency=4, initial_delay=0.0)
+    for _ in range(50):
+        started = controller.acquire()
+        # คำขอเร็วมาก: overhead ของ HTTP ไม่กี่ ms มากกว่าเวลาประมวลผลหลายเท่า
+        controller.release(started - 0.005, result=ollama_result(0.0002))
+        assert controller.delay == 0.0
+    assert controller.overloads == 0
+    assert controller.concurrency == 4
+
+
+def test_fast_successes_without_timing_never_increase_delay():
+    controller = AdaptiveRateController(max_concurrency=2, initial_delay=0.0)
+    for latency in [0.001, 0.002, 0.001, 0.008, 0.001, 0.012]:
+        started = controller.acquire()
+        controller.release(started - latency)
+    assert controller.delay == 0.0
+    assert controller.overloads == 0
+
+
+def test_fast_successes_shrink_initial_delay():
+    controller = AdaptiveRateController(initial_delay=1.0)
+    started = controller.acquire()
+    controller.release(started - 0.01, result=ollama_result(0.001))
+    assert controller.delay == 0.5
+
+
+def test_stub_requests_keep_full_speed():
+    server = start_in_background()
+    try:
+        client = OllamaClient(f"http://127.0.0.1:{server.server_address[1]}")
+        controller = AdaptiveRateController(max_concurrency=2, initial_delay=0.0)
+        for i in range(20):
+            started = controller.acquire()
+            result = client.generate({"model": "stub", "prompt": f"line {i}", "stream": False})
+            controller.release(started, result=result)
+    finally:
+        server.shutdown()
+    assert controller.delay == 0.0
+    assert controller.overloads == 0
+
+
+def test_long_queue_backs_off():
+    controller = AdaptiveRateController(max_concurrency=4, initial_concurrency=4)
+    controller.acquire()
+    controller.release(time.time() - 9.0, result=ollama_result(2.0))
+    assert controller.overloads == 1
+    assert controller.concurrency == 2
+    assert controller.delay == controller.backoff_delay
+
+
+def test_model_load_is_not_queueing():
+    controller = AdaptiveRateController()
+    controller.acquire()
+    controller.release(time.time() - 9.0, result=ollama_result(2.0, load_s=6.5))
+    assert controller.overloads == 0
+
+
+def test_overload_status_backs_off():
+    controller = AdaptiveRateController(max_concurrency=4, initial_concurrency=4)
+    started = controller.acquire()
+    controller.release(started, ok=False, status_code=503)
+    assert controller.overloads == 1
+    assert controller.concurrency == 2
+
+
+def test_neutral_failure_does_not_back_off():
+    controller = AdaptiveRateController()
+    started = controller.acquire()
+    controller.release(started, ok=False, status_code=0)
+    assert controller.overloads == 0
+    assert controller.delay == 0.0
@@ -0,0 +1,105 @@
+import pytest
+
+from runaway_guard import MIN_OUTPUT_LIMIT, RunawayGuard
+from translation_journal import TranslationJournal
+
+FIRST = ("The disciples gathered in the courtyard before dawn, each one carrying a wooden sword and a "
+         "bowl of cold rice, and waited for the old master to open the hall doors as he had done every "
+         "morning for forty years without fail.")
+SECOND = ("When the doors finally opened it was not the master who stepped out but a stranger in grey "
+          "robes, whose eyes moved slowly over every face in the courtyard as if he were counting them "
+          "and had already decided which of them would live.")
+SOURCE = FIRST + "\n\n" + SECOND
+
+STORY = ("ศิษย์ทั้งหลายมารวมตัวกันที่ลานก่อนรุ่งสาง แต่ละคนถือดาบไม้และชามข้าวเย็นชืด "
+         "เฝ้ารอให้อาจารย์เฒ่าเปิดประตูโถงเหมือนที่ทำมาทุกเช้าตลอดสี่สิบปี")
+
+
+def echo(prompt: str) -> str:
+    return "\n".join(f"[th] {line}" for line in prompt.split("\n") if line.strip())
+
+
+def test_guard_stops_looping_output():
+    guard = RunawayGuard(STORY, max_length_ratio=10)
+    reason = None
+    for _ in range(100):
+        reason = guard.feed("ข้าจะฆ่าเจ้า ")
+        if reason:
+            break
+    assert reason is not None and "วนซ้ำ" in reason
+
+
+def test_guard_accepts_varied_output():
+    guard = RunawayGuard(STORY, max_length_ratio=2)
+    for i in range(0, len(STORY), 16):
+        assert guard.feed(STORY[i:i + 16]) is None
+    assert guard.finish() is None
+
+
+def test_guard_stops_output_longer_than_ratio():
+    output = " ".join(f"{i * 7919:x}" for i in range(200))
+    guard = RunawayGuard("x" * 300, max_length_ratio=2)
+    assert guard.feed(output[:300]) is None
+    assert guard.feed(output[300:600]) is None
+    assert "ยาวเกิน" in guard.feed(output[600:601])
+
+
+def test_guard_rejects_too_short_output():
+    guard = RunawayGuard(SOURCE, max_length_ratio=2, min_length_ratio=0.5)
+    guard.feed("สั้น")
+    assert guard.finish() is not None
+
+
+def test_short_source_has_no_minimum():
+    guard = RunawayGuard("Huh?", max_length_ratio=2, min_length_ratio=0.5)
+    assert guard.min_length == 0
+    assert guard.finish() is None
+    assert len("Huh?") < MIN_OUTPUT_LIMIT
+
+
+def looping(prompt: str) -> str:
+    return "ข้าจะฆ่าเจ้า " * 300 if SECOND in prompt and FIRST in prompt else echo(prompt)
+
+
+def too_short(prompt: str) -> str:
+    return "สั้น" if SECOND in prompt and FIRST in prompt else echo(prompt)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("respond", [looping, too_short])
+def test_rejected_chunk_is_split_and_translated(stub, make_translator, tmp_path, respond, stream):
+    server = stub(respond=respond)
+    source, output = tmp_path / "chapter.txt", tmp_path / "out.txt"
+    source.write_text(SOURCE, encoding="utf-8")
+    translator = make_translator(server)
+
+    translator.translate_file(str(source), str(output), chunk_size=1000, delay_between_chunks=0, stream=stream)
+
+    # ทั้ง chunk ไม่ผ่านสองครั้ง (ครั้งแรกและแปลซ้ำ) จึงแบ่งครึ่งแปลทีละย่อหน้า
+    assert server.RequestHandlerClass.generations == 4
+    assert output.read_text(encoding="utf-8") == f"[th] {FIRST}\n[th] {SECOND}"
+    assert translator.is_translation_complete(str(source), str(output))
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_stream_without_done_is_not_kept(stub, make_translator, tmp_path, stream):
+    # การเชื่อมต่อขาดกลางคัน: stream จบโดยไม่มี record done
+    server = stub(drop_done=True)
+    source, output = tmp_path / "chapter.txt", tmp_path / "out.txt"
+    source.write_text(SOURCE, encoding="utf-8")
+    cache_path = str(tmp_path / "cache.db")
+    translator = make_translator(server, cache_path=cache_path)
+
+    translator.translate_file(str(source), str(output), chunk_size=1000, delay_between_chunks=0, stream=stream)
+
+    assert output.read_text(encoding="utf-8") == SOURCE
+    assert not translator.is_translation_complete(str(source), str(output))
+    assert TranslationJournal.for_output(str(output)).chunks == {}
+    assert translator.cache.stats()["size_bytes"] == 0
+
+    # รอบถัดไปแปลใหม่ได้ครบ
+    server = stub()
+    make_translator(server, cache_path=cache_path).translate_file(
+        str(source), str(output), chunk_size=1000, delay_between_chunks=0, stream=stream)
+    assert server.RequestHandlerClass.generations == 1
+    assert output.read_text(encoding="utf-8") == f"[th] {FIRST}\n[th] {SECOND}"
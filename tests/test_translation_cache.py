@@ -0,0 +1,49 @@
+from translation_cache import TranslationCache
+
+SOURCE = "The old master poured the tea.\n\nHis disciple bowed and did not drink it.\n"
+
+
+def test_put_and_get(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.db"))
+    assert cache.get("key") is None
+    cache.put("key", "คำแปล")
+    assert cache.get("key") == "คำแปล"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    cache.close()
+
+
+def test_second_run_is_served_from_cache(stub, make_translator, tmp_path):
+    server = stub()
+    source = tmp_path / "chapter.txt"
+    source.write_text(SOURCE, encoding="utf-8")
+    cache_path = str(tmp_path / "cache.db")
+
+    make_translator(server, cache_path=cache_path).translate_file(
+        str(source), str(tmp_path / "first.txt"), chunk_size=40, delay_between_chunks=0)
+    served = server.RequestHandlerClass.generations
+    assert served == 2
+
+    # ไฟล์ผลลัพธ์ใหม่ไม่มี journal ทุกส่วนจึงต้องมาจาก cache
+    translator = make_translator(server, cache_path=cache_path)
+    translator.translate_file(str(source), str(tmp_path / "second.txt"), chunk_size=40, delay_between_chunks=0)
+
+    assert server.RequestHandlerClass.generations == served
+    assert translator.cache.stats()["hits"] == 2
+    assert (tmp_path / "second.txt").read_text(encoding="utf-8") == (tmp_path / "first.txt").read_text(encoding="utf-8")
+
+
+def test_changed_chunk_misses_cache(stub, make_translator, tmp_path):
+    server = stub()
+    source = tmp_path / "chapter.txt"
+    source.write_text(SOURCE, encoding="utf-8")
+    cache_path = str(tmp_path / "cache.db")
+    make_translator(server, cache_path=cache_path).translate_file(
+        str(source), str(tmp_path / "first.txt"), chunk_size=40, delay_between_chunks=0)
+
+    source.write_text(SOURCE.replace("did not drink", "drank"), encoding="utf-8")
+    make_translator(server, cache_path=cache_path).translate_file(
+        str(source), str(tmp_path / "second.txt"), chunk_size=40, delay_between_chunks=0)
+
+    assert server.RequestHandlerClass.generations == 3
@@ -0,0 +1,173 @@
+"""
+Token Calibration
+Per-model profile learned from real translation requests: how many model tokens
+Ollama reports (prompt_eval_count / eval_count) per cl100k_base token counted
+locally, and how long the output is relative to the source. The token tools and
+the chunker use it instead of the fixed cl100k x 1.2 guess.
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from telemetry import percentile
+
+DEFAULT_CALIBRATION_PATH = "token_calibration.json"
+CALIBRATION_VERSION = 1
+
+# ค่าก่อนมีข้อมูลพอ: นับ token ด้วย cl100k ตรงกับโมเดล และคำแปลยาว 1.2 เท่าของต้นฉบับ
+DEFAULT_OUTPUT_RATIO = 1.2
+MIN_SAMPLES = 5
+# อัตราส่วนความยาวที่เก็บไว้ต่อโมเดล (ล่าสุด) สำหรับคำนวณ percentile
+RECENT_RATIOS = 200
+# prompt_eval_count ต่ำกว่านี้เทียบกับที่นับได้ แปลว่า prefix ถูกใช้จาก KV cache (ไม่ได้นับทั้ง prompt)
+CACHED_PROMPT_FRACTION = 0.5
+
+
+class CalibrationProfile:
+    """ค่าที่เรียนรู้ของโมเดลหนึ่ง เก็บเป็นผลรวม (ค่าเฉลี่ยถ่วงตามขนาด chunk) และอัตราส่วนล่าสุด
+
+    input_factor: token ของโมเดลต่อ token cl100k ของ prompt
+    output_factor: token ของโมเดลต่อ token cl100k ของคำแปล (ภาษาไทย tokenizer ต่างกันมาก)
+    output_ratio: token ที่โมเดล generate ต่อ token cl100k ของต้นฉบับ
+    """
+
+    def __init__(self, data: Optional[Dict] = None):
+        data = data or {}
+        self.samples = data.get("samples", 0)
+        self.prompt_local = data.get("prompt_local", 0)
+        self.prompt_model = data.get("prompt_model", 0)
+        self.output_local = data.get("output_local", 0)
+        self.output_model = data.get("output_model", 0)
+        self.source_local = data.get("source_local", 0)
+        self.source_output = data.get("source_output", 0)
+        self.ratios = list(data.get("ratios", []))[-RECENT_RATIOS:]
+
+    @property
+    def calibrated(self) -> bool:
+        return self.samples >= MIN_SAMPLES
+
+    @property
+    def input_factor(self) -> float:
+        if not self.calibrated or not self.prompt_local:
+            return 1.0
+        return self.prompt_model / self.prompt_local
+
+    @property
+    def output_factor(self) -> float:
+        if not self.calibrated or not self.output_local:
+            return 1.0
+        return self.output_model / self.output_local
+
+    @property
+    def output_ratio(self) -> float:
+        if not self.calibrated or not self.source_local:
+            return DEFAULT_OUTPUT_RATIO
+        return self.source_output / self.source_local
+
+    def output_ratio_at(self, p: float = 90) -> float:
+        """percentile ของอัตราส่วนความยาวต่อ chunk ใช้เผื่องบ token ให้ chunk ที่คำแปลยาวกว่าปกติ"""
+        if not self.calibrated or not self.ratios:
+            return DEFAULT_OUTPUT_RATIO
+        return percentile(self.ratios, p)
+
+    def observe(self, prompt_local: int, prompt_model: int, source_local: int,
+                output_local: int, output_model: int, truncated: bool = False) -> None:
+        """เพิ่มผลของคำขอหนึ่งครั้ง (จำนวน token ที่นับเองคู่กับที่ Ollama รายงาน)"""
+        if source_local <= 0 or output_model <= 0:
+            return
+        self.samples += 1
+        if prompt_model >= prompt_local * CACHED_PROMPT_FRACTION:
+            self.prompt_local += prompt_local
+            self.prompt_model += prompt_model
+        self.output_local += output_local
+        self.output_model += output_model
+        # คำแปลที่ถูกตัดเพราะชนเพดาน token สั้นกว่าจริง ไม่ใช้เป็นอัตราส่วนความยาว
+        if not truncated:
+            self.source_local += source_local
+            self.source_output += output_model
+            self.ratios.append(output_model / source_local)
+            del self.ratios[:-RECENT_RATIOS]
+
+    def model_tokens(self, local_tokens: int) -> int:
+        """แปลงจำนวน token cl100k ของ prompt เป็นจำนวน token ของโมเดลโดยประมาณ"""
+        return int(local_tokens * self.input_factor + 0.5)
+
+    def chunk_token_budget(self, prompt_tokens: int, num_ctx: int, output_ratio: Optional[float] = None,
+                           safety_margin: int = 256) -> int:
+        """จำนวน token cl100k สูงสุดของต้นฉบับต่อ chunk ที่ยังเหลือที่ให้ prompt (prompt_tokens) และคำแปลใน num_ctx
+
+        output_ratio คือ token ของคำแปลต่อ token ต้นฉบับ (ไม่ระบุ = p90 ที่เรียนรู้ไว้ หรือค่าเริ่มต้น)
+        """
+        if output_ratio is None:
+            output_ratio = self.output_ratio_at(90)
+        available = num_ctx - self.model_tokens(prompt_tokens) - safety_margin
+        # ต้นฉบับ (ในหน่วย token ของโมเดล) + คำแปล (output_ratio เท่าของต้นฉบับ) ต้องพอดีกับที่เหลือ
+        return max(1, int(available / (self.input_factor + output_ratio)))
+
+    def to_dict(self) -> Dict:
+        return {
+            "samples": self.samples,
+            "prompt_local": self.prompt_local,
+            "prompt_model": self.prompt_model,
+            "output_local": self.output_local,
+            "output_model": self.output_model,
+            "source_local": self.source_local,
+            "source_output": self.source_output,
+            "ratios": [round(ratio, 4) for ratio in self.ratios]
+        }
+
+    def describe(self) -> str:
+        if not self.calibrated:
+            return f"ยังไม่มีข้อมูลพอ ({self.samples}/{MIN_SAMPLES} คำขอ) ใช้ค่าเริ่มต้น x{DEFAULT_OUTPUT_RATIO}"
+        return (f"{self.samples} คำขอ | prompt x{self.input_factor:.2f} | คำแปล x{self.output_factor:.2f} | "
+                f"ความยาวคำแปล x{self.output_ratio:.2f} (p90 x{self.output_ratio_at(90):.2f}) ต่อ token ต้นฉบับ")
+
+
+class TokenCalibration:
+    """ไฟล์ JSON เก็บ CalibrationProfile แยกตามชื่อโมเดล"""
+
+    def __init__(self, path: str = DEFAULT_CALIBRATION_PATH):
+        self.path = path
+        self.profiles: Dict[str, CalibrationProfile] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == CALIBRATION_VERSION:
+                self.profiles = {model: CalibrationProfile(profile)
+                                 for model, profile in data.get("models", {}).items()}
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError) as e:
+            print(f"อ่านไฟล์ calibration ไม่ได้ เริ่มเรียนรู้ใหม่: {e}")
+
+    def profile(self, model_name: str) -> CalibrationProfile:
+        with self._lock:
+            return self.profiles.setdefault(model_name, CalibrationProfile())
+
+    def observe(self, model_name: str, **counts) -> None:
+        profile = self.profile(model_name)
+        with self._lock:
+            profile.observe(**counts)
+            self._dirty = True
+
+    def save(self) -> None:
+        """เขียนไฟล์ (ไฟล์ชั่วคราวแล้วแทนที่ ไฟล์เดิมจะไม่เสียถ้าถูกหยุดกลางคัน)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": CALIBRATION_VERSION,
+                    "models": {model: profile.to_dict() for model, profile in self.profiles.items()}}
+            temp = self.path + ".tmp"
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(temp, self.path)
+            self._dirty = False
+
+
+def load_profile(model_name: str, path: str = DEFAULT_CALIBRATION_PATH) -> CalibrationProfile:
+    """profile ของโมเดลจากไฟล์ calibration (ค่าเริ่มต้นถ้ายังไม่มีไฟล์หรือยังไม่เคยเรียนรู้โมเดลนี้)"""
+    return TokenCalibration(path).profile(model_name)
@@ -4,18 +4,40 @@ Token Checker and Optimizer for Novel Translator
 This utility helps you check token usage and optimize settings for your Ollama translation model.
 """
 
-import requests
 import json
 import tiktoken
 import time
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Optional
 import os
+from ollama_client import OllamaClient, OllamaError, RetryPolicy
+from prompt_templates import DEFAULT_TEMPLATE, LAYOUT_INLINE, get_template
+from benchmark import SAMPLING_PRESETS, BenchmarkRunner, build_report, load_chapters
+from token_stream import DEFAULT_NUM_CTX, analyze_file, format_analysis
+from token_calibration import CalibrationProfile, load_profile
+
+# num_ctx sizes a request may use; few sizes so Ollama rarely reloads the model for a new context length
+NUM_CTX_BUCKETS = (2048, 4096, 8192, 16384, 32768, 65536, 131072)
+# num_predict allows this much more than the expected (p90) translation length, plus a fixed margin;
+# more while the output ratio is still the uncalibrated guess
+PREDICT_HEADROOM = 1.25
+UNCALIBRATED_HEADROOM = 2.0
+PREDICT_MARGIN = 64
+# Translation/original length ratios estimate_quality scores as ideal, and outside which its length score is 0
+IDEAL_LENGTH_RATIO = (0.8, 1.2)
+MIN_SANE_LENGTH_RATIO = 0.5
+MAX_SANE_LENGTH_RATIO = 2.0
 
 class TokenChecker:
-    def __init__(self, model_name="scb10x/typhoon-translate-4b", ollama_url="http://localhost:11434"):
+    def __init__(self, model_name="scb10x/typhoon-translate-4b", ollama_url="http://localhost:11434",
+                 prompt_template: str = DEFAULT_TEMPLATE, prompt_layout: str = LAYOUT_INLINE,
+                 calibration: Optional[CalibrationProfile] = None):
         self.model_name = model_name
+        # Same template registry as NovelTranslator, so estimates match the real prompt
+        self.prompt = get_template(prompt_template)
+        self.prompt_layout = prompt_layout
         self.ollama_url = ollama_url
-        self.api_url = f"{ollama_url}/api/generate"
+        # single attempt per request so measured response times aren't skewed by retries
+        self.client = OllamaClient(ollama_url, retry_policy=RetryPolicy(max_attempts=1))
         
         # Model specifications from ollama show
         self.model_specs = {
@@ -31,6 +53,9 @@ class TokenChecker:
         except Exception:
             print("Warning: Could not load tiktoken, using approximate token counting")
             self.tokenizer = None
+        
+        # Learned model-token factors and output length ratio (token_calibration.json, written by translation runs)
+        self.calibration = calibration if calibration is not None else load_profile(model_name)
     
     def count_tokens(self, text: str) -> int:
         """Count tokens in text"""
@@ -43,107 +68,103 @@ class TokenChecker:
     def get_model_info(self) -> Dict:
         """Get detailed model information from Ollama"""
         try:
-            response = requests.post(
-                f"{self.ollama_url}/api/show",
-                json={"name": self.model_name},
-                timeout=10
-            )
-            if response.status_code == 200:
-                return response.json()
+            return self.client.show(self.model_name)
+        except OllamaError as e:
+            if e.status_code:
+                print(f"Error getting model info: {e.status_code}")
             else:
-                print(f"Error getting model info: {response.status_code}")
-                return {}
+                print(f"Error connecting to Ollama: {e}")
+            return {}
         except Exception as e:
             print(f"Error connecting to Ollama: {e}")
             return {}
     
+    def analyze_file(self, path: str, chunk_size: int = 2000, chunk_tokens: Optional[int] = None) -> Dict:
+        """Per-chunk token distribution of a file, streamed in bounded windows (constant memory).
+
+        Split with the translator's num_ctx ceiling (DEFAULT_NUM_CTX) and its chunk token budget,
+        so the chunks match what a translation run would send.
+        """
+        return analyze_file(path, self.count_tokens, self.prompt, self.prompt_layout,
+                            chunk_size=chunk_size, chunk_tokens=chunk_tokens,
+                            num_ctx=DEFAULT_NUM_CTX, calibration=self.calibration)
+    
     def analyze_prompt_tokens(self, text: str) -> Dict:
         """Analyze token usage for a translation prompt"""
-        # Your current prompt template
-        prompt_template = """คุณคือนักแปลมืออาชีพที่มีความเชี่ยวชาญในการแปลนิยาย Wuxia/Xianxia จีนจากภาษาอังกฤษเป็นภาษาไทย
-
-กรุณาแปลเนื้อหาต่อไปนี้จากภาษาอังกฤษเป็นภาษาไทย:
-
-{text}
-
-หลักการแปล:
-1. รักษาความหมายและบรรยากาศของนิยาย Wuxia/Xianxia ไว้
-2. ใช้ภาษาไทยที่อ่านง่ายและไหลลื่น
-3. แปลศัพท์เฉพาะ: Cultivation→การเพาะพิถี, Qi→ชี่, Dantian→ต้านเถียน, Breakthrough→ก้าวกระโดด, Elder→ผู้อาวุโส, Young Master→คุณชายหนุ่ม
-4. คงชื่อตัวละครและสถานที่เฉพาะไว้
-5. ปรับการใช้ภาษาให้เหมาะสมกับผู้อ่านไทย
-6. รักษาบุคลิกและสไตล์การพูดของตัวละครไว้
-
-การแปล:"""
-        
-        full_prompt = prompt_template.format(text=text)
-        
-        # Count tokens for different parts
-        system_tokens = self.count_tokens(prompt_template.replace("{text}", ""))
+        # Fixed prompt tokens are counted once per template; only the text is tokenized here
+        system_tokens = self.prompt.fixed_tokens(self.count_tokens, self.prompt_layout)
         input_tokens = self.count_tokens(text)
-        total_input_tokens = self.count_tokens(full_prompt)
+        # Totals are in the model's tokens: cl100k counts scaled by the calibration profile
+        # (x1.0 and a 1.2 output ratio until enough translation requests have been measured)
+        total_input_tokens = self.calibration.model_tokens(system_tokens + input_tokens)
+        estimated_output_tokens = input_tokens * self.calibration.output_ratio
         
         return {
             "system_prompt_tokens": system_tokens,
             "input_text_tokens": input_tokens,
             "total_input_tokens": total_input_tokens,
-            "estimated_output_tokens": input_tokens * 1.2,  # Thai tends to be slightly longer
-            "total_estimated_tokens": total_input_tokens + (input_tokens * 1.2)
+            "estimated_output_tokens": estimated_output_tokens,
+            "estimated_output_tokens_p90": input_tokens * self.calibration.output_ratio_at(90),
+            "total_estimated_tokens": total_input_tokens + estimated_output_tokens,
+            "calibrated": self.calibration.calibrated
+        }
+    
+    def size_request(self, prompt_tokens: int, source_tokens: int, max_num_ctx: Optional[int] = None) -> Dict:
+        """Smallest num_ctx bucket and a num_predict cap for one translation request.
+
+        prompt_tokens (the whole prompt) and source_tokens (the text being translated) are
+        counted with count_tokens and converted to model tokens with the calibration profile.
+        """
+        ceiling = max_num_ctx or self.model_specs["context_length"]
+        prompt = self.calibration.model_tokens(prompt_tokens)
+        expected = source_tokens * self.calibration.output_ratio_at(90)
+        headroom = PREDICT_HEADROOM if self.calibration.calibrated else UNCALIBRATED_HEADROOM
+        num_predict = int(expected * headroom) + PREDICT_MARGIN
+        
+        buckets = [size for size in NUM_CTX_BUCKETS if size < ceiling] + [ceiling]
+        num_ctx = next((size for size in buckets if size >= prompt + num_predict), ceiling)
+        # A chunk too big for the ceiling gets whatever room the prompt leaves
+        num_predict = max(PREDICT_MARGIN, min(num_predict, num_ctx - prompt))
+        
+        return {
+            "num_ctx": num_ctx,
+            "num_predict": num_predict,
+            "prompt_tokens": prompt,
+            "expected_output_tokens": int(expected)
         }
     
     def test_token_limits(self, test_text: str) -> Dict:
         """Test actual token usage with the model"""
         print("Testing token usage with actual model...")
         
-        prompt = f"""คุณคือนักแปลมืออาชีพที่มีความเชี่ยวชาญในการแปลนิยาย Wuxia/Xianxia จีนจากภาษาอังกฤษเป็นภาษาไทย
-
-กรุณาแปลเนื้อหาต่อไปนี้จากภาษาอังกฤษเป็นภาษาไทย:
-
-{test_text}
-
-หลักการแปล:
-1. รักษาความหมายและบรรยากาศของนิยาย Wuxia/Xianxia ไว้
-2. ใช้ภาษาไทยที่อ่านง่ายและไหลลื่น
-3. แปลศัพท์เฉพาะ: Cultivation→การเพาะพิถี, Qi→ชี่, Dantian→ต้านเถียน, Breakthrough→ก้าวกระโดด, Elder→ผู้อาวุโส, Young Master→คุณชายหนุ่ม
-4. คงชื่อตัวละครและสถานที่เฉพาะไว้
-5. ปรับการใช้ภาษาให้เหมาะสมกับผู้อ่านไทย
-6. รักษาบุคลิกและสไตล์การพูดของตัวละครไว้
-
-การแปล:"""
-
         payload = {
             "model": self.model_name,
-            "prompt": prompt,
+            **self.prompt.payload_fields(test_text, self.prompt_layout),
             "stream": False,
             "options": {
                 "temperature": 0.3,
                 "top_p": 0.9,
-                "max_tokens": 2000,
+                "num_predict": 2000,
                 "num_ctx": 8192  # Current setting
             }
         }
         
         start_time = time.time()
         try:
-            response = requests.post(self.api_url, json=payload, timeout=60)
+            result = self.client.generate(payload, read_timeout=60)
             end_time = time.time()
             
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "success": True,
-                    "response_time": end_time - start_time,
-                    "input_length": len(test_text),
-                    "output_length": len(result.get('response', '')),
-                    "estimated_input_tokens": self.count_tokens(prompt),
-                    "estimated_output_tokens": self.count_tokens(result.get('response', '')),
-                    "response": result.get('response', '')[:200] + "..." if len(result.get('response', '')) > 200 else result.get('response', '')
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": f"HTTP {response.status_code}: {response.text}"
-                }
+            return {
+                "success": True,
+                "response_time": end_time - start_time,
+                "input_length": len(test_text),
+                "output_length": len(result.get('response', '')),
+                "estimated_input_tokens": self.prompt.count_tokens(test_text, self.count_tokens, self.prompt_layout),
+                "estimated_output_tokens": self.count_tokens(result.get('response', '')),
+                "model_input_tokens": result.get('prompt_eval_count'),
+                "model_output_tokens": result.get('eval_count'),
+                "response": result.get('response', '')[:200] + "..." if len(result.get('response', '')) > 200 else result.get('response', '')
+            }
         except Exception as e:
             return {
                 "success": False,
@@ -157,7 +178,7 @@ class TokenChecker:
         recommendations = {
             "current_settings": {
                 "chunk_size": target_chunk_size,
-                "max_tokens": 4000,
+                "num_predict": -1,  # Ollama default: no cap
                 "temperature": 0.3,
                 "top_p": 0.9,
                 "num_ctx": self.model_specs["current_num_ctx"]
@@ -168,6 +189,14 @@ class TokenChecker:
         }
         
         total_tokens = analysis["total_estimated_tokens"]
+        if not analysis["calibrated"]:
+            recommendations["warnings"].append(
+                "Token estimates use cl100k x1.2 (no calibration yet); translate a few chapters to learn "
+                "this model's real token counts"
+            )
+        else:
+            recommendations["optimizations"].append(f"Estimates calibrated for {self.model_name}: "
+                                                    f"{self.calibration.describe()}")
         
         # Check if we're exceeding context length
         if total_tokens > self.model_specs["current_num_ctx"]:
@@ -180,17 +209,20 @@ class TokenChecker:
             recommendations["recommended_settings"]["chunk_size"] = safe_chunk_size
             recommendations["optimizations"].append(f"Reduce chunk size to {safe_chunk_size} for safe processing")
         
-        # Suggest optimal max_tokens
-        estimated_output = analysis["estimated_output_tokens"]
-        if estimated_output > 4000:
-            recommendations["warnings"].append(f"Estimated output tokens ({estimated_output}) may exceed max_tokens (4000)")
-            recommendations["recommended_settings"]["max_tokens"] = int(estimated_output * 1.2)
-        
-        # Suggest optimal num_ctx if we can use more
-        max_possible_ctx = min(self.model_specs["context_length"], 32768)  # Practical limit
-        if total_tokens * 2 < max_possible_ctx:
-            recommendations["recommended_settings"]["num_ctx"] = max_possible_ctx
-            recommendations["optimizations"].append(f"Increase num_ctx to {max_possible_ctx} for better context handling")
+        # Size num_ctx and num_predict for the chunk the way NovelTranslator does per request
+        sizing = self.size_request(analysis["system_prompt_tokens"] + analysis["input_text_tokens"],
+                                   analysis["input_text_tokens"])
+        recommendations["recommended_settings"]["num_ctx"] = sizing["num_ctx"]
+        recommendations["recommended_settings"]["num_predict"] = sizing["num_predict"]
+        recommendations["optimizations"].append(
+            f"Cap generation at num_predict {sizing['num_predict']} (expected p90 output "
+            f"{sizing['expected_output_tokens']} tokens) so a runaway generation stops early"
+        )
+        if sizing["num_ctx"] < self.model_specs["current_num_ctx"]:
+            recommendations["optimizations"].append(
+                f"Use num_ctx {sizing['num_ctx']} instead of {self.model_specs['current_num_ctx']}: "
+                f"a smaller KV cache uses less VRAM and processes the prompt faster"
+            )
         
         # Temperature and top_p recommendations
         recommendations["recommended_settings"]["temperature"] = 0.2  # Lower for more consistent translation
@@ -198,76 +230,47 @@ class TokenChecker:
         
         return recommendations
     
-    def benchmark_settings(self, test_cases: List[str], settings_list: List[Dict]) -> Dict:
-        """Benchmark different settings with test cases"""
-        results = {}
-        
-        for i, settings in enumerate(settings_list):
-            setting_name = f"Setting_{i+1}"
-            results[setting_name] = {
-                "settings": settings,
-                "test_results": []
-            }
-            
-            print(f"\nTesting {setting_name}: {settings}")
-            
-            for j, test_text in enumerate(test_cases):
-                print(f"  Test case {j+1}...")
-                result = self.test_with_settings(test_text, settings)
-                results[setting_name]["test_results"].append(result)
-                time.sleep(1)  # Avoid overwhelming the model
-        
-        return results
+    def benchmark_settings(self, texts: List[str], chunk_sizes: List[int] = [2000],
+                           num_ctxs: List[int] = [8192, 16384], concurrencies: List[int] = [1],
+                           presets: List[str] = list(SAMPLING_PRESETS), cold: bool = True,
+                           layouts: Optional[List[str]] = None) -> List[Dict]:
+        """Sweep settings over real text with the benchmark suite (see benchmark.py)
+
+        Each result has cold (first request after unloading the model) and warm phases with
+        latency percentiles, chars/s, output tokens/s and mean quality score.
+        """
+        runner = BenchmarkRunner(self)
+        return runner.run_sweep(texts, chunk_sizes, num_ctxs, concurrencies, presets, cold=cold,
+                                layouts=layouts or [self.prompt_layout])
     
     def test_with_settings(self, text: str, settings: Dict) -> Dict:
         """Test translation with specific settings"""
-        prompt = f"""คุณคือนักแปลมืออาชีพที่มีความเชี่ยวชาญในการแปลนิยาย Wuxia/Xianxia จีนจากภาษาอังกฤษเป็นภาษาไทย
-
-กรุณาแปลเนื้อหาต่อไปนี้จากภาษาอังกฤษเป็นภาษาไทย:
-
-{text}
-
-หลักการแปล:
-1. รักษาความหมายและบรรยากาศของนิยาย Wuxia/Xianxia ไว้
-2. ใช้ภาษาไทยที่อ่านง่ายและไหลลื่น
-3. แปลศัพท์เฉพาะ: Cultivation→การเพาะพิถี, Qi→ชี่, Dantian→ต้านเถียน, Breakthrough→ก้าวกระโดด, Elder→ผู้อาวุโส, Young Master→คุณชายหนุ่ม
-4. คงชื่อตัวละครและสถานที่เฉพาะไว้
-5. ปรับการใช้ภาษาให้เหมาะสมกับผู้อ่านไทย
-6. รักษาบุคลิกและสไตล์การพูดของตัวละครไว้
-
-การแปล:"""
-
         payload = {
             "model": self.model_name,
-            "prompt": prompt,
+            **self.prompt.payload_fields(text, self.prompt_layout),
             "stream": False,
             "options": settings
         }
         
         start_time = time.time()
         try:
-            response = requests.post(self.api_url, json=payload, timeout=120)
+            result = self.client.generate(payload, read_timeout=120)
             end_time = time.time()
             
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "success": True,
-                    "response_time": end_time - start_time,
-                    "input_tokens": self.count_tokens(prompt),
-                    "output_tokens": self.count_tokens(result.get('response', '')),
-                    "quality_score": self.estimate_quality(result.get('response', ''), text)
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": f"HTTP {response.status_code}",
-                    "response_time": end_time - start_time
-                }
+            return {
+                "success": True,
+                "response_time": end_time - start_time,
+                "input_tokens": self.prompt.count_tokens(text, self.count_tokens, self.prompt_layout),
+                "output_tokens": self.count_tokens(result.get('response', '')),
+                "quality_score": self.estimate_quality(result.get('response', ''), text),
+                "timings": {key: result[key] for key in ("load_duration", "prompt_eval_duration", "eval_duration")
+                            if key in result}
+            }
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e),
+                "status_code": getattr(e, "status_code", None),
                 "response_time": time.time() - start_time
             }
     
@@ -280,10 +283,12 @@ class TokenChecker:
         length_ratio = len(translation) / len(original)
         
         # Ideal ratio for English->Thai is around 0.8-1.2
-        if 0.8 <= length_ratio <= 1.2:
+        if IDEAL_LENGTH_RATIO[0] <= length_ratio <= IDEAL_LENGTH_RATIO[1]:
             length_score = 1.0
+        elif length_ratio < MIN_SANE_LENGTH_RATIO:
+            length_score = 0.0
         else:
-            length_score = max(0.0, 1.0 - abs(length_ratio - 1.0))
+            length_score = max(0.0, 1.0 - abs(length_ratio - 1.0) / (MAX_SANE_LENGTH_RATIO - 1.0))
         
         # Check for Thai characters
         thai_chars = sum(1 for c in translation if '\u0E00' <= c <= '\u0E7F')
@@ -331,6 +336,7 @@ def main():
             print(f"Total input tokens: {analysis['total_input_tokens']}")
             print(f"Estimated output tokens: {analysis['estimated_output_tokens']:.0f}")
             print(f"Total estimated tokens: {analysis['total_estimated_tokens']:.0f}")
+            print(f"Calibration: {checker.calibration.describe()}")
             print(f"Current context limit: {checker.model_specs['current_num_ctx']}")
             
             if analysis['total_estimated_tokens'] > checker.model_specs['current_num_ctx']:
@@ -349,6 +355,8 @@ def main():
                 print(f"Response time: {result['response_time']:.2f} seconds")
                 print(f"Input tokens: {result['estimated_input_tokens']}")
                 print(f"Output tokens: {result['estimated_output_tokens']}")
+                if result['model_output_tokens'] is not None:
+                    print(f"Model-reported tokens: {result['model_input_tokens']} in, {result['model_output_tokens']} out")
                 print(f"Sample response: {result['response']}")
             else:
                 print(f"\n❌ Test failed: {result['error']}")
@@ -379,48 +387,49 @@ def main():
                     print(f"  • {opt}")
         
         elif choice == "4":
-            print("\n🏁 Benchmarking different settings...")
-            test_cases = [
-                "The young master's face turned red with anger.",
-                "The ancient formation began to glow with spiritual energy.",
-                "Elder Zhang stroked his beard thoughtfully."
-            ]
+            folder = input("\nFolder of chapters to benchmark (default english): ").strip() or "english"
+            if os.path.isdir(folder):
+                chapters = load_chapters(folder, limit=1)
+            else:
+                chapters = []
+            if not chapters:
+                print("No chapters found, using sample sentences")
+                chapters = [("sample", "\n\n".join([
+                    "The young master's face turned red with anger.",
+                    "The ancient formation began to glow with spiritual energy.",
+                    "Elder Zhang stroked his beard thoughtfully."
+                ]))]
             
-            settings_list = [
-                {"temperature": 0.2, "top_p": 0.85, "max_tokens": 2000, "num_ctx": 8192},
-                {"temperature": 0.3, "top_p": 0.9, "max_tokens": 4000, "num_ctx": 8192},
-                {"temperature": 0.1, "top_p": 0.8, "max_tokens": 3000, "num_ctx": 16384},
-            ]
+            print("\n🏁 Benchmarking different settings...")
+            results = checker.benchmark_settings([text for _, text in chapters])
             
-            results = checker.benchmark_settings(test_cases, settings_list)
+            report_file = "benchmark_report.json"
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump(build_report(checker, chapters, results), f, ensure_ascii=False, indent=2)
             
             print(f"\n📈 Benchmark Results:")
-            for setting_name, data in results.items():
-                print(f"\n{setting_name}:")
-                print(f"Settings: {data['settings']}")
-                
-                successful_tests = [r for r in data['test_results'] if r.get('success')]
-                if successful_tests:
-                    avg_time = sum(r['response_time'] for r in successful_tests) / len(successful_tests)
-                    avg_quality = sum(r['quality_score'] for r in successful_tests) / len(successful_tests)
-                    print(f"Average response time: {avg_time:.2f}s")
-                    print(f"Average quality score: {avg_quality:.2f}")
-                    print(f"Success rate: {len(successful_tests)}/{len(data['test_results'])}")
-                else:
-                    print("All tests failed")
+            for result in results:
+                warm = result["warm"]
+                print(f"\n{result['key']}:")
+                print(f"Latency p50/p95: {warm['latency_p50']:.2f}s / {warm['latency_p95']:.2f}s")
+                print(f"Throughput: {warm['source_chars_per_second']:.0f} chars/s, "
+                      f"{warm['output_tokens_per_second']:.1f} output tokens/s")
+                print(f"Average quality score: {warm['quality_mean']:.2f}")
+                print(f"Success rate: {warm['success_rate'] * 100:.0f}%")
+                if result["cold"]:
+                    print(f"Cold start: {result['cold']['latency_mean']:.2f}s "
+                          f"(model load {result['cold']['load_seconds']:.2f}s)")
+            print(f"\nFull report saved to {report_file} (run benchmark.py for larger sweeps)")
         
         elif choice == "5":
             filename = input("\nEnter filename to check: ").strip()
             if os.path.exists(filename):
+                chunk_size = input("Chunk size in characters (default 2000): ").strip()
+                chunk_size = int(chunk_size) if chunk_size.isdigit() else 2000
                 try:
-                    with open(filename, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    analysis = checker.analyze_prompt_tokens(content)
-                    print(f"\n📁 File Analysis: {filename}")
-                    print(f"File size: {len(content)} characters")
-                    print(f"Estimated tokens needed: {analysis['total_estimated_tokens']:.0f}")
-                    print(f"Recommended chunk size: {len(content) * checker.model_specs['current_num_ctx'] // analysis['total_estimated_tokens'] if analysis['total_estimated_tokens'] > checker.model_specs['current_num_ctx'] else len(content)}")
+                    analysis = checker.analyze_file(filename, chunk_size)
+                    print(f"\n📁 File Analysis ({chunk_size} characters per chunk):")
+                    print(format_analysis(analysis))
                 except Exception as e:
                     print(f"Error reading file: {e}")
             else:
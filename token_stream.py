@@ -0,0 +1,249 @@
+"""
+Streaming Token Analysis
+Token usage of a whole novel file, measured chunk by chunk the way the
+translator splits it, without loading the file into memory. The file is read
+in fixed-size windows (memory-mapped when large), decoded incrementally and
+split into paragraphs, which are packed into chunks with the translator's own
+chunker. Only running totals and a fixed-width histogram are kept, so memory
+stays flat whatever the file size. Prompt and output estimates are converted to
+the model's tokens with the calibration profile learned by translation runs.
+"""
+
+import codecs
+import heapq
+import itertools
+import mmap
+import os
+from typing import Callable, Dict, Iterator, List, Optional
+
+import chunker
+from prompt_templates import LAYOUT_INLINE, PromptTemplate
+from token_calibration import CalibrationProfile
+
+# num_ctx ceiling NovelTranslator runs with (its generation_options), used as the default here
+DEFAULT_NUM_CTX = 16384
+WINDOW_BYTES = 1 << 20
+MMAP_THRESHOLD = 8 << 20
+HISTOGRAM_BUCKET = 128
+MAX_OVERFLOW_EXAMPLES = 10
+MAX_LARGEST = 5
+TOKEN_BATCH = 64
+
+
+def iter_windows(path: str, window: int = WINDOW_BYTES) -> Iterator[bytes]:
+    """Raw bytes of the file, at most `window` bytes at a time."""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        if size < MMAP_THRESHOLD:
+            for block in iter(lambda: f.read(window), b""):
+                yield block
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for start in range(0, size, window):
+                yield data[start:start + window]
+
+
+def iter_file_paragraphs(path: str, window: int = WINDOW_BYTES, encoding: str = 'utf-8') -> Iterator[str]:
+    """Paragraphs of the file (same splitting as chunker.iter_paragraphs), read window by window."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    pending = ""
+    for block in iter_windows(path, window):
+        text = (pending + decoder.decode(block)).replace("\r\n", "\n")
+        # the text after the last separator may be an unfinished paragraph; it waits for the next window
+        cut = text.rfind(chunker.PARAGRAPH_SEPARATOR)
+        if cut == -1:
+            pending = text
+            continue
+        pending = text[cut + len(chunker.PARAGRAPH_SEPARATOR):]
+        yield from chunker.iter_paragraphs(text[:cut])
+    pending += decoder.decode(b"", final=True)
+    yield from chunker.iter_paragraphs(pending.replace("\r\n", "\n"))
+
+
+class TokenHistogram:
+    """Fixed-width histogram with exact count, sum, min and max; percentiles are bucket midpoints."""
+
+    def __init__(self, bucket: int = HISTOGRAM_BUCKET):
+        self.bucket = bucket
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def add(self, value: int) -> None:
+        if not self.count or value < self.min:
+            self.min = value
+        self.max = max(self.max, value)
+        self.count += 1
+        self.total += value
+        key = value // self.bucket
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def merge(self, analysis: Dict) -> None:
+        """Fold in the histogram of another analyze_file result (same bucket width)."""
+        if not analysis["chunks"]:
+            return
+        stats = analysis["chunk_tokens"]
+        if not self.count or stats["min"] < self.min:
+            self.min = stats["min"]
+        self.max = max(self.max, stats["max"])
+        self.count += analysis["chunks"]
+        self.total += analysis["source_tokens"]
+        for row in analysis["histogram"]:
+            key = row["from"] // self.bucket
+            self.buckets[key] = self.buckets.get(key, 0) + row["chunks"]
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen >= target:
+                midpoint = key * self.bucket + self.bucket / 2
+                return min(max(midpoint, self.min), self.max)
+        return float(self.max)
+
+    def rows(self) -> List[Dict]:
+        return [{"from": key * self.bucket, "to": (key + 1) * self.bucket - 1, "chunks": self.buckets[key]}
+                for key in sorted(self.buckets)]
+
+    def summary(self) -> Dict:
+        return {
+            "min": self.min,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max
+        }
+
+
+def iter_chunk_tokens(chunks: Iterator[str], count_tokens: Callable[[str], int],
+                      count_batch: Optional[Callable[[List[str]], List[int]]] = None,
+                      batch: int = TOKEN_BATCH) -> Iterator:
+    """(chunk, tokens) pairs; with count_batch, chunks are tokenized `batch` at a time."""
+    if count_batch is None:
+        for chunk in chunks:
+            yield chunk, count_tokens(chunk)
+        return
+    while True:
+        group = list(itertools.islice(chunks, batch))
+        if not group:
+            return
+        yield from zip(group, count_batch(group))
+
+
+def analyze_file(path: str, count_tokens: Callable[[str], int], prompt: PromptTemplate,
+                 layout: str = LAYOUT_INLINE, chunk_size: int = 2000, chunk_tokens: Optional[int] = None,
+                 num_ctx: int = DEFAULT_NUM_CTX, output_ratio: Optional[float] = None,
+                 window: int = WINDOW_BYTES,
+                 count_batch: Optional[Callable[[List[str]], List[int]]] = None,
+                 calibration: Optional[CalibrationProfile] = None) -> Dict:
+    """Per-chunk token distribution of a file split like NovelTranslator.chunk_text.
+
+    Chunk sizes are cl100k counts (what the chunker budgets with). Input and output
+    estimates are model tokens: the prompt is scaled by the calibration's input factor
+    and the output is the source tokens times its output ratio (mean for the totals, p90
+    for the per-chunk overflow check), or output_ratio when given. Without a calibration
+    (or before it has enough samples) that is cl100k x1.0 and a 1.2 output ratio.
+
+    chunk_tokens is capped by the calibration's chunk_token_budget for num_ctx, as the
+    translator caps it, so the chunks are the ones a translation run would send.
+    A chunk overflows when its prompt plus the estimated output does not fit in num_ctx.
+    count_batch, when given, tokenizes a list of chunks in one call (e.g. tiktoken's
+    encode_batch) instead of one at a time.
+    """
+    profile = calibration or CalibrationProfile()
+    mean_ratio = output_ratio if output_ratio is not None else profile.output_ratio
+    peak_ratio = output_ratio if output_ratio is not None else profile.output_ratio_at(90)
+    fixed = prompt.fixed_tokens(count_tokens, layout)
+    if chunk_tokens:
+        chunk_tokens = min(chunk_tokens, profile.chunk_token_budget(fixed, num_ctx))
+        chunks = chunker.iter_chunks(iter_file_paragraphs(path, window), chunk_tokens, count_tokens)
+    else:
+        chunks = chunker.iter_chunks(iter_file_paragraphs(path, window), chunk_size)
+
+    histogram = TokenHistogram()
+    characters = 0
+    input_tokens = 0
+    overflows = 0
+    overflow_examples: List[Dict] = []
+    largest: List = []
+
+    for index, (chunk, tokens) in enumerate(iter_chunk_tokens(chunks, count_tokens, count_batch)):
+        prompt_tokens = profile.model_tokens(fixed + tokens)
+        needed = prompt_tokens + int(tokens * peak_ratio)
+        characters += len(chunk)
+        input_tokens += prompt_tokens
+        histogram.add(tokens)
+        if needed > num_ctx:
+            overflows += 1
+            if len(overflow_examples) < MAX_OVERFLOW_EXAMPLES:
+                overflow_examples.append({"chunk": index, "tokens": tokens, "needed": needed,
+                                          "preview": chunk[:60]})
+        if len(largest) < MAX_LARGEST:
+            heapq.heappush(largest, (tokens, -index, chunk[:60]))
+        elif tokens > largest[0][0]:
+            heapq.heapreplace(largest, (tokens, -index, chunk[:60]))
+
+    return {
+        "file": path,
+        "file_bytes": os.path.getsize(path),
+        "characters": characters,
+        "chunks": histogram.count,
+        "prompt_fixed_tokens": fixed,
+        "source_tokens": histogram.total,
+        "input_tokens": input_tokens,
+        "estimated_output_tokens": int(histogram.total * mean_ratio),
+        "calibrated": profile.calibrated,
+        "input_factor": profile.input_factor,
+        "output_ratio": mean_ratio,
+        "chunk_tokens": histogram.summary(),
+        "histogram": histogram.rows(),
+        "num_ctx": num_ctx,
+        "overflows": overflows,
+        "overflow_examples": overflow_examples,
+        "largest_chunks": [{"chunk": -index, "tokens": tokens, "preview": preview}
+                           for tokens, index, preview in sorted(largest, reverse=True)]
+    }
+
+
+def format_estimate_basis(analysis: Dict) -> str:
+    """How the model-token estimates were derived (calibrated profile or the default guess)."""
+    if analysis["calibrated"]:
+        return (f"Estimates calibrated: prompt x{analysis['input_factor']:.2f}, "
+                f"output x{analysis['output_ratio']:.2f} of source tokens")
+    return (f"Estimates uncalibrated: cl100k x1.0, output x{analysis['output_ratio']:.2f} "
+            f"(translate a few chapters to learn the model's ratios)")
+
+
+def format_analysis(analysis: Dict) -> str:
+    stats = analysis["chunk_tokens"]
+    lines = [
+        f"File: {analysis['file']} ({analysis['file_bytes']:,} bytes, {analysis['characters']:,} characters)",
+        f"Chunks: {analysis['chunks']:,}",
+        f"Source tokens: {analysis['source_tokens']:,} "
+        f"(+{analysis['prompt_fixed_tokens']} prompt tokens per chunk = {analysis['input_tokens']:,} model input)",
+        f"Estimated output tokens: {analysis['estimated_output_tokens']:,}",
+        format_estimate_basis(analysis),
+        f"Tokens per chunk: min {stats['min']}, mean {stats['mean']:.0f}, p50 {stats['p50']:.0f}, "
+        f"p90 {stats['p90']:.0f}, p99 {stats['p99']:.0f}, max {stats['max']}",
+    ]
+    peak = max((row["chunks"] for row in analysis["histogram"]), default=0)
+    for row in analysis["histogram"]:
+        bar = "#" * max(1, round(row["chunks"] / peak * 40))
+        lines.append(f"  {row['from']:>6}-{row['to']:<6} {row['chunks']:>7}  {bar}")
+    if analysis["overflows"]:
+        lines.append(f"❌ {analysis['overflows']} chunks do not fit in num_ctx {analysis['num_ctx']:,} "
+                     f"(prompt + estimated output):")
+        for example in analysis["overflow_examples"]:
+            lines.append(f"   chunk {example['chunk']}: {example['tokens']} tokens, needs {example['needed']} "
+                         f"- {example['preview']!r}")
+    else:
+        lines.append(f"✅ Every chunk fits in num_ctx {analysis['num_ctx']:,}")
+    return "\n".join(lines)
@@ -0,0 +1,117 @@
+"""
+Translation Cache
+Persistent content-addressed cache of model outputs, so repeated text (recaps,
+author notes, re-scraped chapters) is not sent to Ollama twice.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+DEFAULT_CACHE_PATH = "translation_cache.db"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def normalize_text(text: str) -> str:
+    """ปรับช่องว่างให้เป็นรูปแบบเดียวกัน เพื่อให้ข้อความที่ต่างกันแค่ whitespace ได้ key เดียวกัน"""
+    lines = [re.sub(r'\s+', ' ', line).strip() for line in text.strip().splitlines()]
+    return '\n'.join(lines)
+
+
+def make_cache_key(text: str, prompt_template: str, model_name: str, options: Dict) -> str:
+    """สร้าง key จาก chunk ที่ normalize แล้ว, prompt template, ชื่อโมเดล และ sampling options"""
+    material = json.dumps({
+        "text": normalize_text(text),
+        "template": prompt_template,
+        "model": model_name,
+        "options": options
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class TranslationCache:
+    """SQLite cache ที่จำกัดขนาดรวมด้วยการลบรายการที่ใช้ล่าสุดนานที่สุด (LRU)
+
+    เก็บผลลัพธ์ดิบจากโมเดล (ก่อน clean) เพื่อให้กฎการทำความสะอาดเปลี่ยนได้โดยไม่ต้องล้าง cache
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON translations(last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """คืนผลลัพธ์ที่ cache ไว้ และนับ hit/miss"""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM translations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute("UPDATE translations SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """บันทึกผลลัพธ์ และลบรายการเก่าถ้าขนาดรวมเกิน max_bytes"""
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM translations WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._total_bytes -= row[0]
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations (key, response, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time())
+            )
+            self._total_bytes += size
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM translations ORDER BY last_used LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM translations WHERE key = ?", (key,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size_bytes": self._total_bytes
+        }
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,130 @@
+"""
+Translation Journal
+Append-only JSONL checkpoint file that lets an interrupted translation resume
+without re-requesting chunks that were already translated.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+JOURNAL_SUFFIX = ".journal.jsonl"
+
+
+def hash_text(text: str) -> str:
+    """SHA-256 ของข้อความ ใช้เป็น key ของ chunk และของไฟล์ต้นฉบับ"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class TranslationJournal:
+    """บันทึกผลการแปลทีละ chunk ลงไฟล์ JSONL ทันทีที่แปลเสร็จ
+
+    แต่ละบรรทัดเป็น record หนึ่งรายการ:
+      {"type": "chunk", "index": 3, "source_hash": "...", "translation": "...", "raw": "..."}
+      {"type": "complete", "source_hash": "...", "chunks": 12, "glossary": {"terms": {...}, "variants": {...}}}
+    record ของ chunk จะถูกใช้ซ้ำเมื่อ index และ hash ของข้อความต้นฉบับตรงกันเท่านั้น
+    (chunk ที่เลื่อนตำแหน่งเพราะต้นฉบับถูกแก้ ใช้คำแปลเดิมได้ผ่าน adopt)
+    "raw" คือผลลัพธ์ของโมเดลก่อนทำความสะอาด (record เก่าอาจไม่มี) ใช้ทำความสะอาดใหม่ได้โดยไม่ต้องแปลซ้ำ
+    "glossary" คือศัพท์ที่ใช้แก้คำแปลตอนแปล (Glossary.to_dict) ให้ reclean.py ใช้ชุดเดียวกัน
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.chunks: Dict[int, Dict] = {}
+        # record ล่าสุดของข้อความต้นฉบับแต่ละ hash ไม่ว่าจะอยู่ index ใด
+        self.by_hash: Dict[str, Dict] = {}
+        self.completed_source_hash: Optional[str] = None
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def path_for(output_file: str) -> str:
+        """ตำแหน่งไฟล์ journal ของไฟล์ผลลัพธ์"""
+        return output_file + JOURNAL_SUFFIX
+
+    @classmethod
+    def for_output(cls, output_file: str) -> "TranslationJournal":
+        return cls(cls.path_for(output_file))
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # บรรทัดสุดท้ายอาจถูกเขียนไม่ครบตอนโปรแกรมถูกหยุดกลางคัน
+                    continue
+
+                if record.get("type") == "chunk":
+                    self.chunks[record["index"]] = record
+                    self.by_hash[record.get("source_hash")] = record
+                elif record.get("type") == "complete":
+                    self.completed_source_hash = record.get("source_hash")
+
+    def _append(self, record: Dict) -> None:
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def get(self, index: int, source_hash: str) -> Optional[str]:
+        """คืนคำแปลที่บันทึกไว้ของ chunk ถ้าต้นฉบับยังเหมือนเดิม"""
+        record = self.chunks.get(index)
+        if record and record.get("source_hash") == source_hash:
+            return record["translation"]
+        return None
+
+    def get_raw(self, index: int, source_hash: str) -> Optional[str]:
+        """คืนผลลัพธ์ดิบของโมเดลสำหรับ chunk ถ้าต้นฉบับยังเหมือนเดิมและมีบันทึกไว้"""
+        record = self.chunks.get(index)
+        if record and record.get("source_hash") == source_hash:
+            return record.get("raw")
+        return None
+
+    def record(self, index: int, source_hash: str, translation: str, raw: Optional[str] = None,
+               terms: Optional[List[str]] = None) -> None:
+        """บันทึกคำแปลของ chunk (ผลลัพธ์ดิบของโมเดล และศัพท์ glossary ที่พบในต้นฉบับ ถ้ามี) ลง journal"""
+        record = {
+            "type": "chunk",
+            "index": index,
+            "source_hash": source_hash,
+            "translation": translation
+        }
+        if raw is not None:
+            record["raw"] = raw
+        if terms is not None:
+            record["terms"] = terms
+        self._append(record)
+        self.chunks[index] = record
+        self.by_hash[source_hash] = record
+
+    def adopt(self, index: int, source_hash: str) -> bool:
+        """ให้ chunk index ใช้คำแปลของข้อความเดียวกันที่บันทึกไว้ที่ index อื่น (บันทึกซ้ำที่ index นี้)
+
+        คืน True ถ้า index นี้มีคำแปลของ source_hash แล้ว
+        """
+        record = self.chunks.get(index)
+        if record and record.get("source_hash") == source_hash:
+            return True
+        record = self.by_hash.get(source_hash)
+        if record is None:
+            return False
+        self.record(index, source_hash, record["translation"], record.get("raw"))
+        return True
+
+    def mark_complete(self, source_hash: str, total_chunks: int, glossary: Optional[Dict] = None) -> None:
+        """บันทึกว่าไฟล์ผลลัพธ์ถูกเขียนครบแล้วสำหรับต้นฉบับ source_hash (พร้อมศัพท์ที่ใช้ ถ้าระบุ)"""
+        record = {"type": "complete", "source_hash": source_hash, "chunks": total_chunks}
+        if glossary is not None:
+            record["glossary"] = glossary
+        self._append(record)
+        self.completed_source_hash = source_hash
+
+    def is_complete(self, source_hash: str) -> bool:
+        return self.completed_source_hash == source_hash
@@ -0,0 +1,129 @@
+"""
+Work Queue
+File jobs, global chunk ordering and a single-line progress display used by
+NovelTranslator to drain the chunks of many files with one worker pool.
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from translation_journal import TranslationJournal
+
+ORDER_LARGEST = "largest"
+ORDER_CHAPTER = "chapter"
+
+
+class FileJob:
+    """ไฟล์หนึ่งไฟล์ที่แบ่งเป็น chunks แล้ว พร้อมผลแปลที่มีอยู่ (จาก journal)"""
+
+    def __init__(self, input_file: str, output_file: str, source_hash: str, chunks: List[str],
+                 translated: List[Optional[str]], journal: TranslationJournal):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.source_hash = source_hash
+        self.chunks = chunks
+        self.translated = translated
+        self.journal = journal
+        self.remaining = sum(1 for t in translated if t is None)
+
+    @property
+    def size(self) -> int:
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def pending_indices(self) -> List[int]:
+        return [i for i, t in enumerate(self.translated) if t is None]
+
+    def is_done(self) -> bool:
+        return self.remaining == 0
+
+    def assemble(self) -> str:
+        return "\n\n".join(self.translated)
+
+
+def chapter_key(path: str) -> Tuple[float, str]:
+    """เรียงตามเลขบทตัวแรกในชื่อไฟล์ (chapter12.txt ก่อน chapter100.txt)"""
+    name = os.path.basename(path)
+    match = re.search(r'\d+', name)
+    return (int(match.group()) if match else float('inf'), name)
+
+
+def order_jobs(jobs: List[FileJob], order: str = ORDER_LARGEST) -> List[FileJob]:
+    """ลำดับไฟล์ในคิว: largest = ไฟล์ใหญ่ก่อน (ไม่ให้ไฟล์ใหญ่ค้างท้ายคิว), chapter = ตามเลขบท"""
+    if order == ORDER_CHAPTER:
+        return sorted(jobs, key=lambda job: chapter_key(job.input_file))
+    if order == ORDER_LARGEST:
+        return sorted(jobs, key=lambda job: job.size, reverse=True)
+    raise ValueError(f"Unknown queue order '{order}', use '{ORDER_LARGEST}' or '{ORDER_CHAPTER}'")
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+class ProgressDisplay:
+    """บรรทัดแสดงความคืบหน้าบรรทัดเดียว: chunks, chunks/s, tokens/s, ETA และจำนวนไฟล์ที่เสร็จ"""
+
+    def __init__(self, total_chunks: int, total_files: int = 1, stream=None):
+        self.total_chunks = total_chunks
+        self.total_files = total_files
+        self.done_chunks = 0
+        self.done_files = 0
+        self.tokens = 0
+        self.started = time.time()
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+        self._width = 0
+
+    def _line(self) -> str:
+        elapsed = max(time.time() - self.started, 1e-6)
+        chunk_rate = self.done_chunks / elapsed
+        token_rate = self.tokens / elapsed
+        if self.done_chunks and self.done_chunks < self.total_chunks:
+            eta = format_duration((self.total_chunks - self.done_chunks) / chunk_rate)
+        elif self.done_chunks >= self.total_chunks:
+            eta = "00:00"
+        else:
+            eta = "--:--"
+        percent = (self.done_chunks / self.total_chunks * 100) if self.total_chunks else 100.0
+        return (f"[{percent:5.1f}%] {self.done_chunks}/{self.total_chunks} chunks | "
+                f"{chunk_rate:.2f} chunks/s | {token_rate:.0f} tok/s | ETA {eta} | "
+                f"ไฟล์ {self.done_files}/{self.total_files} | {format_duration(elapsed)}")
+
+    def _draw(self) -> None:
+        line = self._line()
+        padding = " " * max(0, self._width - len(line))
+        self.stream.write("\r" + line + padding)
+        self.stream.flush()
+        self._width = len(line)
+
+    def chunk_done(self, tokens: int = 0) -> None:
+        with self._lock:
+            self.done_chunks += 1
+            self.tokens += tokens
+            self._draw()
+
+    def file_done(self) -> None:
+        with self._lock:
+            self.done_files += 1
+            self._draw()
+
+    def log(self, message: str) -> None:
+        """พิมพ์ข้อความโดยไม่ทำให้บรรทัดความคืบหน้าเสีย"""
+        with self._lock:
+            self.stream.write("\r" + " " * self._width + "\r" + message + "\n")
+            self._draw()
+
+    def finish(self) -> None:
+        with self._lock:
+            self._draw()
+            self.stream.write("\n")
+            self.stream.flush()